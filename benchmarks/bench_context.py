@@ -0,0 +1,97 @@
+# benchmarks/bench_context.py
+"""
+Prompt size per turn over a long chat, for brief and for verbose
+replies: the old "system prompt + last 7 messages" payload versus the
+token-budgeted context with a rolling summary. Also times building the context (the part on the critical
+path) and the upstream call against a mock LLM whose latency grows with
+prompt tokens, as prefill does.
+
+    python -m benchmarks.bench_context [turns] [ms_per_1k_tokens]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+import aiohttp
+
+from context import ConversationContext
+from fixtures.mock_llm import MockLLM
+from sessions import Session
+from utils import SYSTEM_MESSAGE, SYSTEM_TOKENS, request_tokens
+
+QUESTIONS = [
+    "I'm looking for something like The Expanse, big space politics and believable ships",
+    "find leviathan wakes",
+    "what's the price in paperback and is there a box set?",
+    "my brother liked Foundation, would he like this too? he's more into ideas than action",
+    "search hyperion",
+]
+REPLY = ("Great choice! *Hyperion* by Dan Simmons is a Hugo winner told as six pilgrims' tales, "
+         "perfect if he enjoys big ideas. It's *£9.99* in paperback. Would you like to order it?")
+SEARCH = "1. *Hyperion* - £9.99\n2. *The Fall of Hyperion* - £9.99\n3. *Endymion* - £8.99"
+
+def legacy_messages(history, text, extra):
+    # What bot.handle + build_payload sent before: last 10 messages kept, last 7 forwarded
+    messages = [{"role": role, "content": content} for role, content in history]
+    messages.append({"role": "user", "content": text})
+    if extra:
+        messages.append({"role": "system", "content": extra})
+    return [SYSTEM_MESSAGE] + messages[-7:]
+
+async def conversation(turns, reply):
+    async def summarize(messages):
+        return "Customer wants space opera with big ideas for a brother who liked Foundation; shown Hyperion at £9.99."
+
+    context = ConversationContext(summarize)
+    session = Session(1)
+    legacy_history = []
+    legacy, budgeted, build_us = [], [], []
+    for turn in range(turns):
+        text = QUESTIONS[turn % len(QUESTIONS)]
+        extra = SEARCH if text.startswith(("find", "search")) else None
+        legacy.append(legacy_messages(legacy_history, text, extra))
+        start = time.perf_counter()
+        messages = context.build(session, text, extra, reserved=SYSTEM_TOKENS)
+        build_us.append((time.perf_counter() - start) * 1e6)
+        budgeted.append(messages)
+
+        legacy_history = (legacy_history + [("user", text), ("assistant", reply)])[-10:]
+        session.history += [("user", text), ("assistant", reply)]
+        overflow = session.history[:-10]
+        del session.history[:-10]
+        context.compact(session, overflow)
+        await context.drain()
+    return legacy, budgeted, build_us
+
+async def call_latency(mock, payloads):
+    samples = []
+    async with aiohttp.ClientSession() as http:
+        for messages in payloads:
+            start = time.perf_counter()
+            async with http.post(mock.url, json={"model": "m", "messages": messages}) as resp:
+                await resp.read()
+            samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+async def main(turns, ms_per_1k):
+    print(f"{turns} turns, mock prefill {ms_per_1k:g}ms per 1k prompt tokens")
+    async with MockLLM(token_latency=ms_per_1k / 1e6) as mock:
+        for style, reply in (("brief replies", REPLY), ("verbose replies", " ".join([REPLY] * 4))):
+            legacy, budgeted, build_us = await conversation(turns, reply)
+            legacy_tokens = [request_tokens(m[1:]) for m in legacy]
+            budget_tokens = [request_tokens(m) for m in budgeted]
+            before = await call_latency(mock, legacy)
+            after = await call_latency(mock, [[SYSTEM_MESSAGE] + m for m in budgeted])
+
+            print(f"  {style}:")
+            for name, tokens in (("last 7 messages", legacy_tokens), ("token budget", budget_tokens)):
+                print(f"    {name:15}: prompt tokens p50 {statistics.median(tokens):5.0f}  "
+                      f"max {max(tokens):5d}  total {sum(tokens):7d}")
+            print(f"    call latency p50: {before:.1f}ms -> {after:.1f}ms")
+            print(f"    context build   : p50 {statistics.median(build_us):.0f}us  max {max(build_us):.0f}us")
+
+if __name__ == "__main__":
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    ms_per_1k = float(sys.argv[2]) if len(sys.argv) > 2 else 50.0
+    asyncio.run(main(turns, ms_per_1k))
@@ -0,0 +1,66 @@
+# benchmarks/bench_dashboard.py
+"""
+Dashboard data cost per rerun as the orders table grows: stats and
+status list counted from the orders table (as before) versus read from
+the rollup tables, plus the version check that lets an unchanged rerun
+skip every query.
+
+    python -m benchmarks.bench_dashboard [sizes...]
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from orders import OrderRepository
+
+STATUSES = ["Pending", "Processing", "Shipped", "Delivered"]
+
+def fill(path, n):
+    start = datetime(2025, 1, 1)
+    rows = [(str(i), f"Book {i}", random.choice(STATUSES),
+             (start + timedelta(minutes=i * 5)).strftime("%Y-%m-%d %H:%M:%S")) for i in range(n)]
+    with sqlite3.connect(path) as conn:
+        conn.executemany("INSERT INTO orders (user_id, title, status, created_at) VALUES (?, ?, ?, ?)", rows)
+    return rows[-1][3][:10]
+
+def best_of(fn, repeat=20):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main(sizes):
+    print(f"{'orders':>8}  {'counted':>9}  {'rollups':>9}  {'version check':>13}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "orders.db")
+            OrderRepository(path).close()   # schema, rollups and triggers
+            last_day = fill(path, n)
+            week = ((datetime.fromisoformat(last_day) - timedelta(days=6)).date().isoformat(),
+                    (datetime.fromisoformat(last_day) + timedelta(days=1)).date().isoformat())
+            repo = OrderRepository(path)
+
+            def counted():
+                repo._query("SELECT status, COUNT(*) AS n FROM orders GROUP BY status")
+                repo._query("SELECT status, COUNT(*) AS n FROM orders WHERE created_at >= ? AND created_at < ? "
+                            "GROUP BY status", week)
+                repo._query("SELECT DISTINCT status FROM orders ORDER BY status")
+
+            def rollups():
+                repo.order_stats()
+                repo.order_stats(*week)
+                repo.order_statuses()
+                repo.daily_counts(*week)
+
+            print(f"{n:8d}  {best_of(counted):7.2f}ms  {best_of(rollups):7.2f}ms  "
+                  f"{best_of(repo.changes_version):11.3f}ms")
+            repo.close()
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1_000, 10_000, 100_000])
@@ -0,0 +1,286 @@
+# benchmarks/bench_e2e.py
+"""
+End-to-end latency of bot.handle for the search, order and chat flows.
+
+Everything below the handler is real (intent router, sessions, query
+cache, federated search, catalog index, detail enrichment, orders
+repository, shipment queue, LLM client and response cache); only the
+edges are faked: Telegram (fixtures.fake_telegram), the LLM endpoint
+(fixtures.mock_llm), books.toscrape.com (fixtures.fake_catalogue serving
+the saved pages) and the courier. Google Books is left out of the
+federated search so no run touches the network.
+
+Each scenario reports p50/p99 handler latency and throughput, and is
+compared with benchmarks/baselines.json. --profile writes a cProfile dump
+per scenario to benchmarks/profiles/ (event-loop thread only; work done
+in asyncio.to_thread is not captured, while the fakes sharing the loop
+are) and --tracemalloc reports peak traced memory and the top
+allocation sites. Baselines are per machine: re-record them with
+--save-baseline after a deliberate change or on new hardware.
+
+    python -m benchmarks.bench_e2e [scenario ...] [--iterations N] [--concurrency N]
+        [--llm-ms MS] [--profile] [--tracemalloc] [--save-baseline] [--check]
+"""
+import argparse
+import asyncio
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, NamedTuple
+
+import books
+import bot
+import courier
+import orders
+import shipments
+import utils
+from catalog_store import DetailStore
+from federated import FederatedSearch
+from fixtures.fake_catalogue import FakeCatalogue
+from fixtures.fake_telegram import FakeUpdate
+from fixtures.mock_llm import MockLLM
+from scraper import scrape_catalog_async
+from sessions import SessionStore
+
+HERE = os.path.dirname(__file__)
+BASELINE_FILE = os.path.join(HERE, "baselines.json")
+PROFILE_DIR = os.path.join(HERE, "profiles")
+TOLERANCE = 1.5    # flag a metric this many times worse than its baseline...
+NOISE_MS = 2.0     # ...and at least this much slower, so sub-ms jitter isn't a regression
+
+SEARCHES = ["find sharp objects", "search sapiens", "looking for the requiem red",
+            "find tipping the velvet", "search soumission"]
+CHATS = ["hi there", "thanks so much!", "what do you recommend for a rainy day?", "tell me about your shop"]
+
+class Scenario(NamedTuple):
+    name: str
+    message: Callable[[int], str]
+    with_results: bool = False   # user already has search results (order flow)
+    cold: bool = False           # query and response caches switched off
+
+SCENARIOS = [
+    Scenario("search", lambda i: SEARCHES[i % len(SEARCHES)]),
+    Scenario("search_cold", lambda i: SEARCHES[i % len(SEARCHES)], cold=True),
+    Scenario("order", lambda i: "order the first one", with_results=True),
+    Scenario("chat", lambda i: CHATS[i % len(CHATS)]),
+]
+
+def fake_book_shipments(shipments):
+    return [{"tracking_code": f"TRK-BENCH-{s['invoice']}", "status": "Booked"} for s in shipments]
+
+# === ENVIRONMENT ===
+class Environment:
+    """Points the bot's singletons at temp databases and the local fakes; undone on exit."""
+
+    def __init__(self, llm_ms: float):
+        self.llm = MockLLM(reply="You'll love *Sharp Objects* - a gripping read for £47.82!",
+                           latency=llm_ms / 1000)
+        self.site = FakeCatalogue()
+        self.tmp = tempfile.TemporaryDirectory(prefix="bench_e2e_")
+        self._saved = []
+        self.catalog: List[dict] = []
+
+    def patch(self, module, name, value):
+        self._saved.append((module, name, getattr(module, name)))
+        setattr(module, name, value)
+
+    async def __aenter__(self):
+        await self.llm.start()
+        await self.site.start()
+        path = lambda name: os.path.join(self.tmp.name, name)
+        self.patch(utils, "_client", utils.LLMClient(url=self.llm.url, api_key="bench", max_concurrency=64))
+        self.patch(utils, "_response_cache", utils.ResponseCache())
+        self.patch(books, "CACHE_FILE", path("book_cache.json"))
+        self.patch(books, "CATALOG_BACKEND", "json")
+        self.patch(books, "_index", None)
+        self.patch(books, "_detail_store", DetailStore(path("bookbot.db")))
+        self.patch(books, "_federated", FederatedSearch([books.CatalogSource()], books.SEARCH_DEADLINE))
+        self.patch(books, "query_cache", books.QueryCache(books.QUERY_TTLS, volatile=("catalog", "miss")))
+        self.patch(bot, "_sessions", SessionStore(path("bookbot.db")))
+        self.patch(orders, "_repository", orders.OrderRepository(path("orders.db")))
+        self.patch(shipments, "_queue", shipments.ShipmentQueue(path("orders.db")))
+        self.patch(courier, "book_shipments", fake_book_shipments)
+        self.patch(utils, "ENABLED_ROUTES", set(utils.ENABLED_ROUTES))
+        self._routes = utils.ENABLED_ROUTES
+
+        self.catalog = await scrape_catalog_async(base_url=self.site.url)
+        await asyncio.to_thread(books.save_catalog_refresh, self.catalog)
+        await shipments.get_shipment_queue().start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await bot.drain_edits()
+        await shipments.get_shipment_queue().stop()
+        await utils.get_llm_client().close()
+        bot.get_sessions().close()
+        orders.get_repository().close()
+        for module, name, value in reversed(self._saved):
+            setattr(module, name, value)
+        await self.site.stop()
+        await self.llm.stop()
+        self.tmp.cleanup()
+
+    def caches(self, enabled: bool):
+        utils.ENABLED_ROUTES = self._routes if enabled else set()
+        books.query_cache.ttls = dict(books.QUERY_TTLS) if enabled else dict.fromkeys(books.QUERY_TTLS, 0)
+
+# === RUNNING ===
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+async def drive(env: Environment, scenario: Scenario, iterations: int, concurrency: int,
+                first_user: int) -> List[float]:
+    limit = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one(i):
+        update = FakeUpdate(scenario.message(i), user_id=first_user + i)
+        if scenario.with_results:
+            session = await bot.get_sessions().get_async(first_user + i)
+            session.last_books = [dict(b) for b in env.catalog[:3]]
+        async with limit:
+            start = time.perf_counter()
+            await bot.handle(update, None)
+            samples.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one(i) for i in range(iterations)))
+    return samples
+
+async def run_scenario(env: Environment, scenario: Scenario, iterations: int, concurrency: int,
+                       profile: bool = False, trace: bool = False) -> dict:
+    # Scenarios use disjoint user ids so each message starts a fresh session
+    first_user = 1_000_000 * (SCENARIOS.index(scenario) + 1)
+    env.caches(not scenario.cold)
+    try:
+        await drive(env, scenario, max(1, iterations // 10), concurrency, first_user)   # warm-up
+        profiler = cProfile.Profile() if profile else None
+        if trace:
+            tracemalloc.start()
+        if profiler:
+            profiler.enable()
+        start = time.perf_counter()
+        samples = await drive(env, scenario, iterations, concurrency, first_user + iterations)
+        elapsed = time.perf_counter() - start
+        if profiler:
+            profiler.disable()
+        result = {
+            "p50_ms": round(percentile(samples, 0.50), 3),
+            "p99_ms": round(percentile(samples, 0.99), 3),
+            "mean_ms": round(statistics.fmean(samples), 3),
+            "throughput": round(iterations / elapsed, 1),
+        }
+        if trace:
+            snapshot = tracemalloc.take_snapshot()
+            result["peak_kb"] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+            tracemalloc.stop()
+            result["top_allocations"] = [
+                f"{stat.traceback[0].filename}:{stat.traceback[0].lineno} {stat.size / 1024:.1f}KB"
+                for stat in snapshot.filter_traces([
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+                ]).statistics("lineno")[:5]
+            ]
+        if profiler:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            result["profile"] = os.path.join(PROFILE_DIR, f"{scenario.name}.prof")
+            profiler.dump_stats(result["profile"])
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(12)
+            result["hot_paths"] = out.getvalue()
+        return result
+    finally:
+        env.caches(True)
+
+async def run(names: List[str], iterations: int, concurrency: int, llm_ms: float,
+              profile: bool = False, trace: bool = False) -> Dict[str, dict]:
+    chosen = [s for s in SCENARIOS if s.name in names] if names else SCENARIOS
+    async with Environment(llm_ms) as env:
+        return {s.name: await run_scenario(env, s, iterations, concurrency, profile, trace) for s in chosen}
+
+# === BASELINES ===
+def load_baseline(path: str = BASELINE_FILE) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_baseline(settings: dict, results: Dict[str, dict], path: str = BASELINE_FILE):
+    baseline = load_baseline(path)
+    if baseline.get("settings") != settings:
+        baseline = {"settings": settings, "scenarios": {}}
+    for name, result in results.items():
+        baseline["scenarios"][name] = {k: result[k] for k in ("p50_ms", "p99_ms", "throughput")}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2)
+        f.write("\n")
+
+def regressions(results: Dict[str, dict], baseline: Dict[str, dict]) -> List[str]:
+    """Human-readable list of metrics that got worse than the baseline allows."""
+    found = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for key in ("p50_ms", "p99_ms"):
+            if result[key] > base[key] * TOLERANCE + NOISE_MS:
+                found.append(f"{name} {key}: {result[key]:.2f} vs baseline {base[key]:.2f}")
+        if result["throughput"] < base["throughput"] / TOLERANCE:
+            found.append(f"{name} throughput: {result['throughput']:.0f}/s vs baseline {base['throughput']:.0f}/s")
+    return found
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="End-to-end bot.handle benchmark")
+    parser.add_argument("scenarios", nargs="*", help=f"any of {', '.join(s.name for s in SCENARIOS)}")
+    parser.add_argument("--iterations", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-ms", type=float, default=20.0, help="mock LLM latency")
+    parser.add_argument("--profile", action="store_true", help="cProfile each scenario")
+    parser.add_argument("--tracemalloc", action="store_true", help="trace allocations per scenario")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="exit 1 on a regression")
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.WARNING)  # no per-message events
+    settings = {"iterations": args.iterations, "concurrency": args.concurrency, "llm_ms": args.llm_ms}
+    results = asyncio.run(run(args.scenarios, args.iterations, args.concurrency, args.llm_ms,
+                              args.profile, args.tracemalloc))
+
+    baseline = load_baseline()
+    comparable = baseline.get("settings") == settings
+    base = baseline.get("scenarios", {}) if comparable else {}
+    print(f"{args.iterations} messages per scenario, concurrency {args.concurrency}, mock LLM {args.llm_ms:g}ms")
+    for name, r in results.items():
+        line = f"  {name:12}: p50 {r['p50_ms']:7.2f}ms  p99 {r['p99_ms']:7.2f}ms  {r['throughput']:7.0f} msg/s"
+        if name in base:
+            line += f"   (baseline p50 {base[name]['p50_ms']:.2f}ms p99 {base[name]['p99_ms']:.2f}ms)"
+        if "peak_kb" in r:
+            line += f"  peak {r['peak_kb']:.0f}KB"
+        print(line)
+        for site in r.get("top_allocations", []):
+            print(f"      {site}")
+        if "hot_paths" in r:
+            print(f"    profile: {r['profile']}")
+            print(r["hot_paths"])
+    if baseline and not comparable:
+        print(f"Baseline was recorded with {baseline.get('settings')}; not compared")
+
+    if args.save_baseline:
+        save_baseline(settings, results)
+        print(f"Baseline saved to {BASELINE_FILE}")
+        return 0
+    found = regressions(results, base)
+    for line in found:
+        print(f"REGRESSION {line}")
+    return 1 if found and args.check else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
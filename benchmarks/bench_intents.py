@@ -0,0 +1,55 @@
+# benchmarks/bench_intents.py
+"""
+Intent routing throughput over the labelled corpus: the keyword
+any(...) chains bot.handle used before versus intents.parse_intent.
+Also reports how many corpus messages each one routes correctly.
+
+    python -m benchmarks.bench_intents [rounds]
+"""
+import json
+import re
+import sys
+import time
+
+from intents import parse_intent
+
+CORPUS = "fixtures/intent_corpus.jsonl"
+
+def legacy(text):
+    # bot.handle's routing before intents.py, minus the I/O
+    if any(k in text.lower() for k in ['find', 'search', 'want', 'show']):
+        query = re.sub(r'\b(find|search|want|show|me|for|books?)\b', '', text, flags=re.IGNORECASE).strip() or "best"
+        return "search", query
+    elif any(k in text.lower() for k in ['order', 'buy', 'this one', 'first', 'second', 'third']):
+        idx = 0
+        m = re.search(r'\b(\d+)\b', text)
+        if m:
+            idx = int(m.group(1)) - 1
+        elif "first" in text.lower(): idx = 0
+        elif "second" in text.lower(): idx = 1
+        elif "third" in text.lower(): idx = 2
+        return "order", idx
+    return "chat", None
+
+def measure(route, messages, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in messages:
+            route(text)
+    return len(messages) * rounds / (time.perf_counter() - start)
+
+def main(rounds):
+    with open(CORPUS, encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+    messages = [c["text"] for c in cases]
+    old_rate = measure(legacy, messages, rounds)
+    new_rate = measure(parse_intent, messages, rounds)
+    old_right = sum(legacy(c["text"])[0] == c["intent"] for c in cases)
+    new_right = sum(parse_intent(c["text"]).name == c["intent"] for c in cases)
+
+    print(f"{len(messages)} corpus messages x {rounds} rounds")
+    print(f"  any() chains : {old_rate:9.0f} msgs/s  {old_right}/{len(cases)} routed correctly")
+    print(f"  IntentRouter : {new_rate:9.0f} msgs/s  {new_right}/{len(cases)} routed correctly")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
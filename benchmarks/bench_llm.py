@@ -0,0 +1,59 @@
+# benchmarks/bench_llm.py
+"""
+LLM call latency percentiles against the local mock server: the old
+session-per-call call_llm versus the pooled LLMClient.
+
+    python -m benchmarks.bench_llm [calls] [concurrency]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+import aiohttp
+
+from fixtures.mock_llm import MockLLM
+from utils import LLMClient, build_payload
+
+async def legacy_call(url, messages):
+    # What utils.call_llm did before LLMClient: new session, body read twice
+    async with aiohttp.ClientSession() as session:
+        async with session.post(url, json=build_payload(messages, 0.3, 200),
+                                headers={"Authorization": "Bearer test"}, timeout=15) as resp:
+            await resp.text()
+            data = await resp.json()
+            return data["choices"][0]["message"]["content"]
+
+def percentiles(samples):
+    qs = statistics.quantiles(samples, n=100)
+    return {"p50": qs[49], "p95": qs[94], "p99": qs[98]}
+
+async def measure(call, calls, concurrency):
+    limit = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one(i):
+        async with limit:
+            start = time.perf_counter()
+            await call([{"role": "user", "content": f"hello {i}"}])
+            samples.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    return percentiles(samples), calls / (time.perf_counter() - start)
+
+async def main(calls, concurrency):
+    async with MockLLM(latency=0.005) as mock:
+        before, before_rate = await measure(lambda m: legacy_call(mock.url, m), calls, concurrency)
+        client = LLMClient(url=mock.url, api_key="test", max_concurrency=concurrency, pool_size=concurrency)
+        after, after_rate = await measure(client.complete, calls, concurrency)
+        await client.close()
+
+    print(f"{calls} calls, concurrency {concurrency}, mock latency 5ms")
+    for name, p, rate in (("session per call", before, before_rate), ("pooled client", after, after_rate)):
+        print(f"  {name:17}: p50 {p['p50']:6.2f}ms  p95 {p['p95']:6.2f}ms  p99 {p['p99']:6.2f}ms  {rate:7.0f} calls/s")
+
+if __name__ == "__main__":
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    asyncio.run(main(calls, concurrency))
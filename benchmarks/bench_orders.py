@@ -0,0 +1,66 @@
+# benchmarks/bench_orders.py
+"""
+Orders/sec under N concurrent writers: the old connect-per-call insert
+versus OrderRepository's single writer thread with group commit.
+
+    python -m benchmarks.bench_orders [writers] [orders_per_writer]
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from orders import INSERT_ORDER, OrderRepository, init_db
+
+def naive_insert(path, i):
+    # What orders.create_order did before the repository
+    with sqlite3.connect(path, timeout=30) as conn:
+        cur = conn.cursor()
+        cur.execute(INSERT_ORDER, (str(i), "isbn", "title", "addr"))
+        conn.commit()
+        return cur.lastrowid
+
+def run_threads(writers, per_writer, fn):
+    def work(w):
+        for i in range(per_writer):
+            fn(w * per_writer + i)
+    threads = [threading.Thread(target=work, args=(w,)) for w in range(writers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return writers * per_writer / (time.perf_counter() - start)
+
+async def run_async(repo, writers, per_writer):
+    async def work(w):
+        for i in range(per_writer):
+            await repo.create_order_async(str(w * per_writer + i), "isbn", "title", "addr")
+    start = time.perf_counter()
+    await asyncio.gather(*(work(w) for w in range(writers)))
+    return writers * per_writer / (time.perf_counter() - start)
+
+def main():
+    writers = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    per_writer = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    with tempfile.TemporaryDirectory() as tmp:
+        naive_db = os.path.join(tmp, "naive.db")
+        init_db(naive_db)
+        naive = run_threads(writers, per_writer, lambda i: naive_insert(naive_db, i))
+
+        repo = OrderRepository(os.path.join(tmp, "repo.db"))
+        threaded = run_threads(writers, per_writer, lambda i: repo.create_order(str(i), "isbn", "title", "addr"))
+        async_rate = asyncio.run(run_async(repo, writers, per_writer))
+        repo.close()
+
+    print(f"{writers} writers x {per_writer} orders")
+    print(f"  connect-per-call      : {naive:10.0f} orders/s")
+    print(f"  repository (threads)  : {threaded:10.0f} orders/s")
+    print(f"  repository (asyncio)  : {async_rate:10.0f} orders/s")
+
+if __name__ == "__main__":
+    main()
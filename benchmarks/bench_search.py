@@ -0,0 +1,64 @@
+# benchmarks/bench_search.py
+"""
+CatalogIndex build time and query latency on synthetic catalogs:
+exact queries, shuffled word order and one-typo queries (which now hit
+the trigram fallback instead of missing).
+
+    python -m benchmarks.bench_search [sizes...]
+"""
+import random
+import statistics
+import sys
+import time
+
+from search_index import CatalogIndex
+
+WORDS = (
+    "atomic habits light attic velvet sapiens brief history humankind requiem red dune "
+    "shadow garden river stone winter crown empire silent ocean night glass city queen "
+    "forgotten secret island storm memory dragon letters journey hidden kingdom golden "
+    "broken promise wild heart fire summer house lost star midnight road song iron"
+).split()
+
+def make_catalog(n, rng):
+    books = []
+    for i in range(n):
+        # A serial word keeps titles distinct and the vocabulary growing with n
+        title = " ".join(rng.sample(WORDS, rng.randint(2, 4)) + [f"vol{i}"])
+        books.append({"title": title.title(), "authors": f"Author {i % 997}", "isbn": f"{i:013d}"})
+    return books
+
+def typo(word, rng):
+    i = rng.randrange(1, len(word))
+    return word[:i] + word[i + 1:] if rng.random() < 0.5 else word[:i] + word[i - 1] + word[i:]
+
+def latencies(index, queries):
+    samples = []
+    for q in queries:
+        start = time.perf_counter()
+        index.search_scored(q, 5)
+        samples.append((time.perf_counter() - start) * 1000)
+    qs = statistics.quantiles(samples, n=100)
+    return qs[49], qs[98]
+
+def main(sizes):
+    rng = random.Random(7)
+    for n in sizes:
+        books = make_catalog(n, rng)
+        start = time.perf_counter()
+        index = CatalogIndex(books)
+        build = time.perf_counter() - start
+        picks = [rng.choice(books)["title"].lower().split()[:-1] for _ in range(300)]
+        exact = [" ".join(words) for words in picks]
+        shuffled = [" ".join(rng.sample(words, len(words))) for words in picks]
+        typos = [" ".join(typo(w, rng) if j == 0 else w for j, w in enumerate(words)) for words in picks]
+        hits = sum(bool(index.search(q, 5)) for q in typos)
+
+        print(f"{n} titles: index built in {build:.2f}s")
+        for name, queries in (("exact", exact), ("word order", shuffled), ("one typo", typos)):
+            p50, p99 = latencies(index, queries)
+            print(f"  {name:10}: p50 {p50:7.2f}ms  p99 {p99:7.2f}ms")
+        print(f"  typo queries with results: {hits}/{len(typos)}")
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1_000, 100_000])
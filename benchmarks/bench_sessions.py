@@ -0,0 +1,59 @@
+# benchmarks/bench_sessions.py
+"""
+Memory held by N chat sessions with full history: the old dict-of-dicts
+bot.user_data layout versus sessions.Session records.
+
+    python -m benchmarks.bench_sessions [sessions]
+"""
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from sessions import MAX_HISTORY, SessionStore
+
+def turns(user_id):
+    for i in range(MAX_HISTORY // 2):
+        yield f"show me book number {i} for user {user_id}", f"Try *Book {i}* for *£{i}.99*! Want it?"
+
+def measure(build):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    holder = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return size, holder
+
+def legacy(n):
+    user_data = {}
+    for user_id in range(n):
+        data = user_data[user_id] = {"history": [], "last_books": []}
+        for message, response in turns(user_id):
+            data["history"].append({"role": "user", "content": message})
+            data["history"].append({"role": "assistant", "content": response})
+    return user_data
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    legacy_bytes, _ = measure(lambda: legacy(n))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SessionStore(os.path.join(tmp, "s.db"), max_sessions=n)
+
+        def build():
+            for user_id in range(n):
+                session = store.get(user_id)
+                for message, response in turns(user_id):
+                    store.record_turn(session, message, response)
+            store._pending_messages.clear()  # count resident sessions, not the write-behind buffer
+            return store
+        store_bytes, _ = measure(build)
+        store.close()
+
+    print(f"{n} sessions x {MAX_HISTORY} messages")
+    print(f"  dict user_data : {legacy_bytes / 2**20:8.1f} MiB  ({legacy_bytes / n:6.0f} B/session)")
+    print(f"  SessionStore   : {store_bytes / 2**20:8.1f} MiB  ({store_bytes / n:6.0f} B/session)")
+
+if __name__ == "__main__":
+    main()
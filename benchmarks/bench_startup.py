@@ -0,0 +1,103 @@
+# benchmarks/bench_startup.py
+"""
+Cold start, each measured in a fresh interpreter: import time of the
+entry points (median of runs, from -X importtime) with the heaviest
+modules behind bot, then the time until the first catalog search is
+answered when the catalog warms while Telegram connects versus when the
+first search builds it. connect_ms stands in for initialize() (getMe)
+and the first getUpdates round trip.
+
+    python -m benchmarks.bench_startup [runs] [books] [connect_ms]
+"""
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ENTRY_POINTS = ["bot", "orders", "books", "utils"]
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def import_times(module):
+    """Cumulative microseconds per module for one `import module` in a new process."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                         cwd=ROOT, capture_output=True, text=True, check=True).stderr
+    times = {}
+    for line in out.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        times.setdefault(depth, []).append((name.strip(), int(cumulative)))
+    return times
+
+def import_report(runs):
+    print(f"import time, median of {runs} fresh processes:")
+    for module in ENTRY_POINTS:
+        samples = [import_times(module) for _ in range(runs)]
+        total = statistics.median(dict(s[0])[module] for s in samples) / 1000
+        print(f"  {module:8}: {total:7.1f}ms")
+        if module == "bot":
+            # Direct imports of bot, heaviest first
+            children = {}
+            for s in samples:
+                for name, us in s.get(1, []):
+                    children.setdefault(name, []).append(us)
+            heaviest = sorted(children.items(), key=lambda kv: -statistics.median(kv[1]))[:6]
+            for name, us in heaviest:
+                print(f"    {name:14} {statistics.median(us) / 1000:7.1f}ms")
+
+# === COLD START TO FIRST SEARCH ===
+def write_catalog(path, n):
+    rng = random.Random(7)
+    words = "atomic habits velvet dune shadow garden river winter crown empire ocean night glass queen".split()
+    books = [{"title": f"{' '.join(rng.sample(words, 3)).title()} Vol{i}", "authors": f"Author {i % 997}",
+              "isbn": f"{i:013d}", "price": "£9.99"} for i in range(n)]
+    books.append({"title": "Dune", "authors": "Frank Herbert", "isbn": "9780441013593", "price": "£9.99"})
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"books": books, "timestamp": datetime.now().isoformat()}, f)
+
+def child(mode, connect_ms):
+    """Runs in the fresh process: import bot, build, 'connect', answer one search."""
+    started = time.perf_counter()
+    import bot
+    imported = time.perf_counter()
+    bot.build_application("123:bench", warm=mode == "warm")
+    time.sleep(connect_ms / 1000)   # the GIL is free, as it is while waiting on Telegram
+    connected = time.perf_counter()
+    found = asyncio.run(bot.search_books_async("dune", 3))
+    done = time.perf_counter()
+    print(json.dumps({"import_ms": (imported - started) * 1000, "search_ms": (done - connected) * 1000,
+                      "ready_ms": (done - started) * 1000, "found": len(found)}))
+
+def cold_start(mode, catalog_dir, connect_ms):
+    out = subprocess.run([sys.executable, "-m", "benchmarks.bench_startup", "child", mode, str(connect_ms)],
+                         cwd=catalog_dir, capture_output=True, text=True, check=True,
+                         env={**os.environ, "PYTHONPATH": ROOT, "BOOKBOT_CATALOG": "json"})
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def cold_start_report(runs, n, connect_ms):
+    print(f"\nfirst search after start, {n} books, {connect_ms}ms simulated connect, median of {runs}:")
+    with tempfile.TemporaryDirectory() as tmp:
+        write_catalog(os.path.join(tmp, "book_cache.json"), n)
+        for mode, label in (("lazy", "built on first search"), ("warm", "warmed while connecting")):
+            samples = [cold_start(mode, tmp, connect_ms) for _ in range(runs)]
+            assert all(s["found"] for s in samples), "benchmark search found nothing"
+            med = {k: statistics.median(s[k] for s in samples) for k in ("import_ms", "search_ms", "ready_ms")}
+            print(f"  {label:24}: import {med['import_ms']:6.1f}ms  first search {med['search_ms']:7.1f}ms  "
+                  f"answered at {med['ready_ms']:7.1f}ms")
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["child"]:
+        child(sys.argv[2], float(sys.argv[3]))
+    else:
+        runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+        n = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+        connect_ms = int(sys.argv[3]) if len(sys.argv) > 3 else 300
+        import_report(runs)
+        cold_start_report(runs, n, connect_ms)
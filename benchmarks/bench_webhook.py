@@ -0,0 +1,138 @@
+# benchmarks/bench_webhook.py
+"""
+Webhook ingestion throughput: POSTs synthetic Telegram updates to local
+webhook workers running the real bot handlers (LLM, search and Bot API
+faked). Reports acknowledged updates/s and ack latency percentiles; with
+one worker it also times until every reply has been sent.
+
+    python -m benchmarks.bench_webhook [updates] [concurrency] [workers] [llm_ms]
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+import bot
+import shipments
+import webhook
+from fixtures.fake_bot_api import FakeBotAPI, text_update
+from sessions import SessionStore
+
+SECRET = "bench-secret"
+PATH = "/telegram"
+MESSAGES = ["hi there", "find atomic habits", "any good thrillers?", "search dune", "thanks!"]
+LLM_MS = 20.0
+WORKDIR = tempfile.mkdtemp(prefix="bench_webhook_")
+
+def build(workers=1, api=None):
+    async def fake_reply(update, messages, route=None):
+        await asyncio.sleep(LLM_MS / 1000)
+        return "Sounds good!"
+
+    async def fake_search(query, limit=3):
+        return [{"title": "Dune", "authors": ["Frank Herbert"], "price": "£9.99", "isbn": "9780441013593"}]
+
+    bot.generate_reply = fake_reply
+    bot.search_books_async = fake_search
+    bot.STREAM_REPLIES = False
+    logging.getLogger().setLevel(logging.WARNING)  # no per-message events
+    bot._sessions = SessionStore(os.path.join(WORKDIR, "bookbot.db"), shared=workers > 1)
+    shipments._queue = shipments.ShipmentQueue(os.path.join(WORKDIR, "orders.db"))
+    return bot.build_application("123:bench", request=api or FakeBotAPI())
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def wait_ready(http, port):
+    for _ in range(200):
+        try:
+            async with http.get(f"http://127.0.0.1:{port}/healthz"):
+                return
+        except aiohttp.ClientConnectionError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError("webhook server did not start")
+
+async def post_all(port, updates, concurrency):
+    limit = asyncio.Semaphore(concurrency)
+    latencies = []
+    url = f"http://127.0.0.1:{port}{PATH}"
+
+    async def one(http, body):
+        async with limit:
+            start = time.perf_counter()
+            async with http.post(url, json=body, headers={webhook.SECRET_HEADER: SECRET}) as resp:
+                assert resp.status == 200, resp.status
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    # force_close: a fresh connection per update, like Telegram's many senders,
+    # so SO_REUSEPORT gets to spread them across workers
+    connector = aiohttp.TCPConnector(limit=concurrency, force_close=True)
+    async with aiohttp.ClientSession(connector=connector) as http:
+        await wait_ready(http, port)
+        start = time.perf_counter()
+        await asyncio.gather(*(one(http, body) for body in updates))
+        elapsed = time.perf_counter() - start
+    return elapsed, latencies
+
+def report(n, elapsed, latencies):
+    qs = statistics.quantiles(latencies, n=100)
+    print(f"  acked      : {n / elapsed:8.0f} updates/s ({elapsed:.2f}s)")
+    print(f"  ack latency: p50 {qs[49]:6.2f}ms  p99 {qs[98]:6.2f}ms")
+
+async def single_worker(port, updates, concurrency):
+    api = FakeBotAPI()
+    application = build(1, api)
+    stop = asyncio.Event()
+    server = asyncio.create_task(
+        webhook.serve(application, SECRET, "127.0.0.1", port, PATH, stop=stop)
+    )
+    elapsed, latencies = await post_all(port, updates, concurrency)
+    start = time.perf_counter() - elapsed
+    while len(api.sent) + bot.scheduler.shed < len(updates):
+        await asyncio.sleep(0.01)
+    done = time.perf_counter() - start
+    stop.set()
+    await server
+    report(len(updates), elapsed, latencies)
+    print(f"  replied    : {len(api.sent) / done:8.0f} updates/s ({done:.2f}s, {bot.scheduler.shed} shed)")
+
+def main(n, concurrency, workers):
+    port = free_port()
+    updates = [text_update(i, random.randrange(n // 4 or 1), random.choice(MESSAGES)) for i in range(n)]
+    print(f"{n} updates, {concurrency} concurrent senders, {workers} worker(s), mock LLM {LLM_MS:.0f}ms")
+    if workers == 1:
+        asyncio.run(single_worker(port, updates, concurrency))
+        return
+    procs = [
+        multiprocessing.Process(
+            target=webhook._run_worker,
+            args=(lambda: build(workers), i, SECRET, "127.0.0.1", port, PATH, None, True),
+        )
+        for i in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    try:
+        elapsed, latencies = asyncio.run(post_all(port, updates, concurrency))
+        report(n, elapsed, latencies)
+    finally:
+        for p in procs:
+            p.terminate()
+            p.join()
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    LLM_MS = float(sys.argv[4]) if len(sys.argv) > 4 else LLM_MS
+    main(n, concurrency, workers)
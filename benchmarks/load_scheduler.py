@@ -0,0 +1,66 @@
+# benchmarks/load_scheduler.py
+"""
+Load test for bot.handle behind the Scheduler: thousands of simulated
+users, a mocked LLM with fixed latency, and a few chatty users who send
+bursts. Reports throughput, queue-wait percentiles and shed updates.
+
+    python -m benchmarks.load_scheduler [users] [concurrency] [llm_ms]
+"""
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+import bot
+from fixtures.fake_telegram import FakeUpdate
+from scheduler import BUSY_REPLY, Scheduler
+from sessions import SessionStore
+
+MESSAGES = ["hi there", "find atomic habits", "any good thrillers?", "search dune", "thanks!"]
+
+async def main(users, concurrency, llm_ms):
+    async def fake_reply(update, messages, route=None):
+        await asyncio.sleep(llm_ms / 1000)
+        return "Sounds good!"
+
+    async def fake_search(query, limit=3):
+        await asyncio.sleep(0.001)
+        return [{"title": "Dune", "authors": ["Frank Herbert"], "price": "£9.99", "isbn": "9780441013593"}]
+
+    bot.generate_reply = fake_reply
+    bot.search_books_async = fake_search
+    logging.getLogger().setLevel(logging.WARNING)  # no per-message events
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bot._sessions = SessionStore(os.path.join(tmp, "load.db"), max_sessions=users)
+        sched = Scheduler(max_concurrency=concurrency, max_queue=users * 2)
+        handler = sched.wrap(bot.handle)
+
+        updates = [FakeUpdate(random.choice(MESSAGES), user_id=u) for u in range(users)]
+        # 1% of users fire a burst of ten messages at once
+        for u in range(0, users, 100):
+            updates += [FakeUpdate(random.choice(MESSAGES), user_id=u) for _ in range(9)]
+        random.shuffle(updates)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(handler(u, None) for u in updates))
+        elapsed = time.perf_counter() - start
+        stats = sched.stats()
+        await sched.stop()
+        bot._sessions.close()
+
+    busy = sum(1 for u in updates if u.message.sent and u.message.sent[0].edits[0][0] == BUSY_REPLY)
+    print(f"{len(updates)} updates from {users} users, concurrency {concurrency}, mock LLM {llm_ms}ms")
+    print(f"  throughput : {stats['completed'] / elapsed:8.0f} updates/s ({elapsed:.2f}s)")
+    print(f"  queue wait : p50 {stats['wait_p50'] * 1000:7.1f}ms  p99 {stats['wait_p99'] * 1000:7.1f}ms  "
+          f"max {stats['wait_max'] * 1000:7.1f}ms")
+    print(f"  shed       : {stats['shed']} ({busy} got the busy reply)")
+
+if __name__ == "__main__":
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    llm_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 20
+    asyncio.run(main(users, concurrency, llm_ms))
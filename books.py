@@ -1,15 +1,24 @@
 # books.py
-import requests
-from bs4 import BeautifulSoup
+import asyncio
 import json
 import os
 import re
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
-# Enhanced logging
-logging.basicConfig(level=logging.INFO)
+import aiohttp
+
+from cache import QueryCache
+from catalog_store import CatalogStore, DetailStore
+from federated import FederatedSearch, SearchSource
+from metrics import counter, histogram
+from scraper import CatalogScraper, parse_book_details, parse_catalog_page, scrape_catalog_async
+from search_index import CatalogIndex, normalize, repair_mojibake
+
 logger = logging.getLogger(__name__)
 
 # Configuration
@@ -19,69 +28,183 @@ CACHE_FILE = "book_cache.json"
 CACHE_EXPIRY = timedelta(hours=24)
 GOOGLE_BOOKS_API = "https://www.googleapis.com/books/v1/volumes"
 
+# "swr": serve an expired cache while a background refresh runs.
+# "strict": the old behaviour, an expired cache reads as empty.
+CACHE_MODE = os.getenv("BOOKBOT_CACHE_MODE", "swr")
+JOURNAL_MAX_ENTRIES = 50  # fold deltas into the snapshot past this many
+
+REPAIR_FIELDS = ("title", "price", "authors", "description")
+
+def repair_books(books: List[dict]) -> List[dict]:
+    """Fix mojibake (e.g. "Â£51.77") left in caches written before scraping decoded UTF-8."""
+    for book in books:
+        for field in REPAIR_FIELDS:
+            if isinstance(book.get(field), str):
+                book[field] = repair_mojibake(book[field])
+    return books
+
+def diff_catalog(old: List[dict], new: List[dict]) -> Tuple[List[dict], dict]:
+    """
+    Compare two scrapes by URL. Returns the merged catalog (new order,
+    enriched fields carried over from old) and the delta between them.
+    """
+    old_by_url = {b["url"]: b for b in old}
+    new_urls = {b["url"] for b in new}
+    merged, added, changed = [], [], {}
+    for book in new:
+        prev = old_by_url.get(book["url"])
+        if prev is None:
+            added.append(book)
+            merged.append(book)
+            continue
+        if prev.get("price") != book.get("price"):
+            changed[book["url"]] = book.get("price")
+        merged.append({**prev, "title": book["title"], "price": book.get("price")})
+    removed = [url for url in old_by_url if url not in new_urls]
+    return merged, {"added": added, "removed": removed, "changed": changed}
+
+def apply_delta(books: List[dict], delta: dict) -> List[dict]:
+    removed = set(delta.get("removed", ()))
+    changed = delta.get("changed", {})
+    result = []
+    for book in books:
+        if book["url"] in removed:
+            continue
+        if book["url"] in changed:
+            book = {**book, "price": changed[book["url"]]}
+        result.append(book)
+    return result + delta.get("added", [])
+
 class BookCache:
-    def __init__(self, filename: str):
+    """
+    JSON snapshot plus an append-only journal of refresh deltas
+    (<file>.delta, one JSON object per line). Refreshes append a line;
+    the journal is folded back into the snapshot once it grows long.
+    """
+
+    def __init__(self, filename: str, mode: str = CACHE_MODE):
         self.filename = filename
-        self.cache = self.load()
+        self.journal = f"{filename}.delta"
+        self.mode = mode
     
     def load(self) -> dict:
         try:
             if os.path.exists(self.filename):
                 with open(self.filename, 'r', encoding='utf-8') as f:
                     data = json.load(f)
-                    # Check cache freshness
-                    if data.get('timestamp'):
-                        cache_time = datetime.fromisoformat(data['timestamp'])
-                        if datetime.now() - cache_time > CACHE_EXPIRY:
-                            return {"books": [], "timestamp": None}
-                    return data
+                data["journal_entries"] = 0
+                if os.path.exists(self.journal):
+                    with open(self.journal, 'r', encoding='utf-8') as f:
+                        for line in f:
+                            if not line.strip():
+                                continue
+                            delta = json.loads(line)
+                            data["books"] = apply_delta(data.get("books", []), delta)
+                            data["timestamp"] = delta["timestamp"]
+                            data["journal_entries"] += 1
+                repair_books(data.get("books", []))
+                data["count"] = len(data.get("books", []))
+                # Check cache freshness
+                data["stale"] = self.is_stale(data)
+                if data["stale"] and self.mode == "strict":
+                    return {"books": [], "timestamp": None, "stale": True}
+                return data
         except Exception as e:
             logger.error(f"Cache load error: {e}")
-        return {"books": [], "timestamp": None}
+        return {"books": [], "timestamp": None, "stale": True}
+
+    @staticmethod
+    def is_stale(data: dict) -> bool:
+        if not data.get('timestamp'):
+            return True
+        cache_time = datetime.fromisoformat(data['timestamp'])
+        return datetime.now() - cache_time > CACHE_EXPIRY
     
     def save(self, books: List[dict]):
+        """Write a full snapshot and drop the journal it supersedes."""
         try:
             cache = {
                 "books": books,
                 "timestamp": datetime.now().isoformat(),
                 "count": len(books)
             }
-            with open(self.filename, 'w', encoding='utf-8') as f:
-                json.dump(cache, f, indent=2, ensure_ascii=False)
+            tmp = f"{self.filename}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(cache, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp, self.filename)
+            if os.path.exists(self.journal):
+                os.remove(self.journal)
         except Exception as e:
             logger.error(f"Cache save error: {e}")
 
+    def save_refresh(self, books: List[dict]) -> Tuple[List[dict], dict]:
+        """Diff a fresh scrape against the cache and persist only the delta."""
+        current = BookCache(self.filename, "swr").load()
+        if not current.get("books"):
+            self.save(books)
+            return books, {"added": books, "removed": [], "changed": {}}
+        merged, delta = diff_catalog(current["books"], books)
+        if current["journal_entries"] >= JOURNAL_MAX_ENTRIES:
+            self.save(merged)
+            return merged, delta
+        try:
+            with open(self.journal, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({"timestamp": datetime.now().isoformat(), **delta},
+                                   ensure_ascii=False, separators=(',', ':')) + "\n")
+        except Exception as e:
+            logger.error(f"Cache journal error: {e}")
+        return merged, delta
+
+# === CACHE METRICS ===
+CATALOG_LOOKUPS = counter("bookbot_catalog_lookups_total", "Catalog lookups, by result (hit, stale_hit, miss)")
+CATALOG_REFRESH_SECONDS = histogram("bookbot_catalog_refresh_seconds", "Catalog rescrape time, by outcome",
+                                    buckets=(1, 5, 15, 30, 60, 120, 300, 600))
+CATALOG_CHANGES = counter("bookbot_catalog_refresh_changes_total", "Books added, removed or repriced by refreshes")
+
+def record_lookup(hit: bool, stale: bool = False):
+    CATALOG_LOOKUPS.inc(result=("stale_hit" if stale else "hit") if hit else "miss")
+
+def record_refresh(seconds: float, delta: Optional[dict]):
+    """Time a rescrape; delta is None when it failed or found nothing."""
+    CATALOG_REFRESH_SECONDS.observe(seconds, outcome="error" if delta is None else "ok")
+    for kind, books in (delta or {}).items():
+        CATALOG_CHANGES.inc(len(books), kind=kind)
+
+def parse_google_volumes(data: dict) -> List[dict]:
+    results = []
+    for item in data.get("items", []):
+        info = item.get("volumeInfo", {})
+        sale = item.get("saleInfo", {})
+        
+        book = {
+            "title": info.get("title", "Unknown Title"),
+            "authors": ", ".join(info.get("authors", ["Unknown Author"])),
+            "description": info.get("description", "No description available"),
+            "isbn": next((i.get("identifier") for i in info.get("industryIdentifiers", []) 
+                        if i.get("type") in ["ISBN_13", "ISBN_10"]), "N/A"),
+            "price": f"£{sale.get('retailPrice', {}).get('amount', 0):.2f}" 
+                    if sale.get('retailPrice') else "N/A",
+            "in_stock": sale.get("saleability") == "FOR_SALE",
+            "url": info.get("infoLink", ""),
+            "image": info.get("imageLinks", {}).get("thumbnail", "")
+        }
+        results.append(book)
+    return results
+
+def google_params(query: str, limit: int) -> dict:
+    return {
+        "q": query,
+        "maxResults": limit,
+        "langRestrict": "en"
+    }
+
 def search_google_books(query: str, limit: int = 3) -> List[dict]:
     """Fallback to Google Books API"""
+    import requests  # the sync helpers are CLI-only; the bot never loads requests
     try:
-        params = {
-            "q": query,
-            "maxResults": limit,
-            "langRestrict": "en"
-        }
-        response = requests.get(GOOGLE_BOOKS_API, params=params, timeout=10)
+        response = requests.get(GOOGLE_BOOKS_API, params=google_params(query, limit), timeout=10)
         response.raise_for_status()
-        items = response.json().get("items", [])
-        
-        results = []
-        for item in items:
-            info = item.get("volumeInfo", {})
-            sale = item.get("saleInfo", {})
-            
-            book = {
-                "title": info.get("title", "Unknown Title"),
-                "authors": ", ".join(info.get("authors", ["Unknown Author"])),
-                "description": info.get("description", "No description available"),
-                "isbn": next((i.get("identifier") for i in info.get("industryIdentifiers", []) 
-                            if i.get("type") in ["ISBN_13", "ISBN_10"]), "N/A"),
-                "price": f"£{sale.get('retailPrice', {}).get('amount', 0):.2f}" 
-                        if sale.get('retailPrice') else "N/A",
-                "in_stock": sale.get("saleability") == "FOR_SALE",
-                "url": info.get("infoLink", ""),
-                "image": info.get("imageLinks", {}).get("thumbnail", "")
-            }
-            results.append(book)
-        return results
+        return parse_google_volumes(response.json())
     except Exception as e:
         logger.error(f"Google Books API error: {e}")
         return []
@@ -97,10 +220,11 @@ def save_cache(data):
     with open(CACHE_FILE, 'w', encoding='utf-8') as f:
         json.dump(data, f, indent=2, ensure_ascii=False)
 
-# === SCRAPE CATALOG (First Page Only for Prototype) ===
+# === SCRAPE CATALOG (blocking, for CLI use) ===
 def scrape_catalog(max_pages=5):
     """Scrape multiple pages of books"""
-    print("Scraping books.toscrape.com...")
+    import requests
+    logger.info("Scraping books.toscrape.com...")
     all_books = []
     
     for page in range(1, max_pages + 1):
@@ -109,108 +233,394 @@ def scrape_catalog(max_pages=5):
             headers = {"User-Agent": "Mozilla/5.0 (BookBot Prototype)"}
             response = requests.get(url, headers=headers, timeout=10)
             response.raise_for_status()
+            response.encoding = 'utf-8'
             
-            soup = BeautifulSoup(response.text, 'html.parser')
-            book_articles = soup.find_all('article', class_='product_pod')
-            
-            if not book_articles:
+            page_books = parse_catalog_page(response.text, BASE_URL)
+            if not page_books:
                 break
-                
-            for article in book_articles:
-                title = article.h3.a['title']
-                price = article.find('p', class_='price_color').text
-                url = article.find('a')['href']
-                
-                book = {
-                    'title': title,
-                    'price': price,
-                    'url': f"{BASE_URL}/catalogue/{url}",
-                    'authors': 'Unknown Author',  # Will be updated later
-                    'isbn': None,
-                    'description': None
-                }
-                all_books.append(book)
+            all_books.extend(page_books)
             
-            print(f"✓ Page {page}: Found {len(book_articles)} books")
+            logger.info(f"Page {page}: found {len(page_books)} books")
             
         except Exception as e:
             logger.error(f"Error scraping page {page}: {e}")
             break
     
-    print(f"Total books scraped: {len(all_books)}")
+    logger.info(f"Total books scraped: {len(all_books)}")
     return all_books
 
 # === FETCH FULL BOOK DETAILS (Author, ISBN, Description) ===
 def fetch_book_details(book_url):
+    import requests
     if not book_url:
         return {}
     try:
         headers = {"User-Agent": "Mozilla/5.0 (BookBot Prototype)"}
         response = requests.get(book_url, headers=headers, timeout=10)
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Author (from table or breadcrumb)
-        author = "Unknown Author"
-        author_tag = soup.find('th', string='Author')
-        if author_tag:
-            author = author_tag.find_next('td').get_text(strip=True)
-        
-        # ISBN (UPC is used as ISBN on this site)
-        isbn = None
-        isbn_tag = soup.find('th', string='UPC')
-        if isbn_tag:
-            isbn = isbn_tag.find_next('td').get_text(strip=True)
-        
-        # Description
-        desc_tag = soup.find('div', id='product_description')
-        description = desc_tag.find_next('p').get_text(strip=True) if desc_tag else None
-        
-        return {
-            "author": author,
-            "isbn": isbn,
-            "description": description
-        }
+        response.encoding = 'utf-8'
+        return parse_book_details(response.text)
     except Exception as e:
-        print("Detail fetch failed:", str(e))
+        logger.error(f"Detail fetch failed: {e}")
         return {}
 
+# === BULK ENRICHMENT (persistent per-URL detail store) ===
+_detail_store: Optional[DetailStore] = None
+
+def get_detail_store() -> DetailStore:
+    global _detail_store
+    if _detail_store is None:
+        _detail_store = DetailStore()
+    return _detail_store
+
+def _store_details(details: Dict[str, dict]):
+    get_detail_store().put_many(details)
+    if CATALOG_BACKEND == "sqlite":
+        get_catalog_store().update_details(details)
+
+def needs_details(book: dict) -> bool:
+    return bool(book.get("url")) and not book.get("isbn")
+
+def _apply_details(books: List[dict], details: Dict[str, dict]):
+    for book in books:
+        found = details.get(book.get("url"))
+        if found:
+            book.update({k: v for k, v in found.items() if v})
+
+def enrich_books(books: List[dict], workers: int = 4) -> List[dict]:
+    """Fill authors/isbn/description in place, fetching only what the store lacks."""
+    pending = [b for b in books if needs_details(b)]
+    if not pending:
+        return books
+    store = get_detail_store()
+    details = store.get_many(b["url"] for b in pending)
+    missing = [b["url"] for b in pending if b["url"] not in details]
+    if missing:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            fetched = dict(zip(missing, pool.map(fetch_book_details, missing)))
+        fetched = {url: d for url, d in fetched.items() if d}
+        _store_details(fetched)
+        details.update(fetched)
+    _apply_details(books, details)
+    return books
+
+# One scraper (connection pool, per-host limits) for every search's
+# detail fetches; closed by close_http_sessions() at shutdown
+_enrich_scraper: Optional[CatalogScraper] = None
+_enrich_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def get_enrich_scraper() -> CatalogScraper:
+    global _enrich_scraper, _enrich_loop
+    loop = asyncio.get_running_loop()
+    if _enrich_scraper is None or _enrich_scraper.closed or _enrich_loop is not loop:
+        _enrich_scraper = CatalogScraper()
+        _enrich_scraper.start()
+        _enrich_loop = loop
+    return _enrich_scraper
+
+async def enrich_books_async(books: List[dict]) -> List[dict]:
+    """enrich_books for the event loop: concurrent fetches over one session."""
+    pending = [b for b in books if needs_details(b)]
+    if not pending:
+        return books
+    store = get_detail_store()
+    details = await asyncio.to_thread(store.get_many, [b["url"] for b in pending])
+    missing = [b["url"] for b in pending if b["url"] not in details]
+    if missing:
+        fetched = await get_enrich_scraper().fetch_details(missing)
+        await asyncio.to_thread(_store_details, fetched)
+        details.update(fetched)
+    _apply_details(books, details)
+    return books
+
+# === IN-MEMORY CATALOG INDEX ===
+# Built once per process from the JSON cache, replaced wholesale on refresh.
+# Readers grab the current reference, so a swap never exposes a half-built index.
+_index: Optional[CatalogIndex] = None
+_index_timestamp: Optional[str] = None   # when the indexed snapshot was scraped
+_index_lock = threading.Lock()
+
+def get_index() -> CatalogIndex:
+    global _index, _index_timestamp
+    index = _index
+    if index is None:
+        with _index_lock:
+            if _index is None:
+                data = BookCache(CACHE_FILE).load()
+                _index = CatalogIndex(data.get("books", []))
+                _index_timestamp = data.get("timestamp")
+                logger.info(f"Catalog index built: {len(_index)} books")
+            index = _index
+    return index
+
+def refresh_index(books: List[dict]) -> CatalogIndex:
+    """Build a new index off to the side, then swap it in."""
+    global _index, _index_timestamp
+    index = CatalogIndex(books)
+    with _index_lock:
+        _index = index
+        _index_timestamp = datetime.now().isoformat()
+    return index
+
+def index_is_stale() -> bool:
+    # Worked out on every read so the index goes stale again once CACHE_EXPIRY passes
+    return BookCache.is_stale({"timestamp": _index_timestamp})
+
+# === CATALOG BACKEND ===
+# "json": book_cache.json plus the in-memory CatalogIndex above.
+# "sqlite": CatalogStore in bookbot.db, ranked FTS5 queries, nothing held in RAM.
+CATALOG_BACKEND = os.getenv("BOOKBOT_CATALOG", "json")
+_catalog_store: Optional[CatalogStore] = None
+
+def get_catalog_store() -> CatalogStore:
+    """Open the SQLite catalog, importing book_cache.json the first time it's empty."""
+    global _catalog_store
+    if _catalog_store is None:
+        store = CatalogStore()
+        if store.count() == 0 and os.path.exists(CACHE_FILE):
+            data = BookCache(CACHE_FILE, mode="swr").load()
+            migrated = store.upsert_many(data.get("books", []))
+            if data.get("timestamp"):
+                store.set_meta("refreshed_at", data["timestamp"])
+            logger.info(f"Migrated {migrated} books from {CACHE_FILE} into {store.path}")
+        _catalog_store = store
+    return _catalog_store
+
+def catalog_search(query: str, limit: int = 3) -> List[dict]:
+    if CATALOG_BACKEND == "sqlite":
+        return get_catalog_store().search(query, limit)
+    return get_index().search(query, limit)
+
+def catalog_size() -> int:
+    if CATALOG_BACKEND == "sqlite":
+        return get_catalog_store().count()
+    return len(get_index())
+
+def warm_catalog() -> int:
+    """Build the index (or open the store) ahead of the first search; returns the catalog size."""
+    size = catalog_size()
+    get_detail_store()
+    return size
+
+def catalog_is_stale() -> bool:
+    if CATALOG_BACKEND == "sqlite":
+        return BookCache.is_stale({"timestamp": get_catalog_store().get_meta("refreshed_at")})
+    get_index()
+    return index_is_stale()
+
+def save_catalog_refresh(books: List[dict]) -> dict:
+    """Persist a fresh scrape to the active backend and return the delta."""
+    if CATALOG_BACKEND == "sqlite":
+        delta = get_catalog_store().apply_refresh(books)
+    else:
+        merged, delta = BookCache(CACHE_FILE).save_refresh(books)
+        refresh_index(merged)
+    # Cached catalog results and misses may be wrong now
+    query_cache.invalidate()
+    return delta
+
+# === QUERY CACHE ===
+# Whole search results by normalised query, misses included, so an unknown
+# query doesn't rescrape the catalog and call Google Books every time.
+# Catalog results and misses are dropped whenever the catalog changes.
+QUERY_TTLS = {
+    "catalog": 600,        # local hits; cheap to redo, but enrichment isn't
+    "google": 6 * 3600,    # external quota
+    "miss": 900,           # nothing found anywhere
+    "partial": 60,         # a source timed out or failed; retry soon
+}
+RESCRAPE_COOLDOWN = 600    # seconds; misses and stale reads trigger at most one rescrape per window
+
+query_cache = QueryCache(QUERY_TTLS, volatile=("catalog", "miss"))
+SEARCHES = counter("bookbot_search_total", "Book searches, by where the answer came from")
+_last_rescrape = float("-inf")
+_rescrape_lock = threading.Lock()
+
+def query_key(query: str, limit: int) -> Tuple[str, int]:
+    return " ".join(normalize(query).split()), limit
+
+def claim_rescrape() -> bool:
+    """True if a miss may rescrape the catalog now (and starts the cooldown)."""
+    global _last_rescrape
+    with _rescrape_lock:
+        now = time.monotonic()
+        if now - _last_rescrape < RESCRAPE_COOLDOWN:
+            return False
+        _last_rescrape = now
+        return True
+
+def _counted(fetched: Tuple[str, List[dict]]) -> Tuple[str, List[dict]]:
+    source, books = fetched
+    SEARCHES.inc(result=source if books else "miss")
+    return fetched
+
 # Main search function
 def search_books(query: str, limit: int = 3) -> List[dict]:
     """
     Enhanced book search with multiple sources and better caching
     """
-    cache = BookCache(CACHE_FILE)
-    cached_books = cache.load().get("books", [])
-    
+    key = query_key(query, limit)
+    cached = query_cache.get(key)
+    if cached is not None:
+        SEARCHES.inc(result="cached")
+        return cached
+    return query_cache.run(key, lambda: _counted(_search_sources(query, limit)))
+
+def _search_sources(query: str, limit: int) -> Tuple[str, List[dict]]:
     # Try cache first
-    if cached_books:
-        matches = [b for b in cached_books 
-                  if query.lower() in b["title"].lower()]
-        if matches:
-            return matches[:limit]
+    matches = catalog_search(query, limit)
+    if matches:
+        record_lookup(True, catalog_is_stale())
+        return "catalog", enrich_books(matches)
+    record_lookup(False)
     
     # Try scraping
-    logger.info(f"Searching for: {query}")
-    books = scrape_catalog()
-    if books:
-        cache.save(books)
-        matches = [b for b in books 
-                  if query.lower() in b["title"].lower()]
-        if matches:
-            # Enhance with details
-            for book in matches[:limit]:
-                if not book.get("author"):
-                    details = fetch_book_details(book["url"])
-                    book.update(details)
-            return matches[:limit]
+    if claim_rescrape():
+        logger.info(f"Searching for: {query}")
+        started = time.perf_counter()
+        books = scrape_catalog()
+        if books:
+            delta = save_catalog_refresh(books)
+            record_refresh(time.perf_counter() - started, delta)
+            matches = catalog_search(query, limit)
+            if matches:
+                # Enhance with details
+                return "catalog", enrich_books(matches)
     
     # Fallback to Google Books
     logger.info("Falling back to Google Books API")
-    return search_google_books(query, limit)
+    return "google", search_google_books(query, limit)
+
+# === BACKGROUND REFRESH (for the async bot) ===
+_refresh_task: Optional[asyncio.Task] = None
+
+async def _refresh_catalog(max_pages: int) -> List[dict]:
+    started = time.perf_counter()
+    try:
+        books = await scrape_catalog_async(max_pages)
+    except Exception as e:
+        logger.error(f"Background catalog refresh failed: {e}")
+        books = []
+    if not books:
+        record_refresh(time.perf_counter() - started, None)
+        return []
+    delta = await asyncio.to_thread(save_catalog_refresh, books)
+    seconds = time.perf_counter() - started
+    record_refresh(seconds, delta)
+    logger.info(
+        f"Catalog refreshed in {seconds:.2f}s: "
+        f"+{len(delta['added'])} -{len(delta['removed'])} ~{len(delta['changed'])}"
+    )
+    return books
+
+def refresh_catalog_in_background(max_pages: int = 5) -> asyncio.Task:
+    """Start a catalog refresh on the running loop, or join the one in flight."""
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.create_task(_refresh_catalog(max_pages))
+    return _refresh_task
+
+async def search_books_async(query: str, limit: int = 3) -> List[dict]:
+    """
+    Non-blocking search_books for the Telegram handler: the catalog, then
+    Google Books if the catalog finds nothing, all under SEARCH_DEADLINE.
+    A miss or a stale catalog schedules a background rescrape instead of
+    waiting on it, unless there is no catalog at all yet; either way at
+    most one per RESCRAPE_COOLDOWN, so a failing site isn't crawled on
+    every message. Concurrent searches for the same query share one lookup.
+    """
+    stale = await asyncio.to_thread(catalog_is_stale)
+    if stale and claim_rescrape():
+        refresh_catalog_in_background()
+    key = query_key(query, limit)
+    cached = query_cache.get(key)
+    if cached is not None:
+        SEARCHES.inc(result="cached")
+        return cached
+    return await query_cache.run_async(key, lambda: _federated_search(query, limit, stale))
+
+async def _federated_search(query: str, limit: int, stale: bool) -> Tuple[str, List[dict]]:
+    result = await get_federated_search().search(query, limit)
+    record_lookup(result.reports["catalog"].status == "ok", stale)
+    if result.partial or any(r.status == "error" for r in result.reports.values()):
+        # Don't hold on to an answer a slow or failing source cut short
+        return _counted(("partial", result.books))
+    return _counted((result.source or "miss", result.books))
+
+# === FEDERATED SEARCH SOURCES ===
+SEARCH_DEADLINE = float(os.getenv("BOOKBOT_SEARCH_DEADLINE", "3.0"))
+ENRICH_BUDGET = 1.5    # seconds of detail fetching before catalog results go out bare
+
+class CatalogSource(SearchSource):
+    """The local catalog. A miss schedules a rescrape, and waits for it on a cold start."""
+    name = "catalog"
+
+    async def search(self, query: str, limit: int) -> List[dict]:
+        matches = await asyncio.to_thread(catalog_search, query, limit)
+        if not matches:
+            empty = not await asyncio.to_thread(catalog_size)
+            if not (empty or claim_rescrape()):
+                return []
+            refresh = refresh_catalog_in_background()
+            if not empty:
+                return []
+            await asyncio.shield(refresh)
+            matches = await asyncio.to_thread(catalog_search, query, limit)
+            if not matches:
+                return []
+        enriching = asyncio.ensure_future(enrich_books_async(matches))
+        try:
+            return await asyncio.wait_for(asyncio.shield(enriching), ENRICH_BUDGET)
+        except asyncio.TimeoutError:
+            # Enrichment carries on in the background; the detail store has it next time
+            return matches
+
+class GoogleBooksSource(SearchSource):
+    """Google Books, asked only when the catalog finds nothing (API quota; not books we stock)."""
+    name = "google"
+    fallback = True
+
+    def __init__(self):
+        # One keep-alive session for the process, not a handshake per search
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+            self._loop = loop
+        return self._session
+
+    async def search(self, query: str, limit: int) -> List[dict]:
+        async with self._get_session().get(GOOGLE_BOOKS_API, params=google_params(query, limit)) as resp:
+            resp.raise_for_status()
+            return parse_google_volumes(await resp.json())
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+_federated: Optional[FederatedSearch] = None
+
+def get_federated_search() -> FederatedSearch:
+    global _federated
+    if _federated is None:
+        _federated = FederatedSearch([CatalogSource(), GoogleBooksSource()], SEARCH_DEADLINE)
+    return _federated
+
+async def close_http_sessions():
+    """Close the long-lived search sessions (Application post_shutdown)."""
+    if _enrich_scraper is not None:
+        await _enrich_scraper.close()
+    for source in (_federated.sources if _federated else []):
+        if isinstance(source, GoogleBooksSource):
+            await source.close()
 
 # === TEST WHEN RUN DIRECTLY ===
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     # Enhanced testing
     print("Testing enhanced books.py...")
     
@@ -228,4 +638,9 @@ if __name__ == "__main__":
             print(f"   Author(s): {book.get('authors', 'N/A')}")
             print(f"   Price: {book.get('price', 'N/A')}")
             print(f"   ISBN: {book.get('isbn', 'N/A')}")
-            print(f"   In Stock: {book.get('in_stock', False)}")
\ No newline at end of file
+            print(f"   In Stock: {book.get('in_stock', False)}")
+
+    # Repeat lookups are answered from the query cache, misses included
+    for query in queries:
+        search_books(query, limit=2)
+    print(f"\nQuery cache: {query_cache.stats()}")
\ No newline at end of file
@@ -1,89 +1,237 @@
 # bot.py
 from telegram import Update
+from telegram.error import BadRequest, RetryAfter
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-from utils import call_llm
-from books import search_books
-from orders import create_order, get_orders  # ← get_orders added
-from courier import book_shipment
-import re
+from utils import (SYSTEM_TOKENS, call_llm, is_error_reply, request_tokens, stream_llm,
+                   start_llm_client, stop_llm_client)
+from orders import create_order_async, get_orders, get_repository  # ← get_orders added
+from shipments import get_shipment_queue
+from sessions import SessionStore
+from scheduler import Scheduler
+from intents import parse_intent
+from context import SUMMARY_TOKENS, ConversationContext
+from metrics import event, gauge, histogram, setup_logging, start_metrics_server
+import asyncio
+import logging
+import os
+import sys
+import threading
 import time
+from typing import Set
 
-TOKEN = 
-# === COLOR LOGS ===
-class C:
-    GREEN  = '\033[92m'
-    YELLOW = '\033[93m'
-    CYAN   = '\033[96m'
-    BLUE   = '\033[94m'
-    RED    = '\033[91m'
-    END    = '\033[0m'
+TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
+STREAM_REPLIES = os.getenv("BOOKBOT_STREAM", "1") == "1"
+WORKERS = int(os.getenv("BOOKBOT_WORKERS", "1"))  # read here too so bot needn't import webhook
+EDIT_INTERVAL = 1.0  # seconds between edits; Telegram throttles ~1 edit/s per chat
+FINAL_EDIT_ATTEMPTS = 5  # tries at the final edit through RetryAfter before giving up
 
-def log(msg, color=C.BLUE):
-    print(f"{color}[{time.strftime('%H:%M:%S')}] {msg}{C.END}")
+logger = logging.getLogger(__name__)
+
+# === METRICS ===
+HANDLER_SECONDS = histogram("bookbot_handler_seconds", "Time to handle one message, by intent")
+TTFT_SECONDS = histogram("bookbot_stream_first_edit_seconds", "Time until a streamed reply first shows text")
+
+# === STREAMED REPLIES ===
+async def _edit(message, text, parse_mode=None) -> float:
+    """Edit a sent message; returns how long to back off (0 if it went through)."""
+    try:
+        await message.edit_text(text, parse_mode=parse_mode)
+    except RetryAfter as e:
+        return float(e.retry_after)
+    except BadRequest as e:
+        if "not modified" in str(e).lower():
+            return 0.0
+        if parse_mode:
+            # Model output isn't always valid Markdown; fall back to plain text
+            return await _edit(message, text)
+        logger.warning(f"Edit failed: {e}")
+    return 0.0
+
+# Final edits still waiting on the throttle or a RetryAfter (drained at shutdown)
+_final_edits: Set[asyncio.Task] = set()
+
+async def _final_edit(message, text, next_edit: float):
+    """
+    The final Markdown edit is the one the user keeps, so it waits out the
+    edit throttle and any RetryAfter instead of leaving a partial reply on
+    screen. It runs in the background so the handler doesn't hold its
+    scheduler slot for the wait.
+    """
+    for _ in range(FINAL_EDIT_ATTEMPTS):
+        wait = next_edit - time.perf_counter()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        backoff = await _edit(message, text, parse_mode='Markdown')
+        if not backoff:
+            return
+        next_edit = time.perf_counter() + backoff
+    logger.warning(f"Final edit still rate-limited after {FINAL_EDIT_ATTEMPTS} attempts")
+
+async def drain_edits():
+    """Wait for final edits in flight (shutdown, tests)."""
+    if _final_edits:
+        await asyncio.gather(*list(_final_edits), return_exceptions=True)
+
+async def stream_reply(update: Update, messages, placeholder="…", route=None) -> str:
+    """
+    Send a placeholder, then edit it as tokens arrive, at most once per
+    EDIT_INTERVAL. Intermediate edits are plain text (half-written
+    Markdown doesn't parse); the final edit applies Markdown, from the
+    background once the throttle allows.
+    """
+    started = time.perf_counter()
+    sent = await update.message.reply_text(placeholder)
+    text, shown = "", placeholder
+    next_edit = 0.0
+    first_visible = None
+
+    async for delta in stream_llm(messages, route=route):
+        text += delta
+        now = time.perf_counter()
+        if now >= next_edit and text.strip() and text != shown:
+            backoff = await _edit(sent, text)
+            if not backoff:
+                shown = text
+                if first_visible is None:
+                    first_visible = time.perf_counter() - started
+                    TTFT_SECONDS.observe(first_visible)
+            next_edit = now + max(EDIT_INTERVAL, backoff)
+
+    text = text.strip() or "What book are you looking for?"
+    task = asyncio.create_task(_final_edit(sent, text, next_edit))
+    _final_edits.add(task)
+    task.add_done_callback(_final_edits.discard)
+    event(logger, "Streamed reply", level=logging.DEBUG, ttft_ms=round((first_visible or 0) * 1000),
+          total_ms=round((time.perf_counter() - started) * 1000), chars=len(text))
+    return text
+
+async def generate_reply(update: Update, messages, route=None) -> str:
+    if STREAM_REPLIES:
+        return await stream_reply(update, messages, route=route)
+    return await call_llm(messages, route=route)
+
+# === CATALOG ===
+# books brings requests, BeautifulSoup and the catalog index with it, so
+# it is imported by the warmup thread (or the first search), not by bot.
+async def search_books_async(query: str, limit: int = 3):
+    from books import search_books_async as search
+    return await search(query, limit)
+
+def warm_catalog():
+    started = time.perf_counter()
+    try:
+        import books
+        size = books.warm_catalog()
+    except Exception as e:
+        logger.warning(f"Catalog warmup failed: {e}")
+        return
+    event(logger, "Catalog warm", books=size, seconds=round(time.perf_counter() - started, 3))
+
+def start_warmup() -> threading.Thread:
+    """Warm the catalog on a thread while the Application connects to Telegram."""
+    thread = threading.Thread(target=warm_catalog, name="catalog-warmup", daemon=True)
+    thread.start()
+    return thread
 
 # === GLOBAL STATE ===
-user_data = {}
+_sessions = None
+
+def get_sessions() -> SessionStore:
+    global _sessions
+    if _sessions is None:
+        _sessions = SessionStore(
+            max_sessions=int(os.getenv("BOOKBOT_MAX_SESSIONS", "10000")),
+            idle_ttl=float(os.getenv("BOOKBOT_SESSION_TTL", "3600")),
+            # Webhook workers in other processes see the same users
+            shared=WORKERS > 1,
+        )
+    return _sessions
+
+async def summarize(messages):
+    reply = await call_llm(messages, max_tokens=SUMMARY_TOKENS, route="summary")
+    return None if is_error_reply(reply) else reply
+
+_conversation = None
+
+def get_conversation() -> ConversationContext:
+    global _conversation
+    if _conversation is None:
+        _conversation = ConversationContext(summarize)
+    return _conversation
+
+# Per-user ordering, global concurrency cap and load shedding for handlers
+scheduler = Scheduler(
+    max_concurrency=int(os.getenv("BOOKBOT_MAX_CONCURRENCY", "16")),
+    max_queue=int(os.getenv("BOOKBOT_MAX_QUEUE", "1000")),
+)
+
+gauge("bookbot_scheduler_queued", "Updates waiting for a handler", lambda: scheduler.queued)
+gauge("bookbot_scheduler_running", "Handlers running now", lambda: scheduler.running)
+gauge("bookbot_sessions", "Sessions held in memory", lambda: len(_sessions) if _sessions else 0)
 
 # === START ===
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    user_data[user_id] = {"history": [], "last_books": []}
-    log(f"User {user_id} STARTED", C.YELLOW)
-    reply = await call_llm([{"role": "user", "content": "Hello"}])
-    log(f"BOT → {reply}", C.GREEN)
+    sessions = get_sessions()
+    async with sessions.turn(user_id):
+        sessions.reset(user_id, getattr(update.effective_user, "first_name", None))
+        if sessions.shared:
+            # The next message may land on another worker, which reads the database
+            await asyncio.to_thread(sessions.flush)
+    event(logger, "Session started", user_id=user_id)
+    reply = await call_llm([{"role": "user", "content": "Hello"}], route="greeting")
     await update.message.reply_text(reply)
 
 # === MAIN HANDLER ===
 async def handle(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # With several webhook workers, keep one user's turns in order across processes too
+    async with get_sessions().turn(update.effective_user.id):
+        await _handle(update, context)
+
+async def _handle(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    started = time.perf_counter()
     user_id = update.effective_user.id
     text = update.message.text.strip()
 
-    if user_id not in user_data:
-        user_data[user_id] = {"history": [], "last_books": []}
-
-    user_short = str(user_id)[:6]
-    log(f"USER {user_short} → {text}", C.CYAN)
-
-    history = user_data[user_id]["history"]
-    history.append({"role": "user", "content": text})
+    sessions = get_sessions()
+    session = await sessions.get_async(user_id)
+    conversation = get_conversation()
 
     reply = ""
+    sent = False  # streamed replies are already on screen
+    tokens = 0    # prompt tokens of the LLM call, if there was one
+
+    intent = parse_intent(text)
 
     # === SEARCH ===
-    if any(k in text.lower() for k in ['find', 'search', 'want', 'show']):
-        query = re.sub(r'\b(find|search|want|show|me|for|books?)\b', '', text, flags=re.IGNORECASE).strip() or "best"
-        log(f"SEARCH → '{query}'", C.BLUE)
-        books = search_books(query, 3)
-        user_data[user_id]["last_books"] = books
-        context.user_data["last_books"] = books  # for order
+    if intent.name == "search":
+        query = intent.query or "best"
+        books = await search_books_async(query, 3)
+        event(logger, "Search", user_id=user_id, query=query, results=len(books))
+        session.last_books = books  # for order
 
         if books:
             lines = [f"{i+1}. *{b['title']}* - {b.get('price','N/A')}" for i, b in enumerate(books)]
             context_str = "\n".join(lines)
-            reply = await call_llm(history + [{"role": "system", "content": context_str}])
+            messages = conversation.build(session, text, extra=context_str, reserved=SYSTEM_TOKENS)
+            tokens = request_tokens(messages)
+            reply = await generate_reply(update, messages, route="search_summary")
+            sent = STREAM_REPLIES
         else:
             reply = "No books found."
 
     # === ORDER (SMART SELECTION) ===
-    elif any(k in text.lower() for k in ['order', 'buy', 'this one', 'first', 'second', 'third']):
-        books = context.user_data.get("last_books", [])
+    elif intent.name == "order":
+        books = session.last_books
         if not books:
             reply = "Search for a book first!"
         else:
-            # Smart: extract number or "this one"
-            idx = 0
-            m = re.search(r'\b(\d+)\b', text)
-            if m:
-                idx = min(int(m.group(1)) - 1, len(books) - 1)
-            elif "first" in text.lower(): idx = 0
-            elif "second" in text.lower(): idx = 1
-            elif "third" in text.lower(): idx = 2
-
+            # "this one" / no number means the first result; -1 is "the last one"
+            idx = min(intent.index or 0, len(books) - 1)
             book = books[idx]
-            log(f"ORDER → {book['title']}", C.YELLOW)
 
             # === CREATE ORDER (NO PRICE) ===
-            order_id = create_order(
+            order_id = await create_order_async(
                 user_id=str(user_id),
                 isbn=book.get('isbn'),
                 title=book['title'],
@@ -92,48 +240,128 @@ async def handle(update: Update, context: ContextTypes.DEFAULT_TYPE):
             if not order_id:
                 reply = "Order failed. Try again."
             else:
-                # === MOCK SHIPMENT (NO REAL API) ===
-                shipment = book_shipment(
-                    invoice=str(order_id),
+                event(logger, "Order placed", user_id=user_id, order_id=order_id,
+                      title=book['title'], quantity=intent.quantity)
+                # === MOCK SHIPMENT (queued, booked in the background) ===
+                await get_shipment_queue().enqueue_async(
+                    order_id,
+                    chat_id=update.effective_chat.id,
                     recipient_name="Customer",
                     phone="01700000000",
                     address="Demo Address",
-                    cod_amount=550
+                    cod_amount=550 * intent.quantity
                 )
-                track = shipment.get("tracking_code", "TRK-MOCK-123")
 
                 reply = (
                     f"Order placed!\n"
                     f"Book: *{book['title']}*\n"
                     f"Price: *{book.get('price', 'N/A')}*\n"
-                    f"ID: `{order_id}`\n"
-                    f"Track: `{track}`\n\n"
+                    + (f"Quantity: *{intent.quantity}*\n" if intent.quantity > 1 else "")
+                    + f"ID: `{order_id}`\n"
+                    f"Tracking code will follow shortly.\n\n"
                     f"Share address to confirm!"
                 )
 
     # === CHAT / FALLBACK ===
     else:
-        log("LLM → Generating...", C.BLUE)
-        reply = await call_llm(history)
+        messages = conversation.build(session, text, reserved=SYSTEM_TOKENS)
+        tokens = request_tokens(messages)
+        reply = await generate_reply(update, messages)
+        sent = STREAM_REPLIES
         if not reply:
             reply = "What book are you looking for?"
 
     # === SAVE & SEND ===
-    history.append({"role": "assistant", "content": reply})
-    user_data[user_id]["history"] = history[-10:]
+    overflow = sessions.record_turn(session, text, reply)
+    if sessions.shared:
+        await asyncio.to_thread(sessions.flush)
+
+    if not sent:
+        await update.message.reply_text(reply, parse_mode='Markdown')
+    elapsed = time.perf_counter() - started
+    HANDLER_SECONDS.observe(elapsed, intent=intent.name)
+    event(logger, "Handled message", user_id=user_id, intent=intent.name, ms=round(elapsed * 1000),
+          prompt_tokens=tokens)
+    if not sessions.shared:
+        # Other processes rebuild history from the database, so a summary
+        # kept here would drift; shared mode relies on the budget alone
+        conversation.compact(session, overflow)
 
-    log(f"BOT → {reply}", C.GREEN)
-    await update.message.reply_text(reply, parse_mode='Markdown')
+# === LIFECYCLE ===
+def open_stores():
+    """Create the session store, order repository and shipment queue (schema, migrations)."""
+    get_sessions()
+    get_repository()
+    return get_shipment_queue()
+
+async def post_init(app: Application):
+    # Databases open here, off the event loop, instead of on the first message
+    stores = asyncio.create_task(asyncio.to_thread(open_stores))
+    await start_llm_client(app)
+    if not app.bot_data.get("webhook"):
+        # Webhook mode serves /metrics on the webhook port instead
+        app.bot_data["metrics_runner"] = await start_metrics_server()
+
+    async def notify_shipment(chat_id, order_id, tracking):
+        if chat_id is None:
+            return
+        if tracking:
+            text = f"Shipment booked for order `{order_id}`.\nTrack: `{tracking}`"
+        else:
+            text = f"We couldn't book a courier for order `{order_id}` yet. We'll be in touch!"
+        await app.bot.send_message(chat_id, text, parse_mode='Markdown')
+
+    queue = await stores
+    queue.notify = notify_shipment
+    # Only one webhook worker may requeue jobs left running by a crash
+    await queue.start(recover=app.bot_data.get("worker", 0) == 0)
+    app.bot_data["session_flusher"] = asyncio.create_task(get_sessions().run_flusher())
+
+async def post_shutdown(app: Application):
+    await scheduler.stop()
+    await drain_edits()
+    await get_conversation().drain()
+    flusher = app.bot_data.pop("session_flusher", None)
+    if flusher:
+        flusher.cancel()
+        await asyncio.gather(flusher, return_exceptions=True)
+    await get_shipment_queue().stop()
+    await stop_llm_client(app)
+    books = sys.modules.get("books")   # only loaded once the catalog was warmed or searched
+    if books is not None:
+        await books.close_http_sessions()
+    runner = app.bot_data.pop("metrics_runner", None)
+    if runner:
+        await runner.cleanup()
 
 # === MAIN ===
-if __name__ == "__main__":
-    app = Application.builder().token(TOKEN).build()
-    app.add_handler(CommandHandler("start", start))
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle))
+def build_application(token: str = TOKEN, request=None, warm: bool = False) -> Application:
+    builder = (
+        Application.builder()
+        .token(token)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .concurrent_updates(True)  # ordering is the scheduler's job now
+    )
+    if request is not None:
+        builder = builder.request(request)
+    app = builder.build()
+    app.add_handler(CommandHandler("start", scheduler.wrap(start)))
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, scheduler.wrap(handle)))
+    if warm:
+        # Runs alongside initialize() (getMe), post_init and the first getUpdates
+        start_warmup()
+    return app
 
-    print(f"{C.YELLOW}{'='*60}")
-    print(f"{' BOOKBOT LIVE — ORDER WORKS '.center(60)}")
-    print(f"{'='*60}{C.END}")
+if __name__ == "__main__":
+    import functools
+    import webhook   # aiohttp.web; only needed to pick the mode and serve webhooks
 
+    setup_logging()
+    logger.info("BookBot starting in %s mode", "webhook" if webhook.WEBHOOK_URL else "polling")
 
-    app.run_polling(drop_pending_updates=True, timeout=30)
+    if webhook.WEBHOOK_URL:
+        # Each worker process warms its own catalog
+        webhook.run(functools.partial(build_application, warm=True))
+    else:
+        build_application(warm=True).run_polling(drop_pending_updates=True, timeout=30)
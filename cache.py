@@ -0,0 +1,246 @@
+# cache.py
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+_MISSING = object()
+
+class TTLCache:
+    """
+    LRU cache whose entries also expire after `ttl` seconds.
+    Expiry uses wall-clock time so entries can be persisted and reloaded.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600, clock: Callable[[], float] = time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at = entry
+                if expires_at > self.clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, expires_at: Optional[float] = None):
+        if expires_at is None:
+            expires_at = self.clock() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class ResponseCache:
+    """
+    LLM response cache: an in-memory TTLCache, optionally backed by an
+    llm_cache table so answers survive restarts. Each entry remembers how
+    long the original call took, so hits can report latency saved.
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: float = 3600, db_path: Optional[str] = None):
+        self.memory = TTLCache(maxsize, ttl)
+        self.saved_seconds = 0.0
+        self._conn = None
+        self._db_lock = threading.Lock()
+        if db_path:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            with self._db_lock, self._conn:
+                self._conn.execute("""
+                    CREATE TABLE IF NOT EXISTS llm_cache (
+                        key TEXT PRIMARY KEY,
+                        response TEXT,
+                        latency REAL,
+                        expires_at REAL
+                    )
+                """)
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        blob = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self.memory.get(key)
+        if entry is None and self._conn is not None:
+            with self._db_lock:
+                row = self._conn.execute(
+                    "SELECT response, latency, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?",
+                    (key, time.time())
+                ).fetchone()
+            if row:
+                entry = (row[0], row[1])
+                self.memory.set(key, entry, expires_at=row[2])
+                # The memory miss above was really a hit one level down
+                self.memory.misses -= 1
+                self.memory.hits += 1
+        if entry is None:
+            return None
+        response, latency = entry
+        self.saved_seconds += latency
+        return response
+
+    def put(self, key: str, response: str, latency: float, ttl: Optional[float] = None):
+        ttl = self.memory.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl
+        self.memory.set(key, (response, latency), expires_at=expires_at)
+        if self._conn is not None:
+            with self._db_lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, response, latency, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, response, latency, expires_at)
+                )
+                self._conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+
+    def stats(self) -> dict:
+        return {**self.memory.stats(), "saved_seconds": round(self.saved_seconds, 3)}
+
+
+# fetch() returns (source, results); the source picks the TTL
+Fetched = Tuple[str, List[Any]]
+
+class QueryCache:
+    """
+    Search results by query key, with a TTL per result source and
+    negative caching: an empty result is kept for ttls["miss"], so an
+    unknown query doesn't go back to the slow sources every time.
+
+    run()/run_async() are single-flight: callers asking for a key that is
+    already being fetched wait for that fetch instead of starting their
+    own. invalidate() retires entries from `volatile` sources (e.g. after
+    the catalog changes) without touching the rest.
+    """
+
+    def __init__(self, ttls: Dict[str, float], maxsize: int = 2048,
+                 volatile: Iterable[str] = ("miss",)):
+        self.ttls = dict(ttls)
+        self.volatile = frozenset(volatile)
+        self.entries = TTLCache(maxsize, self.ttls.get("miss", 300))
+        self.generation = 0
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.negative_hits = 0
+        self.coalesced = 0
+        self.fetches = 0
+
+    def get(self, key: Hashable) -> Optional[List[Any]]:
+        """Cached results ([] for a cached miss), or None if the key must be fetched."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        generation, source, results = entry
+        if source in self.volatile and generation != self.generation:
+            self.entries.pop(key)
+            return None
+        self.negative_hits += not results
+        return results
+
+    def put(self, key: Hashable, source: str, results: List[Any]):
+        ttl = self.ttls.get(source, self.entries.ttl)
+        if not results:
+            # A negative entry never outlives a plain miss, and goes on invalidate()
+            ttl = min(ttl, self.ttls.get("miss", ttl))
+            source = "miss"
+        if ttl > 0:
+            self.entries.set(key, (self.generation, source, results), ttl=ttl)
+
+    def invalidate(self):
+        self.generation += 1
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._inflight[key] = Future()
+            self.fetches += 1
+            return future, True
+
+    def _settle(self, key: Hashable, future: Future, fetched: Optional[Fetched], error: Optional[BaseException]):
+        if error is None:
+            self.put(key, *fetched)
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is None:
+            future.set_result(fetched[1])
+        else:
+            future.set_exception(error)
+
+    def run(self, key: Hashable, fetch: Callable[[], Fetched]) -> List[Any]:
+        future, leader = self._join(key)
+        if leader:
+            try:
+                fetched = fetch()
+            except BaseException as e:
+                self._settle(key, future, None, e)
+                raise
+            self._settle(key, future, fetched, None)
+        return future.result()
+
+    async def run_async(self, key: Hashable, fetch: Callable[[], Awaitable[Fetched]]) -> List[Any]:
+        future, leader = self._join(key)
+        if leader:
+            # The fetch outlives the caller that started it, so cancelling
+            # one handler doesn't fail everyone waiting on the same query
+            task = asyncio.ensure_future(fetch())
+
+            def done(task: asyncio.Task):
+                if task.cancelled():
+                    self._settle(key, future, None, asyncio.CancelledError())
+                else:
+                    self._settle(key, future, task.result() if task.exception() is None else None,
+                                 task.exception())
+            task.add_done_callback(done)
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def stats(self) -> dict:
+        return {
+            **self.entries.stats(),
+            "negative_hits": self.negative_hits,
+            "coalesced": self.coalesced,
+            "fetches": self.fetches,
+            "in_flight": len(self._inflight),
+        }
@@ -0,0 +1,226 @@
+# catalog_store.py
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+CATALOG_DB = "bookbot.db"
+
+class DetailStore:
+    """Per-URL cache of scraped detail pages (authors, UPC, description).
+
+    Lives in bookbot.db so a book is enriched once and survives restarts.
+    """
+
+    def __init__(self, path: str = CATALOG_DB):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS book_details (
+                    url TEXT PRIMARY KEY,
+                    authors TEXT,
+                    isbn TEXT,
+                    description TEXT,
+                    fetched_at TIMESTAMP
+                )
+            """)
+
+    def get_many(self, urls: Iterable[str]) -> Dict[str, dict]:
+        urls = [u for u in dict.fromkeys(urls) if u]
+        found = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(urls), 500):
+                chunk = urls[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT url, authors, isbn, description FROM book_details "
+                    f"WHERE url IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for url, authors, isbn, description in rows:
+                    found[url] = {"authors": authors, "isbn": isbn, "description": description}
+        return found
+
+    def put_many(self, details: Dict[str, dict]):
+        now = datetime.now().isoformat()
+        rows = [
+            (url, d.get("authors"), d.get("isbn"), d.get("description"), now)
+            for url, d in details.items() if d
+        ]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO book_details (url, authors, isbn, description, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?)", rows
+            )
+
+    def close(self):
+        self._conn.close()
+
+
+class CatalogStore:
+    """Catalog table in bookbot.db with an FTS5 index over title/authors/description.
+
+    The FTS table uses external content, kept in sync by triggers, so the
+    text is stored once and searches never load the whole catalog.
+    """
+
+    COLUMNS = ("url", "title", "price", "authors", "isbn", "description")
+    # bm25 column weights for (title, authors, description)
+    RANK = "bm25(books_fts, 10.0, 5.0, 1.0)"
+
+    def __init__(self, path: str = CATALOG_DB):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS books (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    url TEXT UNIQUE NOT NULL,
+                    title TEXT NOT NULL,
+                    price TEXT,
+                    authors TEXT,
+                    isbn TEXT,
+                    description TEXT,
+                    updated_at TIMESTAMP
+                );
+                CREATE INDEX IF NOT EXISTS idx_books_isbn ON books(isbn);
+                CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+                    title, authors, description,
+                    content='books', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                );
+                CREATE TRIGGER IF NOT EXISTS books_ai AFTER INSERT ON books BEGIN
+                    INSERT INTO books_fts(rowid, title, authors, description)
+                    VALUES (new.id, new.title, new.authors, new.description);
+                END;
+                CREATE TRIGGER IF NOT EXISTS books_ad AFTER DELETE ON books BEGIN
+                    INSERT INTO books_fts(books_fts, rowid, title, authors, description)
+                    VALUES ('delete', old.id, old.title, old.authors, old.description);
+                END;
+                CREATE TRIGGER IF NOT EXISTS books_au AFTER UPDATE ON books BEGIN
+                    INSERT INTO books_fts(books_fts, rowid, title, authors, description)
+                    VALUES ('delete', old.id, old.title, old.authors, old.description);
+                    INSERT INTO books_fts(rowid, title, authors, description)
+                    VALUES (new.id, new.title, new.authors, new.description);
+                END;
+                CREATE TABLE IF NOT EXISTS catalog_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            """)
+
+    # === WRITES ===
+    def upsert_many(self, books: Iterable[dict]) -> int:
+        """Bulk insert/update by URL. A scrape's placeholder fields never overwrite enriched ones."""
+        now = datetime.now().isoformat()
+        rows = [
+            (b["url"], b["title"], b.get("price"), b.get("authors"), b.get("isbn"), b.get("description"), now)
+            for b in books if b.get("url")
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany("""
+                INSERT INTO books (url, title, price, authors, isbn, description, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    title = excluded.title,
+                    price = excluded.price,
+                    authors = CASE WHEN excluded.authors IS NULL OR excluded.authors = 'Unknown Author'
+                                   THEN COALESCE(books.authors, excluded.authors) ELSE excluded.authors END,
+                    isbn = COALESCE(excluded.isbn, books.isbn),
+                    description = COALESCE(excluded.description, books.description),
+                    updated_at = excluded.updated_at
+            """, rows)
+        return len(rows)
+
+    def update_details(self, details: Dict[str, dict]):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE books SET authors = COALESCE(?, authors), isbn = COALESCE(?, isbn), "
+                "description = COALESCE(?, description) WHERE url = ?",
+                [(d.get("authors"), d.get("isbn"), d.get("description"), url) for url, d in details.items()]
+            )
+
+    def apply_refresh(self, books: List[dict]) -> dict:
+        """Upsert a fresh scrape, drop books it no longer lists, and return the delta."""
+        with self._lock:
+            existing = dict(self._conn.execute("SELECT url, price FROM books").fetchall())
+        new_urls = {b["url"] for b in books}
+        delta = {
+            "added": [b for b in books if b["url"] not in existing],
+            "removed": [url for url in existing if url not in new_urls],
+            "changed": {b["url"]: b.get("price") for b in books
+                        if b["url"] in existing and existing[b["url"]] != b.get("price")},
+        }
+        self.upsert_many(books)
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM books WHERE url = ?", [(u,) for u in delta["removed"]])
+        self.set_meta("refreshed_at", datetime.now().isoformat())
+        return delta
+
+    def set_meta(self, key: str, value: str):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO catalog_meta (key, value) VALUES (?, ?)", (key, value))
+
+    # === READS ===
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM catalog_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM books").fetchone()[0]
+
+    def _rows(self, sql: str, params: tuple) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{c: row[c] for c in self.COLUMNS} for row in rows]
+
+    def search(self, query: str, limit: int = 3) -> List[dict]:
+        """Ranked full-text search; every term must match, the last one as a prefix."""
+        terms = _TERM_RE.findall(query.casefold())
+        if not terms:
+            return []
+        cols = ", ".join(f"b.{c}" for c in self.COLUMNS)
+        if len(terms) == 1:
+            found = self._rows(f"SELECT {cols} FROM books b WHERE b.isbn = ? LIMIT ?", (query.strip(), limit))
+            if found:
+                return found
+        match = " ".join(f'"{t}"' for t in terms[:-1]) + f' "{terms[-1]}"*'
+        found = self._rows(
+            f"SELECT {cols} FROM books_fts f JOIN books b ON b.id = f.rowid "
+            f"WHERE books_fts MATCH ? ORDER BY {self.RANK} LIMIT ?",
+            (match.strip(), limit)
+        )
+        if found:
+            return found
+        # Mid-word fragments ("ttic") are invisible to the tokenizer; fall back to a scan
+        pattern = "%" + query.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        return self._rows(
+            f"SELECT {cols} FROM books b WHERE b.title LIKE ? ESCAPE '\\' ORDER BY b.id LIMIT ?",
+            (pattern, limit)
+        )
+
+    def close(self):
+        self._conn.close()
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+# === ONE-SHOT MIGRATION FROM book_cache.json ===
+if __name__ == "__main__":
+    import sys
+    from books import BookCache, CACHE_FILE
+
+    source = sys.argv[1] if len(sys.argv) > 1 else CACHE_FILE
+    data = BookCache(source, mode="swr").load()
+    store = CatalogStore()
+    count = store.upsert_many(data.get("books", []))
+    if data.get("timestamp"):
+        store.set_meta("refreshed_at", data["timestamp"])
+    print(f"Migrated {count} books from {source} into {store.path} ({store.count()} total)")
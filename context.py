@@ -0,0 +1,154 @@
+# context.py
+import asyncio
+import logging
+import os
+import re
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROMPT_BUDGET = int(os.getenv("BOOKBOT_PROMPT_BUDGET", "1000"))    # prompt tokens per request, system prompt included
+HISTORY_BUDGET = int(os.getenv("BOOKBOT_HISTORY_BUDGET", "250"))   # raw turn tokens a session keeps before folding
+SUMMARY_TOKENS = 120      # max_tokens for a summary call
+MESSAGE_OVERHEAD = 4      # role and separators per chat message
+REPLY_PRIMING = 3         # tokens the API adds to start the reply
+MAX_UNSUMMARIZED = 20     # turns kept for a retry when summarising keeps failing
+
+# === TOKEN COUNTING ===
+# A local estimate close to BPE tokenizers for English chat text: short
+# words are one token, long ones are split every ~6 letters, digits go in
+# threes, and every other non-space character (punctuation, most non-Latin
+# script) counts as a token of its own. Good enough for budgeting; no
+# tokenizer download and no network call on the hot path.
+_PIECES = re.compile(r"[A-Za-z]+|\d{1,3}|\S")
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    tokens = 0
+    for piece in _PIECES.findall(text):
+        tokens += (len(piece) + 5) // 6 if piece[0].isalpha() and piece.isascii() else 1
+    return tokens
+
+def message_tokens(message: Dict) -> int:
+    content = message.get("content") or ""
+    if not isinstance(content, str):
+        # Content parts (e.g. a system prompt marked for provider caching)
+        content = "".join(part.get("text", "") for part in content)
+    return count_tokens(content) + MESSAGE_OVERHEAD
+
+def prompt_tokens(messages: Sequence[Dict]) -> int:
+    return sum(message_tokens(m) for m in messages) + REPLY_PRIMING
+
+# === BUDGETING ===
+def fit(messages: Sequence[Dict], budget: int) -> List[Dict]:
+    """
+    Drop the oldest conversation turns until messages fit in budget tokens.
+    System messages (summary, search results) and the newest user message
+    are always kept; a turn is dropped together with the reply that
+    followed it.
+    """
+    total = prompt_tokens(messages)
+    if total <= budget:
+        return list(messages)
+    kept = list(messages)
+    last_user = max((i for i, m in enumerate(kept) if m["role"] == "user"), default=len(kept) - 1)
+    i = 0
+    while total > budget and i < last_user:
+        if kept[i]["role"] == "system":
+            i += 1
+            continue
+        total -= message_tokens(kept.pop(i))
+        last_user -= 1
+        if i < last_user and kept[i]["role"] == "assistant":
+            total -= message_tokens(kept.pop(i))
+            last_user -= 1
+    return kept
+
+def summary_message(summary: str) -> Dict:
+    return {"role": "system", "content": f"Earlier in this conversation: {summary}"}
+
+def summary_request(summary: str, turns: Sequence[Tuple[str, str]]) -> List[Dict]:
+    transcript = "\n".join(f"{'Customer' if role == 'user' else 'BookBot'}: {content}" for role, content in turns)
+    return [{"role": "user", "content": (
+        "Update the running summary of this chat with a bookstore customer. Keep names, "
+        "books discussed, prices, order details and preferences; drop small talk. "
+        f"Reply with the summary only, at most 3 sentences.\n\nCurrent summary: {summary or '(none)'}\n\n"
+        f"New messages:\n{transcript}"
+    )}]
+
+# === CONVERSATION CONTEXT ===
+# summarize(messages) -> summary text, or None if the call failed
+Summarize = Callable[[List[Dict]], Awaitable[Optional[str]]]
+
+class ConversationContext:
+    """
+    Builds each request's messages from a session: the rolling summary,
+    as many recent turns as the budget allows, then the extra context
+    (search results) and the new message.
+
+    After each turn, compact() moves turns that push the session past
+    history_budget tokens (plus any the store trimmed by count) out of
+    the history and folds them into session.summary with a background
+    LLM call, so the reply never waits on summarising.
+    """
+
+    def __init__(self, summarize: Summarize, budget: int = PROMPT_BUDGET,
+                 history_budget: int = HISTORY_BUDGET):
+        self.summarize = summarize
+        self.budget = budget
+        self.history_budget = history_budget
+        self._tasks: Set[asyncio.Task] = set()
+        self.folds = 0
+        self.fold_failures = 0
+
+    def build(self, session, text: str, extra: Optional[str] = None, reserved: int = 0) -> List[Dict]:
+        """Messages for the next call; `reserved` is what the caller adds on top (the system prompt)."""
+        messages = [summary_message(session.summary)] if session.summary else []
+        messages += session.messages()
+        messages.append({"role": "user", "content": text})
+        if extra:
+            messages.append({"role": "system", "content": extra})
+        return fit(messages, self.budget - reserved)
+
+    def compact(self, session, overflow: Sequence[Tuple[str, str]] = ()) -> Optional[asyncio.Task]:
+        """Fold `overflow` and any turns beyond history_budget into the summary, off the critical path."""
+        folded = list(overflow)
+        history = session.history
+        while len(history) > 2 and sum(count_tokens(c) + MESSAGE_OVERHEAD for _, c in history) > self.history_budget:
+            folded += history[:2]
+            del history[:2]
+        if not folded:
+            return None
+        session.unsummarized += folded
+        del session.unsummarized[:-MAX_UNSUMMARIZED]
+        if session.folding is None or session.folding.done():
+            session.folding = asyncio.create_task(self._fold(session))
+            self._tasks.add(session.folding)
+            session.folding.add_done_callback(self._tasks.discard)
+        return session.folding
+
+    async def _fold(self, session):
+        while session.unsummarized:
+            turns, session.unsummarized = session.unsummarized, []
+            try:
+                summary = await self.summarize(summary_request(session.summary, turns))
+            except Exception as e:
+                logger.warning(f"Summarising session {session.user_id} failed: {e}")
+                summary = None
+            if not summary:
+                # Keep the turns for the next compact() to retry
+                self.fold_failures += 1
+                session.unsummarized[:0] = turns
+                del session.unsummarized[:-MAX_UNSUMMARIZED]
+                return
+            session.summary = summary.strip()
+            self.folds += 1
+
+    async def drain(self):
+        """Wait for summaries in flight (shutdown, tests)."""
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {"folding": len(self._tasks), "folds": self.folds, "fold_failures": self.fold_failures}
@@ -1,10 +1,23 @@
 # courier.py
+import logging
 import time
 
+logger = logging.getLogger(__name__)
+
 def book_shipment(invoice, recipient_name, phone, address, cod_amount):
-    print(f"INFO:courier:Booking shipment for order {invoice}")
+    logger.info(f"Booking shipment for order {invoice}")
     time.sleep(0.5)
     return {
         "tracking_code": f"TRK-MOCK-{invoice}",
         "status": "Booked"
-    }
\ No newline at end of file
+    }
+
+def book_shipments(shipments):
+    """Bulk booking: one courier round trip for a batch of shipment dicts
+    (the keyword arguments of book_shipment). Results come back in order."""
+    logger.info(f"Booking {len(shipments)} shipments in one batch")
+    time.sleep(0.5)
+    return [
+        {"tracking_code": f"TRK-MOCK-{s['invoice']}", "status": "Booked"}
+        for s in shipments
+    ]
@@ -2,23 +2,74 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
-from orders import get_orders, update_order_status
-from courier import book_shipment
-import time
+from orders import (changed_since, changes_version, daily_counts, list_orders, order_stats,
+                    order_statuses, update_order_status)
+
+PAGE_SIZE = 50
+ACTIVITY_ROWS = 200   # recent changes kept in the activity feed
+STATUSES = ["Pending", "Processing", "Shipped", "Delivered"]
 
 def init_session_state():
-    if "orders" not in st.session_state:
-        st.session_state.orders = []
     if "last_refresh" not in st.session_state:
         st.session_state.last_refresh = datetime.now()
+    if "page_cursors" not in st.session_state:
+        # Keyset cursor for the start of each visited page; [None] is page 1
+        st.session_state.page_cursors = [None]
+        st.session_state.filter_key = None
+    if "activity" not in st.session_state:
+        st.session_state.activity = pd.DataFrame()
+        st.session_state.activity_seq = None
+        st.session_state.changed_ids = set()
+
+# === CACHED QUERIES ===
+# Every cached read takes the orders change version first. Reruns with no
+# new writes are answered from memory; any insert or update, from the bot,
+# the shipment queue or this page, moves the version and misses the cache.
+# Reading the version is one indexed lookup, and the stats come from the
+# rollup tables, so a rerun costs the same at 100 orders or 1M.
+@st.cache_data(max_entries=16, show_spinner=False)
+def cached_stats(version, since=None, until=None):
+    return order_stats(since, until)
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def cached_statuses(version):
+    return order_statuses()
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def cached_daily(version, since, until):
+    df = pd.DataFrame(daily_counts(since, until))
+    if df.empty:
+        return df
+    return df.pivot_table(index="day", columns="status", values="n", fill_value=0)
 
-def load_orders():
-    orders = get_orders()
-    df = pd.DataFrame(orders)
+@st.cache_data(max_entries=64, show_spinner=False)
+def load_orders(version, statuses, since, until, cursor):
+    """One page of orders, filtered and sorted in SQL."""
+    rows = list_orders(status=list(statuses), since=since, until=until, before=cursor, limit=PAGE_SIZE + 1)
+    df = pd.DataFrame(rows[:PAGE_SIZE])
     if not df.empty:
         df['created_at'] = pd.to_datetime(df['created_at'])
-        df = df.sort_values('created_at', ascending=False)
-    return df
+    next_cursor = (rows[PAGE_SIZE - 1]['created_at'], rows[PAGE_SIZE - 1]['id']) if len(rows) > PAGE_SIZE else None
+    return df, next_cursor
+
+def refresh_activity(version):
+    """Pull only the orders changed since the previous run into the activity feed."""
+    seq = st.session_state.activity_seq
+    if seq is None:
+        seq = max(0, version - ACTIVITY_ROWS)   # first run: roughly the latest changes only
+    frames = [st.session_state.activity]
+    while seq < version:
+        rows = changed_since(seq, ACTIVITY_ROWS)
+        if not rows:
+            break
+        frames.append(pd.DataFrame(rows))
+        if st.session_state.activity_seq is not None:
+            st.session_state.changed_ids.update(r["id"] for r in rows)
+        seq = rows[-1]["seq"]
+    st.session_state.activity_seq = seq
+    if len(frames) > 1:
+        activity = pd.concat(frames, ignore_index=True)
+        st.session_state.activity = activity.drop_duplicates("id", keep="last").tail(ACTIVITY_ROWS)
 
 # === PAGE CONFIG ===
 st.set_page_config(page_title="BookBot Admin", layout="wide")
@@ -31,22 +82,25 @@ with col1:
 with col2:
     if st.button("🔄 Refresh"):
         st.session_state.last_refresh = datetime.now()
+        st.session_state.changed_ids = set()
         st.experimental_rerun()
 
-st.caption(f"Last refreshed: {st.session_state.last_refresh.strftime('%Y-%m-%d %H:%M:%S')}")
+version = changes_version()
+refresh_activity(version)
+changed = len(st.session_state.changed_ids)
+st.caption(f"Last refreshed: {st.session_state.last_refresh.strftime('%Y-%m-%d %H:%M:%S')}"
+           + (f" · {changed} orders added or updated since" if changed else ""))
 
 # Stats
-df = load_orders()
-if not df.empty:
+stats = cached_stats(version)
+if stats["total"]:
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Total Orders", len(df))
+        st.metric("Total Orders", stats["total"])
     with col2:
-        pending = len(df[df['status'] == 'Pending'])
-        st.metric("Pending Orders", pending)
+        st.metric("Pending Orders", stats["pending"])
     with col3:
-        completed = len(df[df['status'] == 'Delivered'])
-        st.metric("Completed Orders", completed)
+        st.metric("Completed Orders", stats["delivered"])
     
     # Orders Table
     st.subheader("Recent Orders")
@@ -56,34 +110,77 @@ if not df.empty:
     with col1:
         status_filter = st.multiselect(
             "Filter by Status",
-            options=df['status'].unique()
+            options=cached_statuses(version)
         )
     with col2:
         date_filter = st.date_input(
             "Filter by Date",
-            value=(datetime.now() - timedelta(days=7))
+            value=(datetime.now().date() - timedelta(days=7), datetime.now().date())
         )
     
-    # Apply filters
-    filtered_df = df
-    if status_filter:
-        filtered_df = filtered_df[filtered_df['status'].isin(status_filter)]
-    if date_filter:
-        filtered_df = filtered_df[filtered_df['created_at'].dt.date >= date_filter]
+    # Filters go to SQL; created_at is stored as 'YYYY-MM-DD HH:MM:SS'
+    if not isinstance(date_filter, (list, tuple)):
+        date_filter = (date_filter,)
+    since = date_filter[0].isoformat() if date_filter else None
+    until = (date_filter[1] + timedelta(days=1)).isoformat() if len(date_filter) > 1 else None
+
+    filter_key = (tuple(status_filter), since, until)
+    if st.session_state.filter_key != filter_key:
+        st.session_state.filter_key = filter_key
+        st.session_state.page_cursors = [None]
+
+    cursors = st.session_state.page_cursors
+    filtered_df, next_cursor = load_orders(version, tuple(status_filter), since, until, cursors[-1])
+
+    daily = cached_daily(version, since, until)
+    if not daily.empty:
+        st.bar_chart(daily)
     
     # Display orders
     st.dataframe(
         filtered_df,
         column_config={
-            "order_id": st.column_config.TextColumn("Order ID"),
+            "id": st.column_config.NumberColumn("Order ID"),
             "created_at": st.column_config.DatetimeColumn("Created"),
             "status": st.column_config.SelectboxColumn(
                 "Status",
-                options=["Pending", "Processing", "Shipped", "Delivered"]
+                options=STATUSES
             )
         },
         hide_index=True
     )
+
+    # Pagination
+    col1, col2, col3 = st.columns([1,2,1])
+    with col1:
+        if st.button("← Newer", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.experimental_rerun()
+    with col2:
+        st.caption(f"Page {len(cursors)}")
+    with col3:
+        if st.button("Older →", disabled=next_cursor is None):
+            cursors.append(next_cursor)
+            st.experimental_rerun()
+
+    # Status update
+    if not filtered_df.empty:
+        st.subheader("Update Status")
+        col1, col2, col3 = st.columns([2,2,1])
+        with col1:
+            order_id = st.selectbox("Order", options=filtered_df['id'].tolist())
+        with col2:
+            new_status = st.selectbox("New status", options=STATUSES)
+        with col3:
+            if st.button("Save"):
+                update_order_status(int(order_id), new_status)
+                st.experimental_rerun()
+
+    # Recent activity, loaded incrementally from the change feed
+    activity = st.session_state.activity
+    if not activity.empty:
+        with st.expander("Recent activity"):
+            st.dataframe(activity.sort_values("seq", ascending=False).drop(columns="seq"), hide_index=True)
     
 else:
-    st.info("No orders found. Start taking orders via Telegram!")
\ No newline at end of file
+    st.info("No orders found. Start taking orders via Telegram!")
@@ -0,0 +1,163 @@
+# federated.py
+import asyncio
+import logging
+import re
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from metrics import event, histogram
+from search_index import normalize
+
+logger = logging.getLogger(__name__)
+
+DEADLINE = 3.0   # seconds for a whole federated search
+SOURCE_SECONDS = histogram("bookbot_search_source_seconds", "Time for a search source to settle, by status")
+
+class SearchSource:
+    """
+    One backend for FederatedSearch. Subclasses set `name` and implement
+    search(). A source with hedge > 0 is held back that many seconds and
+    skipped entirely if the sources before it already filled the request.
+    A fallback source only runs once every source before it has settled
+    without finding anything; it never tops up a partial hit.
+    """
+    name = "source"
+    hedge = 0.0
+    fallback = False
+
+    async def search(self, query: str, limit: int) -> List[dict]:
+        raise NotImplementedError
+
+class SourceReport(NamedTuple):
+    status: str      # "ok", "empty", "error", "timeout" or "skipped"
+    seconds: float   # time from the search starting to this source settling
+    count: int = 0
+
+class FederatedResult(NamedTuple):
+    books: List[dict]
+    reports: Dict[str, SourceReport]
+    source: Optional[str]   # first source that contributed, None if nothing did
+    partial: bool           # the deadline cut at least one source off
+
+_NON_WORD_RE = re.compile(r"[\W_]+")
+
+def isbn_key(book: dict) -> Optional[str]:
+    isbn = re.sub(r"[^0-9Xx]", "", book.get("isbn") or "").upper()
+    return isbn if len(isbn) in (10, 13) else None
+
+def title_key(book: dict) -> str:
+    return _NON_WORD_RE.sub(" ", normalize(book.get("title"))).strip()
+
+def _missing(value) -> bool:
+    return value in (None, "", "N/A", "Unknown Author", "No description available")
+
+def merge_results(results: Sequence[tuple], limit: int) -> List[dict]:
+    """
+    Merge (source name, books) lists in priority order. A book is a
+    duplicate if its ISBN, or failing that its normalised title, matches
+    one already kept (titles don't merge two different ISBNs). The first
+    copy stays and borrows any fields it was missing from later ones.
+    """
+    merged: List[dict] = []
+    by_isbn: Dict[str, dict] = {}
+    by_title: Dict[str, dict] = {}
+    for name, books in results:
+        for book in books:
+            isbn, title = isbn_key(book), title_key(book)
+            kept = by_isbn.get(isbn) if isbn else None
+            if kept is None:
+                kept = by_title.get(title)
+                if kept is not None and isbn and isbn_key(kept) not in (None, isbn):
+                    kept = None
+            if kept is None:
+                kept = {**book, "source": book.get("source", name)}
+                merged.append(kept)
+            else:
+                for field, value in book.items():
+                    if _missing(kept.get(field)) and not _missing(value):
+                        kept[field] = value
+            if isbn:
+                by_isbn.setdefault(isbn, kept)
+            by_title.setdefault(title, kept)
+    return merged[:limit]
+
+class FederatedSearch:
+    """
+    Fans a query out to every source at once (hedged sources a little
+    later) and merges what has come back when the deadline hits.
+    Sources are listed in priority order: their results rank in that
+    order, and the search ends early once the sources at the front of
+    the list have answered with enough results between them.
+    """
+
+    def __init__(self, sources: Sequence[SearchSource], deadline: float = DEADLINE):
+        self.sources = list(sources)
+        self.deadline = deadline
+
+    def _enough(self, done: Dict[str, List[dict]], limit: int) -> bool:
+        prefix = []
+        for source in self.sources:
+            if source.name not in done:
+                if source.fallback and any(books for _, books in prefix):
+                    return True
+                break
+            prefix.append((source.name, done[source.name]))
+        return len(merge_results(prefix, limit)) >= limit
+
+    async def search(self, query: str, limit: int = 3) -> FederatedResult:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline_at = started + self.deadline
+        waiting = list(self.sources)
+        running: Dict[asyncio.Task, tuple] = {}   # task -> (source, start time)
+        done: Dict[str, List[dict]] = {}
+        reports: Dict[str, SourceReport] = {}
+
+        while not self._enough(done, limit):
+            elapsed = loop.time() - started
+            # Hedged sources start on time, or early once nothing else is left
+            # running; fallbacks only ever start that second way
+            launch = [s for s in waiting if s.hedge <= elapsed and not s.fallback]
+            if not launch and not running and waiting:
+                launch = waiting[:1]
+            for source in launch:
+                waiting.remove(source)
+                running[asyncio.create_task(source.search(query, limit))] = (source, loop.time())
+            if not running:
+                break
+            wake = min([deadline_at] + [started + s.hedge for s in waiting if not s.fallback])
+            finished, _ = await asyncio.wait(running, timeout=max(wake - loop.time(), 0),
+                                             return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                source, began = running.pop(task)
+                seconds = loop.time() - began
+                if task.exception() is not None:
+                    logger.warning(f"Search source {source.name} failed: {task.exception()}")
+                    reports[source.name] = SourceReport("error", seconds)
+                    done[source.name] = []
+                else:
+                    books = task.result() or []
+                    reports[source.name] = SourceReport("ok" if books else "empty", seconds, len(books))
+                    done[source.name] = books
+            if loop.time() >= deadline_at:
+                break
+
+        for task, (source, began) in running.items():
+            task.cancel()
+            reports[source.name] = SourceReport("timeout", loop.time() - began)
+        for source in waiting:
+            reports[source.name] = SourceReport("skipped", 0.0)
+
+        books = merge_results([(s.name, done[s.name]) for s in self.sources if s.name in done], limit)
+        for name, report in reports.items():
+            if report.status != "skipped":
+                SOURCE_SECONDS.observe(report.seconds, source=name, status=report.status)
+        event(logger, "Federated search", query=query, sources={
+            name: {"status": r.status, "ms": round(r.seconds * 1000), "count": r.count}
+            for name, r in reports.items()
+        })
+        return FederatedResult(
+            books=books,
+            reports=reports,
+            source=books[0]["source"] if books else None,
+            partial=bool(running),
+        )
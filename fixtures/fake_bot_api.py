@@ -0,0 +1,61 @@
+# fixtures/fake_bot_api.py
+"""
+A telegram.request.BaseRequest that answers Bot API calls locally, so a
+real PTB Application can run (initialize, send replies) without network.
+"""
+import itertools
+import json
+import time
+from collections import Counter
+
+from telegram.request import BaseRequest
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "BookBot", "username": "bookbot"}
+
+class FakeBotAPI(BaseRequest):
+    def __init__(self):
+        self.calls = Counter()
+        self.sent = []   # (chat_id, text) for every sendMessage
+        self._ids = itertools.count(1)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        name = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        self.calls[name] += 1
+        if name == "getMe":
+            result = BOT_USER
+        elif name in ("sendMessage", "editMessageText"):
+            chat_id = int(params.get("chat_id", 0))
+            if name == "sendMessage":
+                self.sent.append((chat_id, params.get("text")))
+            result = {
+                "message_id": params.get("message_id") or next(self._ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": params.get("text", ""),
+            }
+        else:
+            result = True   # setWebhook, deleteWebhook, ...
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+def text_update(update_id, user_id, text):
+    """A Bot API message update, as Telegram would POST it to the webhook."""
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            "text": text,
+            **({"entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]}
+               if text.startswith("/") else {}),
+        },
+    }
@@ -0,0 +1,48 @@
+# fixtures/fake_catalogue.py
+"""Local stand-in for books.toscrape.com that serves the saved pages under fixtures/catalogue."""
+import asyncio
+import os
+
+from aiohttp import web
+
+ROOT = os.path.dirname(__file__)
+
+class FakeCatalogue:
+    def __init__(self, root: str = ROOT, latency: float = 0.0):
+        self.root = root
+        self.latency = latency
+        self.hits = []   # request paths, in arrival order
+        self.app = web.Application()
+        self.app.router.add_get("/{tail:.*}", self.page)
+        self._runner = None
+        self.url = None
+
+    async def page(self, request: web.Request):
+        path = request.path.lstrip("/")
+        self.hits.append(path)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        file = os.path.join(self.root, path)
+        if not os.path.isfile(file):
+            raise web.HTTPNotFound()
+        with open(file, "rb") as f:
+            return web.Response(body=f.read(), content_type="text/html")
+
+    async def start(self) -> str:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        return self.url
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
@@ -0,0 +1,29 @@
+# fixtures/fake_sources.py
+"""Local stand-in search sources for FederatedSearch tests and benchmarks."""
+import asyncio
+
+from federated import SearchSource
+
+class StaticSource(SearchSource):
+    """Answers every query with the same books after `delay` seconds, or raises `error`."""
+
+    def __init__(self, name, books=(), delay=0.0, hedge=0.0, error=None, fallback=False):
+        self.name = name
+        self.books = list(books)
+        self.delay = delay
+        self.hedge = hedge
+        self.fallback = fallback
+        self.error = error
+        self.queries = []
+        self.cancelled = 0
+
+    async def search(self, query, limit):
+        self.queries.append(query)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error:
+            raise self.error
+        return [dict(b) for b in self.books[:limit]]
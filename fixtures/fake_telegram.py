@@ -0,0 +1,28 @@
+# fixtures/fake_telegram.py
+"""Just enough of telegram.Update for driving bot handlers without Telegram."""
+
+class FakeSent:
+    def __init__(self, text):
+        self.edits = [(text, None)]
+
+    async def edit_text(self, text, parse_mode=None):
+        self.edits.append((text, parse_mode))
+
+class FakeMessage:
+    def __init__(self, text=""):
+        self.text = text
+        self.sent = []
+
+    async def reply_text(self, text, parse_mode=None):
+        self.sent.append(FakeSent(text))
+        return self.sent[-1]
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+
+class FakeUpdate:
+    def __init__(self, text="", user_id=1):
+        self.message = FakeMessage(text)
+        self.effective_user = FakeUser(user_id)
+        self.effective_chat = FakeUser(user_id)  # private chats share the user's id
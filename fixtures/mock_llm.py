@@ -0,0 +1,94 @@
+# fixtures/mock_llm.py
+"""Local stand-in for an OpenAI-compatible /v1/chat/completions endpoint (JSON and SSE)."""
+import asyncio
+import json
+
+from aiohttp import web
+
+from context import prompt_tokens
+
+class MockLLM:
+    def __init__(self, reply: str = "Hello from the mock.", latency: float = 0.0,
+                 fail_first: int = 0, fail_status: int = 503, chunk_delay: float = 0.0,
+                 token_latency: float = 0.0):
+        self.reply = reply
+        self.latency = latency
+        self.token_latency = token_latency  # extra seconds per prompt token (prefill cost)
+        self.chunk_delay = chunk_delay  # pause between streamed chunks
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.requests = []   # parsed JSON payloads, in arrival order
+        self.peers = set()   # client (host, port) pairs, one per TCP connection
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.app = web.Application()
+        self.app.router.add_post("/v1/chat/completions", self.completions)
+        self._runner = None
+        self.url = None
+
+    async def completions(self, request: web.Request):
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            return await self._completions(request)
+        finally:
+            self.in_flight -= 1
+
+    async def _completions(self, request: web.Request):
+        self.peers.add(request.transport.get_extra_info("peername"))
+        payload = await request.json()
+        self.requests.append(payload)
+        if self.fail_first > 0:
+            self.fail_first -= 1
+            return web.Response(status=self.fail_status, headers={"Retry-After": "0"})
+        delay = self.latency + self.token_latency * prompt_tokens(payload.get("messages", []))
+        if delay:
+            await asyncio.sleep(delay)
+        if payload.get("stream"):
+            return await self._stream(request, payload)
+        return web.json_response({
+            "id": f"mock-{len(self.requests)}",
+            "object": "chat.completion",
+            "model": payload.get("model"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": self.reply}}],
+        })
+
+    def chunks(self):
+        """The reply split into word-sized deltas, whitespace kept."""
+        words = self.reply.split(" ")
+        return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+    async def _stream(self, request: web.Request, payload: dict):
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        await resp.write(b": OPENROUTER PROCESSING\n\n")
+        for delta in self.chunks():
+            event = {"id": f"mock-{len(self.requests)}", "object": "chat.completion.chunk",
+                     "model": payload.get("model"),
+                     "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}]}
+            await resp.write(f"data: {json.dumps(event)}\n\n".encode())
+            if self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+        await resp.write(b"data: [DONE]\n\n")
+        await resp.write_eof()
+        return resp
+
+    async def start(self) -> str:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/v1/chat/completions"
+        return self.url
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
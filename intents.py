@@ -0,0 +1,108 @@
+# intents.py
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# === RULE TABLE ===
+# (slot, pattern) pairs, tried in order at each position, so longer and
+# more specific patterns go first. Patterns for the same slot are OR-ed.
+# Every pattern is tried only at word boundaries. Slots: select (which
+# result), quantity, order, search, number (a bare number after an order
+# word) and stop (filler words dropped from the search query).
+ORDINALS = {
+    "first": 0, "1st": 0, "second": 1, "2nd": 1, "third": 2, "3rd": 2,
+    "fourth": 3, "4th": 3, "fifth": 4, "5th": 4, "last": -1,
+}
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "a couple of": 2}
+_ORDINAL = "|".join(sorted(ORDINALS, key=len, reverse=True))
+_NUMBER = r"\d{1,3}|" + "|".join(NUMBER_WORDS)
+
+RULES: List[Tuple[str, str]] = [
+    ("quantity", rf"(?:{_NUMBER})\s+(?:copies|copy|pcs|pieces)\b"),
+    ("quantity", r"x\s?\d{1,3}\b"),
+    # "the first one", "2nd option", or an ordinal closing the message ("order the third")
+    ("select", rf"(?:the\s+)?(?:{_ORDINAL})(?:\s+(?:one|option|result|item|title)\b|(?=\s*(?:book\s*)?(?:please\s*)?[.!?]*\s*$))"),
+    ("select", r"(?:number|no\.?|option|item)\s*\d{1,2}\b|(?<=#)\d{1,2}\b"),
+    ("select", r"(?:this|that|the)\s+one\b"),
+    ("order", r"(?:order|buy|purchase|i'?ll\s+take)\b"),
+    ("search", r"(?:find|search(?:\s+for)?|look(?:ing)?\s+for|want|show)\b"),
+    ("number", r"\d{1,2}\b"),
+    ("stop", r"(?:(?:can|could)\s+you|me|for|books?|some|please|a|an|the|i|any|to|by|on|about)\b"),
+]
+
+class Intent(NamedTuple):
+    name: str                     # "search", "order" or "chat"
+    query: str = ""               # search terms, filler words removed
+    index: Optional[int] = None   # 0-based pick from the last results (-1 = last)
+    quantity: int = 1
+
+CHAT = Intent("chat")
+
+_DIGITS = re.compile(r"\d+")
+# "how much is the first one?" asks about a result rather than ordering it;
+# "the first one is perfect" doesn't. A question ends in "?" or opens with
+# a question word or a verb ("is the...", "does it...").
+_QUESTION = re.compile(r"\?[\s.!]*$|^\W*(?:who|what|which|when|where|why|how|is|are|was|does|do|did)\b",
+                       re.IGNORECASE)
+_CUT = frozenset(("search", "order", "stop"))   # slots dropped from the search query
+
+def _number(text: str) -> int:
+    digits = _DIGITS.search(text)
+    if digits:
+        return int(digits.group())
+    return next(n for word, n in NUMBER_WORDS.items() if word in text)
+
+def _index(text: str) -> int:
+    digits = _DIGITS.search(text)
+    if digits:
+        return max(int(digits.group()) - 1, 0)
+    return next((i for word, i in ORDINALS.items() if word in text.split()), 0)
+
+class IntentRouter:
+    """
+    One compiled alternation over every rule; route() makes a single
+    finditer pass, collecting slots and the spans to cut from the query.
+    A reference to a shown result wins over search words ("show me the
+    first one" is an order), then search, then plain order words. Without
+    an order word, a question about a result ("who wrote the second
+    one?") is chat, not an order.
+    """
+
+    def __init__(self, rules: Iterable[Tuple[str, str]] = RULES):
+        grouped: Dict[str, List[str]] = {}
+        for slot, pattern in rules:
+            grouped.setdefault(slot, []).append(pattern)
+        # Alternation order follows the first appearance of each slot; the
+        # shared leading \b lets the engine skip mid-word positions cheaply
+        combined = "|".join(f"(?P<{slot}>{'|'.join(patterns)})" for slot, patterns in grouped.items())
+        self._pattern = re.compile(rf"\b(?:{combined})", re.IGNORECASE)
+
+    def route(self, text: str) -> Intent:
+        found: Dict[str, str] = {}
+        pieces, last = [], 0
+        for m in self._pattern.finditer(text):
+            slot = m.lastgroup
+            if slot not in found:
+                found[slot] = m.group()
+            if slot in _CUT:
+                pieces.append(text[last:m.start()])
+                last = m.end()
+        if not found:
+            return CHAT
+
+        quantity = _number(found["quantity"].lower()) if "quantity" in found else 1
+        if "select" in found:
+            if "order" not in found and _QUESTION.search(text):
+                return CHAT
+            return Intent("order", index=_index(found["select"].lower()), quantity=quantity)
+        if "search" in found:
+            pieces.append(text[last:])
+            return Intent("search", query=" ".join("".join(pieces).split()).strip(" ?!.,"))
+        if "order" in found:
+            index = max(int(found["number"]) - 1, 0) if "number" in found else None
+            return Intent("order", index=index, quantity=quantity)
+        return CHAT
+
+_router = IntentRouter()
+
+def parse_intent(text: str) -> Intent:
+    return _router.route(text)
@@ -0,0 +1,297 @@
+# metrics.py
+import atexit
+import bisect
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LOG_FILE = os.getenv("BOOKBOT_LOG_FILE", "bookbot.jsonl")
+LOG_LEVEL = os.getenv("BOOKBOT_LOG_LEVEL", "INFO")
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 3
+METRICS_HOST = os.getenv("BOOKBOT_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("BOOKBOT_METRICS_PORT", "9464"))
+# Seconds; covers a cached reply (ms) up to a slow LLM call with retries
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _format_labels(key: LabelKey, extra: Iterable[Tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+# === METRIC TYPES ===
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(key)} {value:g}" for key, value in items]
+
+class Histogram:
+    """Prometheus-style histogram: cumulative buckets plus _sum and _count."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, list] = {}   # key -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[slot] += 1
+            series[-1] += value
+
+    def time(self, **labels) -> "_Timer":
+        return _Timer(self, labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(_label_key(labels))
+        return sum(series[:-1]) if series else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        lines = []
+        for key, series in items:
+            running = 0
+            for bound, n in zip(self.buckets + (float("inf"),), series[:-1]):
+                running += n
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', le)])} {running}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {running}")
+        return lines
+
+class _Timer:
+    """Context manager that observes elapsed seconds; labels can be added inside the block."""
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.labels.setdefault("outcome", "error")
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+class Gauge:
+    """Value read from a callback at scrape time (queue depths, cache sizes)."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, read: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def samples(self) -> List[str]:
+        try:
+            return [f"{self.name} {float(self.read()):g}"]
+        except Exception:
+            return []
+
+# === REGISTRY ===
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None and existing.kind == metric.kind and metric.kind != "gauge":
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._register(Counter(name, help))
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, buckets))
+
+    def gauge(self, name: str, help: str, read: Callable[[], float]) -> Gauge:
+        return self._register(Gauge(name, help, read))
+
+    def render(self) -> str:
+        """Everything in Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+gauge = REGISTRY.gauge
+
+# === STRUCTURED LOGGING ===
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; keyword fields passed as extra={"fields": {...}} are inlined."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def event(logger: logging.Logger, msg: str, level: int = logging.INFO, **fields):
+    """Log msg with structured fields that land as JSON keys in the sink."""
+    if logger.isEnabledFor(level):
+        logger.log(level, msg, extra={"fields": fields})
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def _file_handler(path: str) -> logging.Handler:
+    handler = logging.handlers.RotatingFileHandler(
+        path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8"
+    )
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+def worker_log_path(path: str, pid: int) -> str:
+    """bookbot.jsonl -> bookbot.<pid>.jsonl"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{pid}{ext}"
+
+def setup_logging(path: Optional[str] = LOG_FILE, level: str = LOG_LEVEL, console: bool = True):
+    """
+    Route every log record through a QueueHandler: callers only pay for
+    an enqueue, and a listener thread formats and writes records to the
+    JSON-lines file (rotated) and, optionally, a plain console stream.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+    sinks: List[logging.Handler] = []
+    if path:
+        sinks.append(_file_handler(path))
+    if console:
+        stream = logging.StreamHandler()
+        stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s", "%H:%M:%S"))
+        sinks.append(stream)
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(records)]
+    root.setLevel(level)
+    # httpx logs every Bot API URL at INFO, bot token included
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    _listener = logging.handlers.QueueListener(records, *sinks, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+# Forked webhook workers inherit the queue and the file handler but not
+# the listener thread. Each worker restarts the listener and writes its own
+# file (bookbot.<pid>.jsonl): processes sharing one RotatingFileHandler
+# would each rotate it and lose or split lines. The parent flushes before
+# forking so a child never inherits (and rewrites) buffered lines.
+def _before_fork():
+    if _listener is not None:
+        for handler in _listener.handlers:
+            handler.acquire()
+            handler.flush()
+
+def _after_fork_in_parent():
+    if _listener is not None:
+        for handler in _listener.handlers:
+            handler.release()
+
+def _after_fork_in_child():
+    if _listener is None:
+        return
+    # A fresh queue: records queued before the fork are the parent's to
+    # write, and the inherited one may be locked mid-get by the parent's
+    # listener thread, which does not exist here.
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.handlers.QueueHandler) and handler.queue is _listener.queue:
+            handler.queue = records
+    _listener.queue = records
+    handlers = []
+    for handler in _listener.handlers:
+        if isinstance(handler, logging.handlers.RotatingFileHandler):
+            handler.close()   # this process's copy of the parent's file
+            handler = _file_handler(worker_log_path(handler.baseFilename, os.getpid()))
+        handlers.append(handler)
+    _listener.handlers = tuple(handlers)
+    _listener._thread = None
+    _listener.start()
+
+os.register_at_fork(before=_before_fork, after_in_parent=_after_fork_in_parent,
+                    after_in_child=_after_fork_in_child)
+
+def stop_logging():
+    """Flush whatever is still queued and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+# === /metrics ENDPOINT ===
+async def metrics_handler(request):
+    from aiohttp import web
+    return web.Response(body=REGISTRY.render().encode("utf-8"),
+                        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+async def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    """Serve GET /metrics on its own port (polling mode; webhook mode mounts it on the webhook app)."""
+    from aiohttp import web
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
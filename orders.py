@@ -1,42 +1,381 @@
 # orders.py
+import asyncio
+import logging
+import queue
 import sqlite3
-from typing import List, Tuple
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from metrics import counter
+
+logger = logging.getLogger(__name__)
 
 DB = "orders.db"
+ORDERS = counter("bookbot_orders_total", "Order creation attempts, by outcome")
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS orders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT,
+        isbn TEXT,
+        title TEXT,
+        address TEXT,
+        status TEXT DEFAULT 'Pending',
+        tracking TEXT
+    )
+"""
+INSERT_ORDER = (
+    "INSERT INTO orders (user_id, isbn, title, address, created_at) "
+    "VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)"
+)
+SELECT_ORDERS = "SELECT * FROM orders"
+UPDATE_STATUS = "UPDATE orders SET status = ?, tracking = COALESCE(?, tracking) WHERE id = ?"
+ORDER_COLUMNS = "id, user_id, isbn, title, address, status, tracking, created_at"
+
+# === SCHEMA MIGRATIONS (tracked in PRAGMA user_version) ===
+def _add_created_at(conn: sqlite3.Connection):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(orders)")}
+    if "created_at" not in columns:
+        # ALTER TABLE can't take a CURRENT_TIMESTAMP default; inserts set it instead
+        conn.execute("ALTER TABLE orders ADD COLUMN created_at TIMESTAMP")
+        conn.execute("UPDATE orders SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_created ON orders(created_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_status_created ON orders(status, created_at, id)")
+
+def _add_rollups(conn: sqlite3.Connection):
+    """
+    Materialised counts for the dashboard, kept current by triggers in the
+    same transaction as every order write: totals per status, per day and
+    status, and a change feed (order_changes.seq grows with every insert
+    or update) that readers poll to refresh incrementally.
+    """
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS order_status_counts (
+            status TEXT PRIMARY KEY,
+            n INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS order_daily (
+            day TEXT NOT NULL,
+            status TEXT NOT NULL,
+            n INTEGER NOT NULL,
+            PRIMARY KEY (day, status)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS order_changes (
+            order_id INTEGER PRIMARY KEY,
+            seq INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_order_changes_seq ON order_changes(seq);
+
+        DELETE FROM order_status_counts;
+        DELETE FROM order_daily;
+        DELETE FROM order_changes;
+        INSERT INTO order_status_counts (status, n)
+            SELECT IFNULL(status, ''), COUNT(*) FROM orders GROUP BY 1;
+        INSERT INTO order_daily (day, status, n)
+            SELECT IFNULL(date(created_at), date('now')), IFNULL(status, ''), COUNT(*) FROM orders GROUP BY 1, 2;
+        INSERT INTO order_changes (order_id, seq) SELECT id, id FROM orders;
+
+        CREATE TRIGGER IF NOT EXISTS trg_orders_insert AFTER INSERT ON orders BEGIN
+            INSERT INTO order_status_counts (status, n) VALUES (IFNULL(NEW.status, ''), 1)
+                ON CONFLICT(status) DO UPDATE SET n = n + 1;
+            INSERT INTO order_daily (day, status, n)
+                VALUES (IFNULL(date(NEW.created_at), date('now')), IFNULL(NEW.status, ''), 1)
+                ON CONFLICT(day, status) DO UPDATE SET n = n + 1;
+            INSERT OR REPLACE INTO order_changes (order_id, seq)
+                VALUES (NEW.id, (SELECT IFNULL(MAX(seq), 0) + 1 FROM order_changes));
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_orders_status AFTER UPDATE OF status ON orders
+        WHEN OLD.status IS NOT NEW.status BEGIN
+            UPDATE order_status_counts SET n = n - 1 WHERE status = IFNULL(OLD.status, '');
+            INSERT INTO order_status_counts (status, n) VALUES (IFNULL(NEW.status, ''), 1)
+                ON CONFLICT(status) DO UPDATE SET n = n + 1;
+            UPDATE order_daily SET n = n - 1
+                WHERE day = IFNULL(date(OLD.created_at), date('now')) AND status = IFNULL(OLD.status, '');
+            INSERT INTO order_daily (day, status, n)
+                VALUES (IFNULL(date(OLD.created_at), date('now')), IFNULL(NEW.status, ''), 1)
+                ON CONFLICT(day, status) DO UPDATE SET n = n + 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_orders_changed AFTER UPDATE ON orders BEGIN
+            INSERT OR REPLACE INTO order_changes (order_id, seq)
+                VALUES (NEW.id, (SELECT IFNULL(MAX(seq), 0) + 1 FROM order_changes));
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_orders_delete AFTER DELETE ON orders BEGIN
+            UPDATE order_status_counts SET n = n - 1 WHERE status = IFNULL(OLD.status, '');
+            UPDATE order_daily SET n = n - 1
+                WHERE day = IFNULL(date(OLD.created_at), date('now')) AND status = IFNULL(OLD.status, '');
+            DELETE FROM order_changes WHERE order_id = OLD.id;
+        END;
+    """)
+
+MIGRATIONS = [_add_created_at, _add_rollups]
+
+def connect_db(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+def init_db(path: str = DB):
+    with sqlite3.connect(path) as conn:
+        conn.execute(SCHEMA)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, migrate in enumerate(MIGRATIONS[version:], start=version + 1):
+            migrate(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+
+class OrderRepository:
+    """
+    Long-lived access to the orders database.
+
+    All writes go through one writer thread with its own connection; it
+    drains whatever is queued (up to batch_size) and commits it as one
+    transaction. Reads share a second connection. Both connections reuse
+    sqlite3's per-connection statement cache, so the fixed SQL strings
+    above are only prepared once.
+    """
+
+    def __init__(self, path: str = DB, batch_size: int = 256):
+        self.path = path
+        self.batch_size = batch_size
+        init_db(path)
+        self._reader = connect_db(path)
+        self._read_lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[Tuple[str, tuple, Future]]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="orders-writer", daemon=True)
+        self._writer.start()
+
+    # === WRITER THREAD ===
+    def _write_loop(self):
+        conn = connect_db(self.path)
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    nxt = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    self._queue.put(None)  # finish this batch, then stop
+                    break
+                batch.append(nxt)
+            self._commit_batch(conn, batch)
+        conn.close()
+
+    @staticmethod
+    def _commit_batch(conn: sqlite3.Connection, batch: list):
+        results = []
+        try:
+            with conn:
+                for sql, params, future in batch:
+                    try:
+                        cur = conn.execute(sql, params)
+                        results.append((future, cur.lastrowid, None))
+                    except sqlite3.Error as e:
+                        # A failed statement rolls back alone; the rest still commit
+                        results.append((future, None, e))
+        except sqlite3.Error as e:
+            results = [(future, None, e) for _, _, future in batch]
+        for future, value, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(value)
+
+    def submit(self, sql: str, params: tuple = ()) -> Future:
+        """Queue a write; the future resolves to lastrowid once it is committed."""
+        future: Future = Future()
+        self._queue.put((sql, params, future))
+        return future
+
+    # === ORDERS ===
+    def create_order(self, user_id: str, isbn: str, title: str, address: str) -> int:
+        return self.submit(INSERT_ORDER, (user_id, isbn, title, address)).result()
+
+    async def create_order_async(self, user_id: str, isbn: str, title: str, address: str) -> int:
+        return await asyncio.wrap_future(self.submit(INSERT_ORDER, (user_id, isbn, title, address)))
+
+    def update_order_status(self, order_id: int, status: str, tracking: Optional[str] = None) -> bool:
+        self.submit(UPDATE_STATUS, (status, tracking, order_id)).result()
+        return True
+
+    def get_orders(self) -> List[Tuple]:
+        with self._read_lock:
+            return self._reader.execute(SELECT_ORDERS).fetchall()
+
+    def _query(self, sql: str, params: Sequence = ()) -> List[dict]:
+        with self._read_lock:
+            cur = self._reader.execute(sql, params)
+            names = [d[0] for d in cur.description]
+            return [dict(zip(names, row)) for row in cur.fetchall()]
 
-def init_db():
-    with sqlite3.connect(DB) as conn:
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS orders (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT,
-                isbn TEXT,
-                title TEXT,
-                address TEXT,
-                status TEXT DEFAULT 'Pending',
-                tracking TEXT
+    @staticmethod
+    def _filters(status: Optional[Sequence[str]], since: Optional[str], until: Optional[str]):
+        clauses, params = [], []
+        if status:
+            clauses.append(f"status IN ({','.join('?' * len(status))})")
+            params.extend(status)
+        if since:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until:
+            clauses.append("created_at < ?")
+            params.append(until)
+        return clauses, params
+
+    def list_orders(self, status: Optional[Sequence[str]] = None, since: Optional[str] = None,
+                    until: Optional[str] = None, before: Optional[Tuple[str, int]] = None,
+                    limit: int = 50) -> List[dict]:
+        """
+        Newest-first page of orders, filtered in SQL. `before` is the
+        (created_at, id) of the last row of the previous page (keyset
+        pagination), so deep pages cost the same as the first.
+        """
+        clauses, params = self._filters(status, since, until)
+        if before:
+            clauses.append("(created_at, id) < (?, ?)")
+            params.extend(before)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._query(
+            f"SELECT {ORDER_COLUMNS} FROM orders {where} ORDER BY created_at DESC, id DESC LIMIT ?",
+            params + [limit]
+        )
+
+    # === ANALYTICS (served from the rollup tables) ===
+    @staticmethod
+    def _is_day(bound: Optional[str]) -> bool:
+        return bound is None or len(bound) == 10   # 'YYYY-MM-DD', no time part
+
+    def order_stats(self, since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, int]:
+        """
+        Order counts by status. Whole-day ranges (or none) read the rollups,
+        so the cost doesn't grow with the number of orders; a range with a
+        time part falls back to counting the orders themselves.
+        """
+        if since is None and until is None:
+            rows = self._query("SELECT status, n FROM order_status_counts WHERE n > 0")
+        elif self._is_day(since) and self._is_day(until):
+            clauses, params = [], []
+            if since:
+                clauses.append("day >= ?")
+                params.append(since)
+            if until:
+                clauses.append("day < ?")
+                params.append(until)
+            rows = self._query(
+                f"SELECT status, SUM(n) AS n FROM order_daily WHERE {' AND '.join(clauses)} "
+                "GROUP BY status HAVING SUM(n) > 0", params
             )
-        """)
+        else:
+            clauses, params = self._filters(None, since, until)
+            rows = self._query(
+                f"SELECT status, COUNT(*) AS n FROM orders WHERE {' AND '.join(clauses)} GROUP BY status", params
+            )
+        by_status = {row["status"]: row["n"] for row in rows}
+        return {
+            "total": sum(by_status.values()),
+            "pending": by_status.get("Pending", 0),
+            "delivered": by_status.get("Delivered", 0),
+            "by_status": by_status,
+        }
+
+    def order_statuses(self) -> List[str]:
+        return [row["status"] for row in
+                self._query("SELECT status FROM order_status_counts WHERE n > 0 ORDER BY status")]
+
+    def daily_counts(self, since: Optional[str] = None, until: Optional[str] = None) -> List[dict]:
+        """Orders per day and status, oldest day first; `since`/`until` are 'YYYY-MM-DD'."""
+        clauses, params = ["n > 0"], []
+        if since:
+            clauses.append("day >= ?")
+            params.append(since)
+        if until:
+            clauses.append("day < ?")
+            params.append(until)
+        return self._query(
+            f"SELECT day, status, n FROM order_daily WHERE {' AND '.join(clauses)} ORDER BY day, status", params
+        )
+
+    def changes_version(self) -> int:
+        """Sequence number of the latest order insert or update (0 if none)."""
+        return self._query("SELECT IFNULL(MAX(seq), 0) AS seq FROM order_changes")[0]["seq"]
+
+    def changed_since(self, seq: int, limit: int = 500) -> List[dict]:
+        """Orders inserted or updated after change `seq`, oldest change first, each with its `seq`."""
+        return self._query(
+            f"SELECT {', '.join('o.' + c for c in ORDER_COLUMNS.split(', '))}, c.seq "
+            "FROM order_changes c JOIN orders o ON o.id = c.order_id "
+            "WHERE c.seq > ? ORDER BY c.seq LIMIT ?", (seq, limit)
+        )
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join()
+        self._reader.close()
+
+_repository: Optional[OrderRepository] = None
+_repository_lock = threading.Lock()
+
+def get_repository() -> OrderRepository:
+    global _repository
+    if _repository is None:
+        with _repository_lock:
+            if _repository is None:
+                _repository = OrderRepository()
+    return _repository
 
 def create_order(user_id: str, isbn: str, title: str, address: str) -> int:
     try:
-        with sqlite3.connect(DB) as conn:
-            cur = conn.cursor()
-            cur.execute(
-                "INSERT INTO orders (user_id, isbn, title, address) VALUES (?, ?, ?, ?)",
-                (user_id, isbn, title, address)
-            )
-            conn.commit()
-            return cur.lastrowid
+        order_id = get_repository().create_order(user_id, isbn, title, address)
     except Exception as e:
-        print(f"ERROR:orders:Order creation failed: {e}")
+        ORDERS.inc(outcome="error")
+        logger.error(f"Order creation failed: {e}")
         return None
+    ORDERS.inc(outcome="created")
+    return order_id
+
+async def create_order_async(user_id: str, isbn: str, title: str, address: str) -> int:
+    try:
+        order_id = await get_repository().create_order_async(user_id, isbn, title, address)
+    except Exception as e:
+        ORDERS.inc(outcome="error")
+        logger.error(f"Order creation failed: {e}")
+        return None
+    ORDERS.inc(outcome="created")
+    return order_id
 
 def get_orders() -> List[Tuple]:
-    with sqlite3.connect(DB) as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM orders")
-        return cur.fetchall()
+    return get_repository().get_orders()
+
+def update_order_status(order_id: int, status: str, tracking: Optional[str] = None) -> bool:
+    try:
+        return get_repository().update_order_status(order_id, status, tracking)
+    except Exception as e:
+        logger.error(f"Status update failed: {e}")
+        return False
+
+def list_orders(status: Optional[Sequence[str]] = None, since: Optional[str] = None,
+                until: Optional[str] = None, before: Optional[Tuple[str, int]] = None,
+                limit: int = 50) -> List[dict]:
+    return get_repository().list_orders(status, since, until, before, limit)
+
+def order_stats(since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, int]:
+    return get_repository().order_stats(since, until)
+
+def order_statuses() -> List[str]:
+    return get_repository().order_statuses()
+
+def daily_counts(since: Optional[str] = None, until: Optional[str] = None) -> List[dict]:
+    return get_repository().daily_counts(since, until)
+
+def changes_version() -> int:
+    return get_repository().changes_version()
 
-# Init on import
-init_db()
\ No newline at end of file
+def changed_since(seq: int, limit: int = 500) -> List[dict]:
+    return get_repository().changed_since(seq, limit)
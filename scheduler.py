@@ -0,0 +1,146 @@
+# scheduler.py
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from metrics import counter, histogram
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENCY = 16   # handlers running at once across all users
+MAX_QUEUE = 1000       # queued updates across all users before shedding
+MAX_PER_USER = 5       # queued updates per user before shedding
+BUSY_REPLY = "I'm a bit busy right now, please try again in a moment!"
+WAIT_SAMPLES = 2048    # recent queue waits kept for percentiles
+
+WAIT_SECONDS = histogram("bookbot_scheduler_wait_seconds", "Time an update queued before a worker took it")
+SHED = counter("bookbot_scheduler_shed_total", "Updates rejected because the queues were full")
+
+Job = Tuple[Callable[[], Awaitable[Any]], asyncio.Future, float]
+
+class Overloaded(Exception):
+    """Raised by submit() when an update is shed instead of queued."""
+
+class Scheduler:
+    """
+    Sits between the Telegram Application and the handlers.
+
+    Each user has a FIFO of pending updates and at most one running, so a
+    user's turns never interleave across awaits. Users with work wait in a
+    round-robin ring; a fixed pool of workers takes one update from the
+    next user in the ring, so a chatty user can't starve the rest.
+    Anything beyond the queue limits is rejected straight away.
+    """
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, max_queue: int = MAX_QUEUE,
+                 max_per_user: int = MAX_PER_USER):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self._queues: Dict[Hashable, Deque[Job]] = {}
+        self._ready: Deque[Hashable] = deque()
+        self._has_ready: Optional[asyncio.Condition] = None
+        self._workers: List[asyncio.Task] = []
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.shed = 0
+        self._waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+
+    # === SUBMISSION ===
+    async def submit(self, key: Hashable, job: Callable[[], Awaitable[Any]]) -> Any:
+        """Queue job() behind key's earlier work and wait for its result."""
+        self._ensure_started()
+        pending = self._queues.get(key)
+        if self.queued >= self.max_queue or (pending is not None and len(pending) >= self.max_per_user):
+            self.shed += 1
+            SHED.inc()
+            raise Overloaded(key)
+        future = asyncio.get_running_loop().create_future()
+        if pending is None:
+            # Not running and not queued: join the back of the ring
+            pending = self._queues[key] = deque()
+            pending.append((job, future, time.perf_counter()))
+            self._ready.append(key)
+        else:
+            pending.append((job, future, time.perf_counter()))
+        self.queued += 1
+        async with self._has_ready:
+            self._has_ready.notify()
+        return await future
+
+    def wrap(self, handler, busy_reply: str = BUSY_REPLY):
+        """Turn a PTB callback into one that runs through the scheduler."""
+        async def scheduled(update, context):
+            try:
+                return await self.submit(update.effective_user.id, lambda: handler(update, context))
+            except Overloaded:
+                await update.message.reply_text(busy_reply)
+        return scheduled
+
+    # === WORKERS ===
+    def _ensure_started(self):
+        if self._has_ready is None:
+            self._has_ready = asyncio.Condition()
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_concurrency)]
+
+    async def _worker(self):
+        while True:
+            async with self._has_ready:
+                await self._has_ready.wait_for(lambda: self._ready)
+                key = self._ready.popleft()
+            pending = self._queues[key]
+            job, future, enqueued = pending.popleft()
+            self.queued -= 1
+            self.running += 1
+            waited = time.perf_counter() - enqueued
+            self._waits.append(waited)
+            WAIT_SECONDS.observe(waited)
+            try:
+                if not future.cancelled():
+                    result = await job()
+                    if not future.cancelled():
+                        future.set_result(result)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self.running -= 1
+                self.completed += 1
+                if pending:
+                    self._ready.append(key)   # next turn for this user, after everyone else
+                else:
+                    del self._queues[key]
+            if pending:
+                async with self._has_ready:
+                    self._has_ready.notify()
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._has_ready = None
+
+    # === METRICS ===
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+
+        def pct(q):
+            return waits[min(len(waits) - 1, int(q * len(waits)))] if waits else 0.0
+        return {
+            "queued": self.queued,
+            "running": self.running,
+            "users_waiting": len(self._ready),
+            "completed": self.completed,
+            "shed": self.shed,
+            "wait_p50": pct(0.50),
+            "wait_p99": pct(0.99),
+            "wait_max": waits[-1] if waits else 0.0,
+        }
@@ -0,0 +1,183 @@
+# scraper.py
+import asyncio
+import importlib.util
+import logging
+import os
+import random
+import re
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from search_index import repair_mojibake
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+BASE_URL = "https://books.toscrape.com"
+HEADERS = {"User-Agent": "Mozilla/5.0 (BookBot Prototype)"}
+PER_HOST_CONCURRENCY = 4
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5   # seconds, doubled per attempt plus jitter
+REQUEST_TIMEOUT = 10
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# lxml parses detail pages several times faster; fall back when it's missing
+HTML_PARSER = os.getenv("BOOKBOT_HTML_PARSER") or (
+    "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+)
+
+_PAGE_COUNT_RE = re.compile(r"Page\s+\d+\s+of\s+(\d+)", re.IGNORECASE)
+
+# === PARSING ===
+def parse_catalog_page(html: str, base_url: str = BASE_URL) -> List[dict]:
+    from bs4 import BeautifulSoup  # ~35ms to import; only scrapes need it
+    soup = BeautifulSoup(html, HTML_PARSER)
+    books = []
+    for article in soup.find_all('article', class_='product_pod'):
+        href = article.find('a')['href']
+        books.append({
+            'title': repair_mojibake(article.h3.a['title']),
+            'price': repair_mojibake(article.find('p', class_='price_color').text),
+            'url': f"{base_url}/catalogue/{href}",
+            'authors': 'Unknown Author',  # Filled in by detail enrichment
+            'isbn': None,
+            'description': None
+        })
+    return books
+
+def parse_page_count(html: str) -> int:
+    """Read 'Page 1 of N' from the pager; a page without a pager is the only page."""
+    match = _PAGE_COUNT_RE.search(html)
+    return int(match.group(1)) if match else 1
+
+def parse_book_details(html: str, parser: str = None) -> dict:
+    """Author, ISBN (the site's UPC) and description from a product page."""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, parser or HTML_PARSER)
+
+    author = "Unknown Author"
+    author_tag = soup.find('th', string='Author')
+    if author_tag:
+        author = author_tag.find_next('td').get_text(strip=True)
+
+    isbn = None
+    isbn_tag = soup.find('th', string='UPC')
+    if isbn_tag:
+        isbn = isbn_tag.find_next('td').get_text(strip=True)
+
+    desc_tag = soup.find('div', id='product_description')
+    description = desc_tag.find_next('p').get_text(strip=True) if desc_tag else None
+
+    return {"authors": author, "isbn": isbn, "description": description}
+
+# === ASYNC CRAWLER ===
+class CatalogScraper:
+    """Crawls the catalogue over one pooled aiohttp session.
+
+    Use as ``async with CatalogScraper() as scraper: await scraper.scrape()``.
+    Requests to the same host are bounded by ``per_host``; 429/5xx and
+    network errors are retried with exponential backoff.
+    """
+
+    def __init__(self, base_url: str = BASE_URL, per_host: int = PER_HOST_CONCURRENCY,
+                 retries: int = MAX_RETRIES, backoff: float = BACKOFF_BASE,
+                 timeout: float = REQUEST_TIMEOUT):
+        self.base_url = base_url.rstrip('/')
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def start(self):
+        """Open the session; for a long-lived scraper that outlives one `async with`."""
+        if self.closed:
+            connector = aiohttp.TCPConnector(limit_per_host=self.per_host)
+            self._session = aiohttp.ClientSession(
+                connector=connector, headers=HEADERS, timeout=self.timeout
+            )
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def closed(self) -> bool:
+        return self._session is None or self._session.closed
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host)
+        return self._host_limits[host]
+
+    async def fetch(self, url: str) -> Optional[str]:
+        """GET a page as text. Returns None on 404 or once retries run out."""
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._host_limit(url):
+                    async with self._session.get(url) as resp:
+                        if resp.status in RETRY_STATUSES:
+                            reason = f"HTTP {resp.status}"
+                        elif resp.status >= 400:
+                            if resp.status != 404:
+                                logger.error(f"Fetch {url} failed: HTTP {resp.status}")
+                            return None
+                        else:
+                            # The site serves UTF-8 without a charset header
+                            return (await resp.read()).decode('utf-8', errors='replace')
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                reason = str(e) or type(e).__name__
+            if attempt < self.retries:
+                delay = self.backoff * (2 ** attempt) * (1 + random.random())
+                logger.warning(f"Fetch {url} failed ({reason}), retry {attempt + 1} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+        logger.error(f"Fetch {url} gave up after {self.retries + 1} attempts")
+        return None
+
+    def page_url(self, page: int) -> str:
+        return f"{self.base_url}/catalogue/page-{page}.html"
+
+    async def scrape(self, max_pages: Optional[int] = None) -> List[dict]:
+        """Fetch page 1, discover the page count, then fetch the rest concurrently."""
+        first = await self.fetch(self.page_url(1))
+        if first is None:
+            return []
+        total = parse_page_count(first)
+        if max_pages:
+            total = min(total, max_pages)
+
+        rest = await asyncio.gather(*(self.fetch(self.page_url(p)) for p in range(2, total + 1)))
+        books = parse_catalog_page(first, self.base_url)
+        for page, html in enumerate(rest, start=2):
+            if html is None:
+                logger.error(f"Error scraping page {page}: no content")
+                continue
+            books.extend(parse_catalog_page(html, self.base_url))
+        logger.info(f"Scraped {len(books)} books from {total} pages")
+        return books
+
+    async def fetch_details(self, urls: List[str]) -> Dict[str, dict]:
+        """Fetch and parse product pages concurrently; failed pages are left out."""
+        urls = list(dict.fromkeys(u for u in urls if u))
+        pages = await asyncio.gather(*(self.fetch(u) for u in urls))
+        details = {}
+        for url, html in zip(urls, pages):
+            if html is not None:
+                # Parsing is CPU-bound; keep it off the event loop
+                details[url] = await asyncio.to_thread(parse_book_details, html)
+        return details
+
+async def scrape_catalog_async(max_pages: Optional[int] = 5, base_url: str = BASE_URL) -> List[dict]:
+    async with CatalogScraper(base_url) as scraper:
+        return await scraper.scrape(max_pages)
@@ -0,0 +1,213 @@
+# search_index.py
+import bisect
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Field weights: an ISBN hit is almost always what the user meant,
+# title words matter more than author words.
+FIELD_WEIGHTS = {"isbn": 5.0, "title": 3.0, "authors": 2.0}
+PREFIX_WEIGHT = 0.5       # prefix hit counts half of an exact token hit
+MAX_PREFIX_EXPANSION = 50  # cap vocab terms a single prefix may expand to
+PHRASE_BONUS = 4.0        # whole query appears verbatim in the title
+FUZZY_WEIGHT = 0.5        # typo hit, further scaled by trigram similarity
+FUZZY_MIN_SIMILARITY = 0.3  # Jaccard over padded trigrams (pg_trgm's default)
+FUZZY_MAX_EXPANSION = 8   # closest vocab terms a misspelt token may expand to
+FUZZY_MIN_LENGTH = 3      # shorter tokens are too ambiguous to correct
+FUZZY_MIN_MATCHED = 0.66  # share of query tokens a fuzzy result must match
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_HAS_DIGIT_RE = re.compile(r"\d")
+# UTF-8 read as cp1252/latin-1: "Â£" for "£", "Ã©" for "é", "â€™" for "’"
+_MOJIBAKE_RE = re.compile("[\u00c2\u00c3\u00e2][\u0080-\u00bf\u20ac\u201a-\u2122]")
+
+
+def repair_mojibake(text: Optional[str]) -> Optional[str]:
+    """Undo UTF-8 text that was decoded as cp1252 or latin-1; anything else is returned as is."""
+    if not text or not _MOJIBAKE_RE.search(text):
+        return text
+    for codec in ("cp1252", "latin-1"):
+        try:
+            return text.encode(codec).decode("utf-8")
+        except UnicodeError:
+            continue
+    return text
+
+
+def normalize(text: Optional[str]) -> str:
+    """Matching form: mojibake repaired, NFKD with accents dropped, casefolded."""
+    text = unicodedata.normalize("NFKD", repair_mojibake(text) or "")
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN_RE.findall(normalize(text))
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CatalogIndex:
+    """Immutable in-memory inverted index over a list of book dicts.
+
+    Built once per catalog snapshot; callers swap in a new instance when
+    the catalog changes instead of mutating this one.
+    """
+
+    def __init__(self, books: Iterable[dict]):
+        self.books: List[dict] = list(books)
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._grams: Dict[str, Set[int]] = defaultdict(set)
+        self._titles: List[str] = []
+
+        for doc_id, book in enumerate(self.books):
+            title = normalize(book.get("title"))
+            self._titles.append(title)
+            for field, weight in FIELD_WEIGHTS.items():
+                for token in tokenize(book.get(field)):
+                    postings = self._postings[token]
+                    postings[doc_id] = max(postings.get(doc_id, 0.0), weight)
+            for gram in trigrams(title):
+                self._grams[gram].add(doc_id)
+
+        self._vocab: List[str] = sorted(self._postings)
+        self._postings = dict(self._postings)
+        self._grams = dict(self._grams)
+
+        # Trigrams of the vocabulary, for typo-tolerant lookups. Terms with
+        # digits (ISBNs, years, volume numbers) are only matched exactly.
+        term_grams: Dict[str, List[int]] = defaultdict(list)
+        self._term_gram_counts: List[int] = []
+        for term_id, term in enumerate(self._vocab):
+            grams = () if _HAS_DIGIT_RE.search(term) else trigrams(term)
+            self._term_gram_counts.append(len(grams))
+            for gram in grams:
+                term_grams[gram].append(term_id)
+        self._term_grams = dict(term_grams)
+
+    def __len__(self) -> int:
+        return len(self.books)
+
+    def _idf(self, token: str) -> float:
+        df = len(self._postings.get(token, ()))
+        return math.log(1 + len(self.books) / (1 + df))
+
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        start = bisect.bisect_left(self._vocab, prefix)
+        terms = []
+        for term in self._vocab[start:start + MAX_PREFIX_EXPANSION + 1]:
+            if not term.startswith(prefix):
+                break
+            if term != prefix:
+                terms.append(term)
+        return terms
+
+    def _token_scores(self, token: str) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        idf = self._idf(token)
+        for doc_id, weight in self._postings.get(token, {}).items():
+            scores[doc_id] = weight * idf
+        for term in self._prefix_terms(token):
+            term_idf = self._idf(term) * PREFIX_WEIGHT
+            for doc_id, weight in self._postings[term].items():
+                scores[doc_id] = max(scores.get(doc_id, 0.0), weight * term_idf)
+        return scores
+
+    def _fuzzy_terms(self, token: str) -> List[Tuple[str, float]]:
+        """Vocabulary terms closest to a misspelt token, as (term, similarity)."""
+        if len(token) < FUZZY_MIN_LENGTH:
+            return []
+        grams = trigrams(token)
+        shared: Counter = Counter()
+        for gram in grams:
+            shared.update(self._term_grams.get(gram, ()))
+        scored = []
+        for term_id, common in shared.items():
+            similarity = common / (len(grams) + self._term_gram_counts[term_id] - common)
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                scored.append((similarity, term_id))
+        scored.sort(reverse=True)
+        return [(self._vocab[term_id], sim) for sim, term_id in scored[:FUZZY_MAX_EXPANSION]]
+
+    def _expansions(self, token: str) -> List[Tuple[str, float]]:
+        """Terms a token may match in the fuzzy pass, each with its score factor."""
+        terms = [(token, self._idf(token))] if token in self._postings else []
+        terms += [(term, self._idf(term) * PREFIX_WEIGHT) for term in self._prefix_terms(token)]
+        terms += [(term, self._idf(term) * FUZZY_WEIGHT * similarity)
+                  for term, similarity in self._fuzzy_terms(token)]
+        return terms
+
+    def _fuzzy_matches(self, tokens: List[str]) -> Dict[int, float]:
+        """Typo-tolerant fallback: most (not all) tokens must hit, each exactly or by similarity."""
+        expansions = [self._expansions(token) for token in tokens]
+        hits = [set().union(*(self._postings[term] for term, _ in terms)) for terms in expansions]
+        needed = math.ceil(len(tokens) * FUZZY_MIN_MATCHED)
+        if needed >= len(hits):
+            candidates = set.intersection(*hits)
+        else:
+            counts = Counter(chain.from_iterable(hits))
+            candidates = {doc_id for doc_id, count in counts.items() if count >= needed}
+
+        # Score only the survivors: best expansion per token, summed
+        ranked: Dict[int, float] = {}
+        for doc_id in candidates:
+            ranked[doc_id] = sum(
+                max((self._postings[term].get(doc_id, 0.0) * factor for term, factor in terms), default=0.0)
+                for terms in expansions
+            )
+        return ranked
+
+    def _substring_matches(self, phrase: str) -> List[int]:
+        """Trigram-filtered substring scan, used when token lookup finds nothing."""
+        # Unpadded grams: the phrase may start or end mid-word in the title.
+        grams = {phrase[i:i + 3] for i in range(len(phrase) - 2)}
+        if not grams:
+            return [i for i, title in enumerate(self._titles) if phrase in title]
+        candidates: Optional[Set[int]] = None
+        for gram in sorted(grams, key=lambda g: len(self._grams.get(g, ()))):
+            ids = self._grams.get(gram)
+            if not ids:
+                return []
+            candidates = set(ids) if candidates is None else candidates & ids
+            if not candidates:
+                return []
+        return sorted(i for i in (candidates or ()) if phrase in self._titles[i])
+
+    def search_scored(self, query: str, limit: int = 3) -> List[Tuple[dict, float]]:
+        phrase = normalize(query).strip()
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not phrase or not self.books:
+            return []
+
+        ranked: Dict[int, float] = {}
+        if tokens:
+            # AND semantics: every query token must hit (exactly or by prefix)
+            for i, token in enumerate(tokens):
+                scores = self._token_scores(token)
+                if i == 0:
+                    ranked = scores
+                else:
+                    ranked = {d: s + scores[d] for d, s in ranked.items() if d in scores}
+                if not ranked:
+                    break
+
+        if not ranked:
+            ranked = {d: 1.0 for d in self._substring_matches(phrase)}
+
+        if not ranked and tokens:
+            ranked = self._fuzzy_matches(tokens)
+
+        for doc_id in ranked:
+            if phrase in self._titles[doc_id]:
+                ranked[doc_id] += PHRASE_BONUS
+
+        best = sorted(ranked.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [(self.books[doc_id], score) for doc_id, score in best]
+
+    def search(self, query: str, limit: int = 3) -> List[dict]:
+        return [book for book, _ in self.search_scored(query, limit)]
@@ -0,0 +1,311 @@
+# sessions.py
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from itertools import groupby
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SESSION_DB = "bookbot.db"
+MAX_SESSIONS = 10000   # LRU cap on sessions held in memory
+IDLE_TTL = 3600        # seconds without a message before a session is dropped
+MAX_HISTORY = 10       # messages (user + assistant) kept per session
+FLUSH_INTERVAL = 2.0   # seconds between write-behind flushes
+
+class Session:
+    """Per-user chat state. History is kept as (role, content) tuples."""
+    __slots__ = ("user_id", "history", "last_books", "last_seen", "summary", "unsummarized", "folding")
+
+    def __init__(self, user_id: int, history: Optional[List[Tuple[str, str]]] = None):
+        self.user_id = user_id
+        self.history = history or []
+        self.last_books: List[dict] = []
+        self.last_seen = time.monotonic()
+        # Rolling summary of turns that left the history (see context.py)
+        self.summary = ""
+        self.unsummarized: List[Tuple[str, str]] = []
+        self.folding: Optional[asyncio.Task] = None
+
+    def messages(self) -> List[Dict[str, str]]:
+        return [{"role": role, "content": content} for role, content in self.history]
+
+
+class SessionStore:
+    """
+    Bounded in-memory sessions with write-behind persistence.
+
+    Sessions live in an LRU capped at max_sessions and are dropped after
+    idle_ttl seconds of silence. Every completed turn is queued and written
+    to the messages table by flush(); a returning user's history is
+    rehydrated from there on first access.
+
+    The last search results (what "order the first one" refers to) are
+    written behind the same way, to session_state, along with the last
+    message id at the user's most recent /start: history is only loaded
+    from after that.
+
+    With shared=True (several processes serving the same users) history
+    and last search results are re-read from the database on every
+    get_async, callers flush after each turn so the next process to see
+    the user has it, and turn() keeps one user's turns from running in
+    two processes at once.
+    """
+
+    def __init__(self, db_path: str = SESSION_DB, max_sessions: int = MAX_SESSIONS,
+                 idle_ttl: float = IDLE_TTL, max_history: int = MAX_HISTORY, shared: bool = False):
+        self.db_path = db_path
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_history = max_history
+        self.shared = shared
+        self._sessions: "OrderedDict[int, Session]" = OrderedDict()
+        self._pending_messages: List[tuple] = []   # (user_id, message, response), or (user_id,) for a reset
+        self._pending_users: Dict[str, Optional[str]] = {}
+        self._pending_books: Dict[str, List[dict]] = {}
+        self._pending_lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._db_lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self.evictions = 0
+        self.rehydrations = 0
+        self._turn_fd: Optional[int] = None
+        with self._db_lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    user_id TEXT PRIMARY KEY,
+                    display_name TEXT,
+                    language TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    message TEXT,
+                    response TEXT,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_user ON messages(user_id, id)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS session_state (
+                    user_id TEXT PRIMARY KEY,
+                    last_books TEXT,
+                    reset_after INTEGER DEFAULT 0
+                )
+            """)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(session_state)")}
+            if "reset_after" not in columns:
+                self._conn.execute("ALTER TABLE session_state ADD COLUMN reset_after INTEGER DEFAULT 0")
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    # === LOOKUP / EVICTION ===
+    def cached(self, user_id: int) -> Optional[Session]:
+        session = self._sessions.get(user_id)
+        if session is not None:
+            self._sessions.move_to_end(user_id)
+            session.last_seen = time.monotonic()
+        return session
+
+    def _insert(self, session: Session) -> Session:
+        self._sessions[session.user_id] = session
+        self._sessions.move_to_end(session.user_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+        self._maybe_sweep()
+        return session
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep < min(self.idle_ttl, 60):
+            return
+        self._last_sweep = now
+        self.sweep(now)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Drop sessions idle longer than idle_ttl (oldest first, so stop at the first fresh one)."""
+        cutoff = (now or time.monotonic()) - self.idle_ttl
+        dropped = 0
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if session.last_seen > cutoff:
+                break
+            self._sessions.popitem(last=False)
+            dropped += 1
+        self.evictions += dropped
+        return dropped
+
+    def load_history(self, user_id: int) -> List[Tuple[str, str]]:
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT message, response FROM messages WHERE user_id = ? AND id > COALESCE("
+                "(SELECT reset_after FROM session_state WHERE user_id = ?), 0) ORDER BY id DESC LIMIT ?",
+                (str(user_id), str(user_id), self.max_history // 2)
+            ).fetchall()
+        history = []
+        for message, response in reversed(rows):
+            history.append(("user", message))
+            history.append(("assistant", response))
+        return history
+
+    def load_books(self, user_id: int) -> List[dict]:
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT last_books FROM session_state WHERE user_id = ?", (str(user_id),)
+            ).fetchone()
+        return json.loads(row[0]) if row and row[0] else []
+
+    def _load(self, user_id: int) -> Session:
+        session = Session(user_id, self.load_history(user_id))
+        session.last_books = self.load_books(user_id)
+        return session
+
+    def get(self, user_id: int) -> Session:
+        session = self.cached(user_id)
+        if session is None:
+            session = self._insert(self._load(user_id))
+            self.rehydrations += bool(session.history)
+        return session
+
+    async def get_async(self, user_id: int) -> Session:
+        if self.shared:
+            loaded = await asyncio.to_thread(self._load, user_id)
+            session = self.cached(user_id) or self._insert(Session(user_id))
+            session.history, session.last_books = loaded.history, loaded.last_books
+            return session
+        session = self.cached(user_id)
+        if session is None:
+            loaded = await asyncio.to_thread(self._load, user_id)
+            # Another handler may have created it while we were reading
+            session = self.cached(user_id) or self._insert(loaded)
+            self.rehydrations += bool(loaded.history)
+        return session
+
+    @asynccontextmanager
+    async def turn(self, user_id: int):
+        """
+        In shared mode, hold user_id's lock across processes for a whole
+        turn (read, reply, flush): a POSIX record lock on byte user_id of
+        <db_path>.turns. The Scheduler already serialises a user within
+        one process; this covers the other workers. A no-op otherwise.
+        """
+        if not self.shared:
+            yield
+            return
+        import fcntl   # POSIX only; shared mode is for SO_REUSEPORT workers on Linux
+        if self._turn_fd is None:
+            self._turn_fd = os.open(f"{self.db_path}.turns", os.O_RDWR | os.O_CREAT, 0o600)
+        await asyncio.to_thread(fcntl.lockf, self._turn_fd, fcntl.LOCK_EX, 1, int(user_id))
+        try:
+            yield
+        finally:
+            fcntl.lockf(self._turn_fd, fcntl.LOCK_UN, 1, int(user_id))
+
+    def reset(self, user_id: int, display_name: Optional[str] = None) -> Session:
+        """
+        Fresh session (for /start). Persisted history stays in the
+        database; the next flush records where it ends, so rehydrating
+        (or another worker) starts from here too.
+        """
+        with self._pending_lock:
+            self._pending_users[str(user_id)] = display_name
+            self._pending_messages.append((str(user_id),))
+            self._pending_books[str(user_id)] = []
+        return self._insert(Session(user_id))
+
+    # === TURNS / WRITE-BEHIND ===
+    def record_turn(self, session: Session, message: str, response: str) -> List[Tuple[str, str]]:
+        """Append a turn; returns the messages trimmed off the front of the history."""
+        session.history.append(("user", message))
+        session.history.append(("assistant", response))
+        overflow = session.history[:-self.max_history]
+        del session.history[:-self.max_history]
+        with self._pending_lock:
+            self._pending_messages.append((str(session.user_id), message, response))
+            self._pending_users.setdefault(str(session.user_id), None)
+            self._pending_books[str(session.user_id)] = session.last_books
+        return overflow
+
+    def flush(self) -> int:
+        with self._pending_lock:
+            messages, self._pending_messages = self._pending_messages, []
+            users, self._pending_users = self._pending_users, {}
+            books, self._pending_books = self._pending_books, {}
+        if not messages and not users and not books:
+            return 0
+        try:
+            with self._db_lock, self._conn:
+                self._conn.executemany(
+                    "INSERT INTO users (user_id, display_name) VALUES (?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET display_name = COALESCE(excluded.display_name, display_name)",
+                    list(users.items())
+                )
+                # Messages and resets in queue order, so a reset covers only what came before it
+                for is_reset, rows in groupby(messages, key=lambda row: len(row) == 1):
+                    if is_reset:
+                        self._conn.executemany(
+                            "INSERT INTO session_state (user_id, last_books, reset_after) VALUES (?1, '[]', "
+                            "(SELECT COALESCE(MAX(id), 0) FROM messages WHERE user_id = ?1)) "
+                            "ON CONFLICT(user_id) DO UPDATE SET reset_after = excluded.reset_after, "
+                            "last_books = excluded.last_books", list(rows)
+                        )
+                    else:
+                        self._conn.executemany(
+                            "INSERT INTO messages (user_id, message, response) VALUES (?, ?, ?)", list(rows)
+                        )
+                self._conn.executemany(
+                    "INSERT INTO session_state (user_id, last_books) VALUES (?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET last_books = excluded.last_books",
+                    [(user_id, json.dumps(last, ensure_ascii=False)) for user_id, last in books.items()]
+                )
+        except sqlite3.Error:
+            # Put the batch back so the next flush retries it
+            with self._pending_lock:
+                self._pending_messages[:0] = messages
+                for user_id, name in users.items():
+                    self._pending_users.setdefault(user_id, name)
+                for user_id, last in books.items():
+                    self._pending_books.setdefault(user_id, last)
+            raise
+        return sum(len(row) == 3 for row in messages)
+
+    async def run_flusher(self, interval: float = FLUSH_INTERVAL):
+        """Background task: flush periodically, and once more when cancelled."""
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await asyncio.to_thread(self.flush)
+                except sqlite3.Error as e:
+                    logger.error(f"Session flush failed: {e}")
+        finally:
+            self.flush()
+
+    def stats(self) -> dict:
+        with self._pending_lock:
+            pending = sum(len(row) == 3 for row in self._pending_messages)
+        return {
+            "sessions": len(self._sessions),
+            "evictions": self.evictions,
+            "rehydrations": self.rehydrations,
+            "pending_writes": pending,
+        }
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+        if self._turn_fd is not None:
+            os.close(self._turn_fd)
+            self._turn_fd = None
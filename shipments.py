@@ -0,0 +1,203 @@
+# shipments.py
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import Awaitable, Callable, List, Optional
+
+import courier
+from metrics import counter, gauge
+from orders import DB, connect_db, init_db
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 2.0   # seconds, doubled per failed attempt
+BATCH_SIZE = 10
+POLL_INTERVAL = 1.0  # idle workers re-check for due retries this often
+
+SHIPMENTS = counter("bookbot_shipments_total", "Courier booking attempts, by result")
+
+# notify(chat_id, order_id, tracking_code or None on final failure)
+Notify = Callable[[Optional[int], int, Optional[str]], Awaitable[None]]
+
+class ShipmentQueue:
+    """
+    Durable courier-booking queue in the orders database.
+
+    Jobs are rows in shipment_jobs, so nothing is lost on restart. Workers
+    claim due jobs in batches, book them with one courier.book_shipments
+    call off the event loop, then write the tracking code to the order
+    row in the same transaction that completes the job. Failures are
+    retried with exponential backoff up to MAX_ATTEMPTS.
+    """
+
+    def __init__(self, path: str = DB, workers: int = 2, batch_size: int = BATCH_SIZE,
+                 max_attempts: int = MAX_ATTEMPTS, backoff: float = BACKOFF_BASE,
+                 poll_interval: float = POLL_INTERVAL, notify: Optional[Notify] = None):
+        self.path = path
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.poll_interval = poll_interval
+        self.notify = notify
+        init_db(path)
+        self._conn = connect_db(path)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS shipment_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    order_id INTEGER UNIQUE,
+                    chat_id INTEGER,
+                    payload TEXT,
+                    status TEXT DEFAULT 'queued',
+                    attempts INTEGER DEFAULT 0,
+                    next_attempt_at REAL,
+                    last_error TEXT,
+                    tracking TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_shipment_jobs_due ON shipment_jobs(status, next_attempt_at)"
+            )
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    # === QUEUE (blocking, call via to_thread from async code) ===
+    def enqueue(self, order_id: int, chat_id: Optional[int] = None, **shipment) -> int:
+        """Queue a booking; `shipment` holds book_shipment's keyword arguments."""
+        shipment.setdefault("invoice", str(order_id))
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO shipment_jobs (order_id, chat_id, payload, next_attempt_at) "
+                "VALUES (?, ?, ?, ?)",
+                (order_id, chat_id, json.dumps(shipment), time.time())
+            )
+            return cur.lastrowid
+
+    def claim(self, limit: int) -> List[dict]:
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "UPDATE shipment_jobs SET status = 'running', attempts = attempts + 1 "
+                "WHERE id IN (SELECT id FROM shipment_jobs WHERE status = 'queued' "
+                "AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?) "
+                "RETURNING id, order_id, chat_id, payload, attempts",
+                (time.time(), limit)
+            ).fetchall()
+        return [
+            {"id": r[0], "order_id": r[1], "chat_id": r[2], "shipment": json.loads(r[3]), "attempts": r[4]}
+            for r in rows
+        ]
+
+    def complete(self, job: dict, tracking: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE shipment_jobs SET status = 'done', tracking = ?, last_error = NULL WHERE id = ?",
+                (tracking, job["id"])
+            )
+            self._conn.execute("UPDATE orders SET tracking = ? WHERE id = ?", (tracking, job["order_id"]))
+
+    def fail(self, job: dict, error: str) -> bool:
+        """Record a failed attempt; returns True if the job will be retried."""
+        retry = job["attempts"] < self.max_attempts
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE shipment_jobs SET status = ?, last_error = ?, next_attempt_at = ? WHERE id = ?",
+                ("queued" if retry else "failed", error,
+                 time.time() + self.backoff * (2 ** (job["attempts"] - 1)), job["id"])
+            )
+        return retry
+
+    def recover(self) -> int:
+        """Requeue jobs a previous process claimed but never finished."""
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "UPDATE shipment_jobs SET status = 'queued' WHERE status = 'running'"
+            ).rowcount
+
+    def job(self, order_id: int) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, attempts, tracking, last_error FROM shipment_jobs WHERE order_id = ?",
+                (order_id,)
+            ).fetchone()
+        return dict(zip(("status", "attempts", "tracking", "last_error"), row)) if row else None
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM shipment_jobs WHERE status IN ('queued', 'running')"
+            ).fetchone()[0]
+
+    # === WORKERS ===
+    async def enqueue_async(self, order_id: int, chat_id: Optional[int] = None, **shipment) -> int:
+        job_id = await asyncio.to_thread(self.enqueue, order_id, chat_id, **shipment)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    async def start(self, recover: bool = True):
+        recovered = await asyncio.to_thread(self.recover) if recover else 0
+        if recovered:
+            logger.info(f"Requeued {recovered} interrupted shipment jobs")
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, number: int):
+        while True:
+            jobs = await asyncio.to_thread(self.claim, self.batch_size)
+            if not jobs:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self.process(jobs)
+
+    async def process(self, jobs: List[dict]):
+        try:
+            results = await asyncio.to_thread(courier.book_shipments, [j["shipment"] for j in jobs])
+        except Exception as e:
+            results = [e] * len(jobs)
+        for job, result in zip(jobs, results):
+            tracking = result.get("tracking_code") if isinstance(result, dict) else None
+            if tracking:
+                await asyncio.to_thread(self.complete, job, tracking)
+                SHIPMENTS.inc(result="booked")
+                logger.info(f"Shipment booked for order {job['order_id']}: {tracking}")
+                await self._notify(job, tracking)
+                continue
+            error = str(result) if isinstance(result, Exception) else f"Unexpected courier reply: {result}"
+            retry = await asyncio.to_thread(self.fail, job, error)
+            SHIPMENTS.inc(result="retry" if retry else "failed")
+            logger.warning(f"Shipment for order {job['order_id']} failed (attempt {job['attempts']}): {error}")
+            if not retry:
+                await self._notify(job, None)
+
+    async def _notify(self, job: dict, tracking: Optional[str]):
+        if self.notify is None:
+            return
+        try:
+            await self.notify(job["chat_id"], job["order_id"], tracking)
+        except Exception as e:
+            logger.error(f"Shipment notification for order {job['order_id']} failed: {e}")
+
+_queue: Optional[ShipmentQueue] = None
+
+def get_shipment_queue() -> ShipmentQueue:
+    global _queue
+    if _queue is None:
+        _queue = ShipmentQueue()
+        gauge("bookbot_shipments_pending", "Shipment jobs queued or running", _queue.depth)
+    return _queue
@@ -0,0 +1,25 @@
+# test_bench_e2e.py
+import asyncio
+
+import bot
+import utils
+from benchmarks import bench_e2e
+
+def test_harness_drives_every_flow_and_restores_singletons():
+    sessions_before, client_before = bot._sessions, utils._client
+    results = asyncio.run(bench_e2e.run([], iterations=8, concurrency=4, llm_ms=1))
+
+    assert set(results) == {s.name for s in bench_e2e.SCENARIOS}
+    for result in results.values():
+        assert 0 < result["p50_ms"] <= result["p99_ms"]
+        assert result["throughput"] > 0
+    assert bot._sessions is sessions_before and utils._client is client_before
+
+def test_regressions_need_a_real_slowdown():
+    baseline = {"search": {"p50_ms": 2.0, "p99_ms": 4.0, "throughput": 1000.0}}
+    assert bench_e2e.regressions({"search": {"p50_ms": 4.5, "p99_ms": 7.0, "throughput": 800.0}}, baseline) == []
+
+    found = bench_e2e.regressions({"search": {"p50_ms": 9.0, "p99_ms": 4.0, "throughput": 500.0}}, baseline)
+    assert found == ["search p50_ms: 9.00 vs baseline 2.00",
+                     "search throughput: 500/s vs baseline 1000/s"]
+    assert bench_e2e.regressions({"chat": {"p50_ms": 90.0, "p99_ms": 90.0, "throughput": 1.0}}, baseline) == []
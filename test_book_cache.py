@@ -0,0 +1,148 @@
+# test_book_cache.py
+import json
+from datetime import datetime, timedelta
+
+import books
+from books import BookCache, diff_catalog
+
+OLD = [
+    {"title": "A", "price": "£1.00", "url": "u/a", "isbn": "111"},
+    {"title": "B", "price": "£2.00", "url": "u/b", "isbn": None},
+]
+NEW = [
+    {"title": "A", "price": "£1.50", "url": "u/a", "isbn": None},
+    {"title": "C", "price": "£3.00", "url": "u/c", "isbn": None},
+]
+
+def test_diff_catalog():
+    merged, delta = diff_catalog(OLD, NEW)
+    assert [b["url"] for b in delta["added"]] == ["u/c"]
+    assert delta["removed"] == ["u/b"]
+    assert delta["changed"] == {"u/a": "£1.50"}
+    # enrichment from the old scrape survives the refresh
+    assert merged[0] == {"title": "A", "price": "£1.50", "url": "u/a", "isbn": "111"}
+
+def test_refresh_appends_delta_and_replays(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = BookCache(path)
+    cache.save(OLD)
+    merged, _ = cache.save_refresh(NEW)
+
+    with open(path, encoding="utf-8") as f:
+        assert [b["url"] for b in json.load(f)["books"]] == ["u/a", "u/b"]
+    with open(cache.journal, encoding="utf-8") as f:
+        assert len(f.readlines()) == 1
+
+    data = cache.load()
+    assert data["books"] == merged
+    assert data["journal_entries"] == 1
+    assert not data["stale"]
+
+def test_journal_compaction(tmp_path, monkeypatch):
+    monkeypatch.setattr(books, "JOURNAL_MAX_ENTRIES", 2)
+    cache = BookCache(str(tmp_path / "cache.json"))
+    cache.save(OLD)
+    cache.save_refresh(NEW)
+    cache.save_refresh(OLD)
+    cache.save_refresh(NEW)
+    assert not (tmp_path / "cache.json.delta").exists()
+    assert [b["url"] for b in cache.load()["books"]] == ["u/a", "u/c"]
+
+def test_stale_cache_served_unless_strict(tmp_path):
+    path = tmp_path / "cache.json"
+    old = (datetime.now() - books.CACHE_EXPIRY - timedelta(minutes=1)).isoformat()
+    path.write_text(json.dumps({"books": OLD, "timestamp": old}), encoding="utf-8")
+
+    data = BookCache(str(path)).load()
+    assert data["stale"] and len(data["books"]) == 2
+    assert BookCache(str(path), mode="strict").load()["books"] == []
+
+def test_load_repairs_mojibake(tmp_path):
+    path = tmp_path / "cache.json"
+    path.write_text(json.dumps({
+        "timestamp": datetime.now().isoformat(),
+        "books": [{"title": "CafÃ© Society", "price": "Â£51.77", "url": "u/a", "isbn": None}],
+    }), encoding="utf-8")
+    [book] = BookCache(str(path)).load()["books"]
+    assert (book["title"], book["price"]) == ("Café Society", "£51.77")
+
+def test_misses_are_cached_coalesced_and_rate_limited(monkeypatch):
+    import asyncio
+    from cache import QueryCache
+    from federated import FederatedSearch
+    from fixtures.fake_sources import StaticSource
+
+    refreshes = []
+    google = StaticSource("google", delay=0.01)
+    monkeypatch.setattr(books, "query_cache", QueryCache(books.QUERY_TTLS, volatile=("catalog", "miss")))
+    monkeypatch.setattr(books, "_federated", FederatedSearch([books.CatalogSource(), google]))
+    monkeypatch.setattr(books, "_last_rescrape", float("-inf"))
+    monkeypatch.setattr(books, "catalog_search", lambda query, limit: [])
+    monkeypatch.setattr(books, "catalog_size", lambda: 100)
+    monkeypatch.setattr(books, "catalog_is_stale", lambda: False)
+    monkeypatch.setattr(books, "refresh_catalog_in_background", lambda: refreshes.append(1))
+
+    async def go():
+        first = await asyncio.gather(*(books.search_books_async("নোবেল প্রাইজ") for _ in range(20)))
+        again = await books.search_books_async("  নোবেল   প্রাইজ ")
+        other = await books.search_books_async("Python Programming")
+        return first, again, other
+    first, again, other = asyncio.run(go())
+    assert first == [[]] * 20 and again == [] and other == []
+    # one Google call per distinct query, and only the first miss rescrapes
+    assert google.queries == ["নোবেল প্রাইজ", "Python Programming"]
+    assert refreshes == [1]
+
+def test_index_goes_stale_again_after_expiry(monkeypatch, tmp_path):
+    path = tmp_path / "cache.json"
+    path.write_text(json.dumps({"books": OLD, "timestamp": datetime.now().isoformat()}), encoding="utf-8")
+    monkeypatch.setattr(books, "CACHE_FILE", str(path))
+    monkeypatch.setattr(books, "CATALOG_BACKEND", "json")
+    monkeypatch.setattr(books, "_index", None)
+    monkeypatch.setattr(books, "_index_timestamp", None)
+    assert not books.catalog_is_stale()
+
+    later = datetime.now() + books.CACHE_EXPIRY + timedelta(minutes=1)
+    monkeypatch.setattr(books, "datetime", type("Clock", (datetime,), {"now": staticmethod(lambda: later)}))
+    assert books.catalog_is_stale()
+    books.refresh_index(NEW)
+    assert not books.catalog_is_stale()
+
+def test_stale_catalog_rescrapes_once_per_cooldown_when_refreshes_fail(monkeypatch):
+    import asyncio
+    from cache import QueryCache
+
+    refreshes = []
+
+    async def hit(query, limit, stale):
+        return "catalog", [{"title": query}]
+
+    monkeypatch.setattr(books, "query_cache", QueryCache(books.QUERY_TTLS, volatile=("catalog", "miss")))
+    monkeypatch.setattr(books, "_last_rescrape", float("-inf"))
+    monkeypatch.setattr(books, "catalog_is_stale", lambda: True)   # every refresh fails
+    monkeypatch.setattr(books, "refresh_catalog_in_background", lambda: refreshes.append(1))
+    monkeypatch.setattr(books, "_federated_search", hit)
+
+    async def go():
+        for q in ("dune", "emma", "sapiens"):
+            await books.search_books_async(q)
+    asyncio.run(go())
+    assert refreshes == [1]
+
+def test_lookups_and_refreshes_reach_metrics(monkeypatch):
+    import asyncio
+    from metrics import REGISTRY
+
+    async def scrape(max_pages):
+        return NEW
+
+    hits, refreshes = books.CATALOG_LOOKUPS.value(result="stale_hit"), books.CATALOG_CHANGES.value(kind="added")
+    monkeypatch.setattr(books, "scrape_catalog_async", scrape)
+    monkeypatch.setattr(books, "save_catalog_refresh", lambda fresh: {"added": fresh, "removed": [], "changed": {}})
+    books.record_lookup(True, stale=True)
+    asyncio.run(books._refresh_catalog(1))
+
+    assert books.CATALOG_LOOKUPS.value(result="stale_hit") == hits + 1
+    assert books.CATALOG_CHANGES.value(kind="added") == refreshes + 2
+    rendered = REGISTRY.render()
+    assert 'bookbot_catalog_refresh_seconds_count{outcome="ok"}' in rendered
@@ -0,0 +1,117 @@
+# test_bot.py
+import asyncio
+import time
+
+from telegram.error import RetryAfter
+
+import bot
+from fixtures.fake_telegram import FakeSent, FakeUpdate
+from fixtures.mock_llm import MockLLM
+from sessions import SessionStore
+from utils import LLMClient
+
+def test_stream_reply_edits_progressively(monkeypatch):
+    monkeypatch.setattr(bot, "EDIT_INTERVAL", 0.0)
+
+    async def go():
+        async with MockLLM(reply="Try *Sapiens* today", chunk_delay=0.01) as mock:
+            client = LLMClient(url=mock.url, api_key="test")
+            monkeypatch.setattr(bot, "stream_llm", lambda messages, route=None: client.stream(messages))
+            update = FakeUpdate()
+            reply = await bot.stream_reply(update, [{"role": "user", "content": "hi"}])
+            await bot.drain_edits()
+            await client.close()
+            return reply, update.message.sent
+    reply, sent = asyncio.run(go())
+    assert reply == "Try *Sapiens* today"
+    [message] = sent
+    texts = [t for t, _ in message.edits]
+    assert texts[0] == "…"
+    assert texts[1:-1] == ["Try", "Try *Sapiens*", "Try *Sapiens* today"]
+    assert message.edits[-1] == ("Try *Sapiens* today", "Markdown")
+
+def test_stream_reply_throttles_edits(monkeypatch):
+    monkeypatch.setattr(bot, "EDIT_INTERVAL", 0.3)
+
+    async def fake_stream(messages, route=None):
+        for word in ["one", " two", " three"]:
+            yield word
+
+    monkeypatch.setattr(bot, "stream_llm", fake_stream)
+    update = FakeUpdate()
+
+    async def go():
+        started = time.perf_counter()
+        await bot.stream_reply(update, [])
+        returned = time.perf_counter() - started
+        await bot.drain_edits()
+        return returned, time.perf_counter() - started
+    returned, finished = asyncio.run(go())
+    # placeholder, one throttled progress edit, final Markdown edit once the interval is up
+    assert update.message.sent[0].edits == [("…", None), ("one", None), ("one two three", "Markdown")]
+    assert returned < 0.3 <= finished
+
+def test_stream_reply_retries_rate_limited_final_edit(monkeypatch):
+    monkeypatch.setattr(bot, "EDIT_INTERVAL", 0.0)
+
+    async def fake_stream(messages, route=None):
+        for word in ["Try", " *Dune*", " now"]:
+            yield word
+
+    class LimitedSent(FakeSent):
+        async def edit_text(self, text, parse_mode=None):
+            if parse_mode and not self.limited:
+                self.limited = True
+                raise RetryAfter(1)
+            await super().edit_text(text, parse_mode)
+
+    update = FakeUpdate()
+
+    async def reply_text(text, parse_mode=None):
+        update.message.sent.append(LimitedSent(text))
+        update.message.sent[-1].limited = False
+        return update.message.sent[-1]
+
+    monkeypatch.setattr(bot, "stream_llm", fake_stream)
+    monkeypatch.setattr(update.message, "reply_text", reply_text)
+    async def go():
+        reply = await bot.stream_reply(update, [])
+        await bot.drain_edits()
+        return reply
+    reply = asyncio.run(go())
+    assert reply == "Try *Dune* now"
+    assert update.message.sent[0].edits[-1] == ("Try *Dune* now", "Markdown")
+
+def test_handle_routes_selection_after_search_to_order(monkeypatch, tmp_path):
+    orders, shipments = [], []
+
+    async def fake_search(query, limit=3):
+        return [{"title": f"{query} {i}", "price": "£1.00", "isbn": str(i)} for i in range(3)]
+
+    async def fake_reply(update, messages, route=None):
+        return "Here you go"
+
+    async def fake_order(**order):
+        orders.append(order)
+        return len(orders)
+
+    class FakeQueue:
+        async def enqueue_async(self, order_id, chat_id=None, **shipment):
+            shipments.append(shipment)
+
+    monkeypatch.setattr(bot, "search_books_async", fake_search)
+    monkeypatch.setattr(bot, "generate_reply", fake_reply)
+    monkeypatch.setattr(bot, "create_order_async", fake_order)
+    monkeypatch.setattr(bot, "get_shipment_queue", FakeQueue)
+    monkeypatch.setattr(bot, "STREAM_REPLIES", False)
+    monkeypatch.setattr(bot, "_sessions", SessionStore(str(tmp_path / "s.db")))
+
+    async def go():
+        await bot.handle(FakeUpdate("find dune"), None)
+        update = FakeUpdate("show me 2 copies of the last one")
+        await bot.handle(update, None)
+        return update.message.sent[0].edits[0][0]
+    reply = asyncio.run(go())
+    assert [o["title"] for o in orders] == ["dune 2"]
+    assert shipments[0]["cod_amount"] == 1100
+    assert "Quantity: *2*" in reply
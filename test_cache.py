@@ -0,0 +1,96 @@
+# test_cache.py
+import asyncio
+
+import utils
+from cache import QueryCache, ResponseCache, TTLCache
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_ttl_and_lru_eviction():
+    clock = Clock()
+    cache = TTLCache(maxsize=2, ttl=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1   # a is now most recent
+    cache.set("c", 3)            # evicts b
+    assert cache.get("b") is None
+    clock.now += 11
+    assert cache.get("a") is None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["hits"] == 1
+
+def test_response_cache_persists(tmp_path):
+    db = str(tmp_path / "llm.db")
+    ResponseCache(db_path=db).put("k", "Hello!", latency=2.5)
+    fresh = ResponseCache(db_path=db)
+    assert fresh.get("k") == "Hello!"
+    assert fresh.stats()["saved_seconds"] == 2.5
+    assert fresh.stats()["hits"] == 1
+
+def test_call_llm_caches_opted_in_routes(monkeypatch):
+    calls = []
+
+    class FakeClient:
+        async def complete(self, messages, temperature, max_tokens, **options):
+            calls.append(messages)
+            return "AI down. Try again." if len(calls) == 1 else f"reply {len(calls)}"
+
+    monkeypatch.setattr(utils, "_client", FakeClient())
+    monkeypatch.setattr(utils, "_response_cache", ResponseCache())
+
+    async def go():
+        hello = [{"role": "user", "content": "Hello"}]
+        first = await utils.call_llm(hello, route="greeting")           # error: not cached
+        second = await utils.call_llm(hello, route="greeting")          # cached
+        third = await utils.call_llm([{"role": "user", "content": "  hello "}], route="greeting")
+        chat = await utils.call_llm(hello)                              # no route: never cached
+        return first, second, third, chat
+    first, second, third, chat = asyncio.run(go())
+    assert first.startswith("AI down")
+    assert second == third == "reply 2"
+    assert chat == "reply 3"
+    assert len(calls) == 3
+
+def test_query_cache_negative_entries_and_invalidation():
+    cache = QueryCache({"catalog": 60, "google": 3600, "miss": 30}, volatile=("catalog", "miss"))
+    cache.put("dune", "catalog", ["Dune"])
+    cache.put("sapiens", "google", ["Sapiens"])
+    cache.put("nothing", "google", [])
+    assert cache.get("nothing") == [] and cache.stats()["negative_hits"] == 1
+    assert cache.get("unknown") is None
+    cache.invalidate()
+    assert cache.get("dune") is None and cache.get("nothing") is None
+    assert cache.get("sapiens") == ["Sapiens"]   # external results survive a catalog refresh
+
+def test_query_cache_single_flight():
+    cache = QueryCache({"miss": 30})
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "google", []
+
+    async def go():
+        return await asyncio.gather(*(cache.run_async("q", fetch) for _ in range(50)))
+    assert asyncio.run(go()) == [[]] * 50
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 49 and cache.stats()["in_flight"] == 0
+
+def test_query_cache_failed_fetch_is_not_cached():
+    cache = QueryCache({"miss": 30})
+
+    def boom():
+        raise RuntimeError("backend down")
+
+    try:
+        cache.run("q", boom)
+    except RuntimeError:
+        pass
+    assert cache.get("q") is None
+    assert cache.run("q", lambda: ("catalog", ["ok"])) == ["ok"]
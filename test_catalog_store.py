@@ -0,0 +1,46 @@
+# test_catalog_store.py
+from catalog_store import CatalogStore
+
+BOOKS = [
+    {"title": "A Light in the Attic", "price": "£51.77", "url": "u/1", "authors": "Unknown Author", "isbn": None, "description": None},
+    {"title": "Tipping the Velvet", "price": "£53.74", "url": "u/2", "authors": "Unknown Author", "isbn": None, "description": None},
+    {"title": "Sapiens: A Brief History of Humankind", "price": "£54.23", "url": "u/3", "authors": "Unknown Author", "isbn": None, "description": None},
+    {"title": "The Light of the Fireflies", "price": "£10.00", "url": "u/4", "authors": "Unknown Author", "isbn": None, "description": "Light and dark."},
+]
+
+def make_store(tmp_path):
+    store = CatalogStore(str(tmp_path / "catalog.db"))
+    store.upsert_many(BOOKS)
+    return store
+
+def titles(results):
+    return [b["title"] for b in results]
+
+def test_full_text_ranking_and_prefix(tmp_path):
+    store = make_store(tmp_path)
+    assert titles(store.search("light attic")) == ["A Light in the Attic"]
+    assert titles(store.search("velv")) == ["Tipping the Velvet"]
+    assert sorted(titles(store.search("light"))) == ["A Light in the Attic", "The Light of the Fireflies"]
+    assert store.search("python programming") == []
+
+def test_substring_fallback(tmp_path):
+    assert titles(make_store(tmp_path).search("ttic")) == ["A Light in the Attic"]
+
+def test_details_survive_rescrape(tmp_path):
+    store = make_store(tmp_path)
+    store.update_details({"u/1": {"authors": "Shel Silverstein", "isbn": "a897fe39b1053632", "description": "Poems"}})
+    store.upsert_many(BOOKS)
+    [book] = store.search("a897fe39b1053632")
+    assert book["authors"] == "Shel Silverstein"
+    assert titles(store.search("silverstein")) == ["A Light in the Attic"]
+
+def test_apply_refresh_delta(tmp_path):
+    store = make_store(tmp_path)
+    fresh = [dict(BOOKS[0], price="£1.00"), BOOKS[1], {"title": "New Book", "price": "£2.00", "url": "u/9"}]
+    delta = store.apply_refresh(fresh)
+    assert [b["url"] for b in delta["added"]] == ["u/9"]
+    assert sorted(delta["removed"]) == ["u/3", "u/4"]
+    assert delta["changed"] == {"u/1": "£1.00"}
+    assert store.count() == 3
+    assert store.search("sapiens") == []
+    assert store.get_meta("refreshed_at")
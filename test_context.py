@@ -0,0 +1,106 @@
+# test_context.py
+import asyncio
+
+import bot
+from context import ConversationContext, count_tokens, fit, prompt_tokens
+from fixtures.fake_telegram import FakeUpdate
+from sessions import Session, SessionStore
+
+def msg(role, content):
+    return {"role": role, "content": content}
+
+def test_count_tokens_is_roughly_word_based():
+    assert count_tokens("") == 0
+    assert count_tokens("hi there") == 2
+    assert count_tokens("Do you have Atomic Habits?") == 6
+    assert count_tokens("£47.82") == 4
+    # Long words split; non-Latin text costs a token per character
+    assert count_tokens("internationalization") == 4
+    assert count_tokens("নোবেল") == 5
+
+def test_fit_drops_oldest_turns_but_keeps_system_and_newest_message():
+    long = "word " * 50
+    messages = [msg("system", "Earlier in this conversation: likes thrillers"),
+                msg("user", long), msg("assistant", long),
+                msg("user", "second"), msg("assistant", "reply"),
+                msg("user", "find dune"), msg("system", "1. *Dune* - £9.99")]
+    assert fit(messages, 10_000) == messages
+
+    kept = fit(messages, 60)
+    assert kept == [messages[0]] + messages[3:]
+    assert prompt_tokens(kept) <= 60
+    # Over budget even then: system context and the question still go out
+    assert fit(messages, 5) == [messages[0], messages[5], messages[6]]
+
+def test_compact_folds_old_turns_in_the_background():
+    calls = []
+    release = asyncio.Event()
+
+    async def summarize(messages):
+        calls.append(messages[0]["content"])
+        await release.wait()
+        return f"Summary {len(calls)}"
+
+    async def go():
+        context = ConversationContext(summarize, history_budget=30)
+        session = Session(1, [("user", "I love space opera " * 3), ("assistant", "Try *Dune* " * 3),
+                              ("user", "cheaper?"), ("assistant", "Try *Foundation*")])
+        task = context.compact(session, overflow=[("user", "hello"), ("assistant", "hi!")])
+        # The old turn left the history straight away; the summary follows later
+        assert session.history == [("user", "cheaper?"), ("assistant", "Try *Foundation*")]
+        assert session.summary == ""
+        before = context.build(session, "and another?")
+        release.set()
+        await task
+        return before, context.build(session, "and another?"), session, context
+
+    before, after, session, context = asyncio.run(go())
+    assert [m["role"] for m in before] == ["user", "assistant", "user"]
+    assert after[0] == msg("system", "Earlier in this conversation: Summary 1")
+    assert "Customer: hello" in calls[0] and "space opera" in calls[0]
+    assert session.unsummarized == [] and context.folds == 1
+
+def test_failed_summary_keeps_turns_for_next_time():
+    replies = [None, "Likes sci-fi"]
+
+    async def summarize(messages):
+        return replies.pop(0)
+
+    async def go():
+        context = ConversationContext(summarize)
+        session = Session(1)
+        await context.compact(session, [("user", "sci-fi please"), ("assistant", "Sure")])
+        assert session.unsummarized == [("user", "sci-fi please"), ("assistant", "Sure")]
+        await context.compact(session, [("user", "thanks"), ("assistant", "Enjoy")])
+        return session, context
+
+    session, context = asyncio.run(go())
+    assert session.summary == "Likes sci-fi" and session.unsummarized == []
+    assert (context.folds, context.fold_failures) == (1, 1)
+
+def test_handle_keeps_long_chats_within_budget(monkeypatch, tmp_path):
+    prompts = []
+
+    async def fake_reply(update, messages, route=None):
+        prompts.append(messages)
+        return "Certainly! " + "Here is a long and enthusiastic recommendation. " * 8
+
+    async def fake_summarize(messages):
+        return "Customer wants long space opera."
+
+    monkeypatch.setattr(bot, "generate_reply", fake_reply)
+    monkeypatch.setattr(bot, "STREAM_REPLIES", False)
+    monkeypatch.setattr(bot, "_sessions", SessionStore(str(tmp_path / "s.db")))
+    monkeypatch.setattr(bot, "_conversation", ConversationContext(fake_summarize, budget=700, history_budget=300))
+
+    async def go():
+        for i in range(12):
+            await bot.handle(FakeUpdate(f"tell me more about space opera, part {'x' * i}", user_id=7), None)
+        await bot.get_conversation().drain()
+        await bot.handle(FakeUpdate("anything else?", user_id=7), None)
+    asyncio.run(go())
+
+    sizes = [prompt_tokens(p) + bot.SYSTEM_TOKENS for p in prompts]
+    assert max(sizes) <= 700
+    assert prompts[-1][0] == msg("system", "Earlier in this conversation: Customer wants long space opera.")
+    assert prompts[-1][-1] == msg("user", "anything else?")
@@ -0,0 +1,100 @@
+# test_federated.py
+import asyncio
+import time
+
+from federated import FederatedSearch, merge_results
+from fixtures.fake_sources import StaticSource
+
+DUNE = {"title": "Dune", "authors": "Unknown Author", "isbn": None, "price": "£9.99"}
+DUNE_GOOGLE = {"title": "DUNE!", "authors": "Frank Herbert", "isbn": "978-0-441-01359-3", "price": "N/A"}
+DUNE_OTHER = {"title": "Dune (Deluxe)", "authors": "Frank Herbert", "isbn": "9780441013593"}
+SAPIENS = {"title": "Sapiens", "authors": "Yuval Noah Harari", "isbn": "9780062316097"}
+
+def run(search, query="dune", limit=3):
+    start = time.perf_counter()
+    result = asyncio.run(search.search(query, limit))
+    return result, time.perf_counter() - start
+
+def test_merge_dedupes_by_isbn_then_title():
+    books = merge_results([("catalog", [DUNE]), ("google", [DUNE_GOOGLE, DUNE_OTHER, SAPIENS])], 5)
+    assert [b["title"] for b in books] == ["Dune", "Sapiens"]
+    # the catalog copy wins but borrows what it was missing
+    assert books[0] == {**DUNE, "authors": "Frank Herbert", "isbn": "978-0-441-01359-3", "source": "catalog"}
+    assert books[1]["source"] == "google"
+
+def test_sources_run_in_parallel():
+    a = StaticSource("a", [DUNE], delay=0.2)
+    b = StaticSource("b", [SAPIENS], delay=0.2)
+    result, elapsed = run(FederatedSearch([a, b], deadline=2))
+    assert [bk["title"] for bk in result.books] == ["Dune", "Sapiens"]
+    assert elapsed < 0.35
+    assert result.reports["a"].status == "ok" and 0.15 < result.reports["a"].seconds < 0.35
+    assert not result.partial and result.source == "a"
+
+def test_deadline_returns_partial_results():
+    fast = StaticSource("fast", [SAPIENS], delay=0.01)
+    slow = StaticSource("slow", [DUNE], delay=5)
+    result, elapsed = run(FederatedSearch([slow, fast], deadline=0.2))
+    assert elapsed < 0.5
+    assert [b["title"] for b in result.books] == ["Sapiens"]
+    assert result.partial and result.reports["slow"].status == "timeout"
+    assert slow.cancelled == 1
+
+def test_hedged_source_skipped_when_primary_answers():
+    catalog = StaticSource("catalog", [DUNE, SAPIENS], delay=0.01)
+    google = StaticSource("google", [DUNE_GOOGLE], hedge=0.5)
+    result, elapsed = run(FederatedSearch([catalog, google]), limit=2)
+    assert google.queries == [] and result.reports["google"].status == "skipped"
+    assert elapsed < 0.3
+
+def test_hedged_source_starts_early_on_miss_and_errors_are_reported():
+    catalog = StaticSource("catalog", [], delay=0.01)
+    broken = StaticSource("broken", error=RuntimeError("quota"))
+    google = StaticSource("google", [DUNE_GOOGLE], hedge=5)
+    result, elapsed = run(FederatedSearch([catalog, broken, google]))
+    assert elapsed < 1
+    assert [b["title"] for b in result.books] == ["DUNE!"]
+    assert {n: r.status for n, r in result.reports.items()} == {"catalog": "empty", "broken": "error", "google": "ok"}
+
+def test_fallback_source_not_asked_on_partial_hit():
+    catalog = StaticSource("catalog", [SAPIENS], delay=0.01)
+    google = StaticSource("google", [DUNE_GOOGLE], fallback=True)
+    result, _ = run(FederatedSearch([catalog, google]), query="sapiens", limit=3)
+    assert google.queries == []
+    assert [b["title"] for b in result.books] == ["Sapiens"]
+    assert result.reports["google"].status == "skipped" and not result.partial
+
+def test_fallback_source_answers_a_miss():
+    catalog = StaticSource("catalog", [], delay=0.01)
+    google = StaticSource("google", [DUNE_GOOGLE], fallback=True)
+    result, _ = run(FederatedSearch([catalog, google]))
+    assert google.queries == ["dune"] and result.source == "google"
+
+def test_google_source_reuses_one_session(monkeypatch):
+    from aiohttp import web
+
+    import books
+
+    peers = set()
+
+    async def volumes(request):
+        peers.add(request.transport.get_extra_info("peername"))
+        return web.json_response({"items": [{"volumeInfo": {"title": "Dune"}}]})
+
+    async def go():
+        app = web.Application()
+        app.router.add_get("/volumes", volumes)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        monkeypatch.setattr(books, "GOOGLE_BOOKS_API",
+                            f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/volumes")
+        source = books.GoogleBooksSource()
+        found = [await source.search("dune", 3) for _ in range(3)]
+        await source.close()
+        await runner.cleanup()
+        return found
+    found = asyncio.run(go())
+    assert [[b["title"] for b in result] for result in found] == [["Dune"]] * 3
+    assert len(peers) == 1
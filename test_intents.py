@@ -0,0 +1,24 @@
+# test_intents.py
+import json
+import os
+
+import pytest
+
+from intents import Intent, IntentRouter, RULES, parse_intent
+
+CORPUS = os.path.join(os.path.dirname(__file__), "fixtures", "intent_corpus.jsonl")
+
+with open(CORPUS, encoding="utf-8") as f:
+    LABELLED = [json.loads(line) for line in f if line.strip()]
+
+@pytest.mark.parametrize("case", LABELLED, ids=[c["text"] for c in LABELLED])
+def test_labelled_corpus(case):
+    assert parse_intent(case["text"]) == Intent(case["intent"], case["query"], case["index"], case["quantity"])
+
+def test_rule_table_is_extensible():
+    router = IntentRouter(RULES + [("order", r"\badd\s+to\s+cart\b")])
+    assert router.route("add to cart") == Intent("order")
+    assert parse_intent("add to cart") == Intent("chat")
+
+def test_search_query_keeps_original_case():
+    assert parse_intent("find İstanbul Hatırası").query == "İstanbul Hatırası"
@@ -0,0 +1,103 @@
+# test_llm_client.py
+import asyncio
+
+from fixtures.mock_llm import MockLLM
+from utils import LLMClient, STREAM_CUT, SYSTEM_PROMPT
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_reuses_one_connection():
+    async def go():
+        async with MockLLM(reply="Hi there") as mock:
+            client = LLMClient(url=mock.url, api_key="test")
+            replies = [await client.complete([{"role": "user", "content": f"msg {i}"}]) for i in range(5)]
+            await client.close()
+            return replies, mock
+    replies, mock = run(go())
+    assert replies == ["Hi there"] * 5
+    assert len(mock.peers) == 1
+    assert mock.requests[0]["messages"][0] == {"role": "system", "content": SYSTEM_PROMPT}
+
+def test_retries_server_errors():
+    async def go():
+        async with MockLLM(fail_first=2) as mock:
+            client = LLMClient(url=mock.url, api_key="test", retries=2, backoff=0.01)
+            reply = await client.complete([{"role": "user", "content": "hi"}])
+            await client.close()
+            return reply, len(mock.requests)
+    assert run(go()) == ("Hello from the mock.", 3)
+
+def test_gives_up_and_passes_through_client_errors():
+    async def go():
+        async with MockLLM(fail_first=10) as mock:
+            client = LLMClient(url=mock.url, api_key="test", retries=1, backoff=0.01)
+            down = await client.complete([])
+            mock.fail_first, mock.fail_status = 1, 401
+            unauthorized = await client.complete([])
+            await client.close()
+            return down, unauthorized
+    down, unauthorized = run(go())
+    assert down == "AI down. Try again."
+    assert unauthorized.startswith("Invalid API key")
+
+def test_concurrency_limit():
+    async def go():
+        async with MockLLM(latency=0.05) as mock:
+            client = LLMClient(url=mock.url, api_key="test", max_concurrency=2)
+            await asyncio.gather(*(client.complete([]) for _ in range(6)))
+            await client.close()
+            return mock.peak_in_flight
+    assert run(go()) == 2
+
+def test_stream_yields_deltas():
+    async def go():
+        async with MockLLM(reply="Try *Sapiens* for £54.23", fail_first=1) as mock:
+            client = LLMClient(url=mock.url, api_key="test", backoff=0.01)
+            chunks = [c async for c in client.stream([{"role": "user", "content": "hi"}])]
+            await client.close()
+            return chunks, mock
+    chunks, mock = run(go())
+    assert chunks == ["Try", " *Sapiens*", " for", " £54.23"]
+    assert mock.requests[-1]["stream"] is True
+
+def test_stream_outlasts_total_timeout_while_chunks_flow():
+    async def go():
+        async with MockLLM(reply="one two three four", chunk_delay=0.3) as mock:
+            client = LLMClient(url=mock.url, api_key="test", timeout=1, stream_idle_timeout=1)
+            chunks = [c async for c in client.stream([{"role": "user", "content": "hi"}])]
+            await client.close()
+            return "".join(chunks), len(mock.requests)
+    assert run(go()) == ("one two three four", 1)
+
+def test_stream_broken_mid_reply_is_not_retried():
+    async def go():
+        async with MockLLM(reply="one two three four", chunk_delay=0.5) as mock:
+            client = LLMClient(url=mock.url, api_key="test", backoff=0.01, stream_idle_timeout=0.2)
+            chunks = [c async for c in client.stream([{"role": "user", "content": "hi"}])]
+            await client.close()
+            return chunks, len(mock.requests)
+    chunks, requests = run(go())
+    assert chunks == ["one", STREAM_CUT]
+    assert requests == 1
+
+def test_summary_route_uses_its_own_prompt_and_background_slots(monkeypatch):
+    import utils
+
+    async def go():
+        async with MockLLM(reply="Likes sci-fi", latency=0.3) as mock:
+            client = LLMClient(url=mock.url, api_key="test", max_concurrency=1)
+            monkeypatch.setattr(utils, "_client", client)
+            finished = []
+
+            async def timed(name, route):
+                await utils.call_llm([{"role": "user", "content": name}], route=route)
+                finished.append(name)
+            # Two live calls share the one live slot; the summary doesn't wait for either
+            await asyncio.gather(timed("live 1", None), timed("live 2", None), timed("summary", "summary"))
+            await client.close()
+            return finished, mock.requests
+    finished, requests = run(go())
+    assert finished.index("summary") < finished.index("live 2")
+    systems = {r["messages"][-1]["content"]: r["messages"][0]["content"] for r in requests}
+    assert systems["summary"] == utils.SUMMARY_PROMPT and systems["live 1"] == SYSTEM_PROMPT
@@ -0,0 +1,128 @@
+# test_metrics.py
+import asyncio
+import json
+import logging
+import os
+import socket
+
+import aiohttp
+
+import metrics
+from metrics import JsonFormatter, Registry, event
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def test_counter_and_histogram_render_prometheus_text():
+    registry = Registry()
+    searches = registry.counter("t_search_total", "Searches")
+    latency = registry.histogram("t_llm_seconds", "LLM time", buckets=(0.1, 1.0))
+    registry.gauge("t_queued", "Queued", lambda: 7)
+
+    searches.inc(result="cached")
+    searches.inc(result="cached")
+    searches.inc(result='odd"label')
+    latency.observe(0.05, route="chat")
+    latency.observe(0.5, route="chat")
+    latency.observe(3.0, route="chat")
+    try:
+        with latency.time(route="greeting"):
+            raise RuntimeError("upstream down")
+    except RuntimeError:
+        pass
+
+    text = registry.render()
+    assert "# TYPE t_search_total counter" in text
+    assert 't_search_total{result="cached"} 2' in text
+    assert 't_search_total{result="odd\\"label"} 1' in text
+    assert 't_llm_seconds_bucket{route="chat",le="0.1"} 1' in text
+    assert 't_llm_seconds_bucket{route="chat",le="1"} 2' in text
+    assert 't_llm_seconds_bucket{route="chat",le="+Inf"} 3' in text
+    assert 't_llm_seconds_count{route="chat"} 3' in text
+    assert latency.count(route="greeting", outcome="error") == 1
+    assert "t_queued 7" in text
+    # Registering the same name again returns the existing metric
+    assert registry.counter("t_search_total", "Searches") is searches
+
+def test_json_formatter_inlines_event_fields():
+    records = []
+
+    class Capture(logging.Handler):
+        def emit(self, record):
+            records.append(JsonFormatter().format(record))
+
+    log = logging.getLogger("test_metrics.events")
+    log.propagate = False
+    log.addHandler(Capture())
+    log.setLevel(logging.INFO)
+    event(log, "Search", user_id=42, query="dune", results=3)
+    event(log, "Too chatty", level=logging.DEBUG, ignored=True)
+
+    assert len(records) == 1
+    entry = json.loads(records[0])
+    assert entry["msg"] == "Search" and entry["level"] == "INFO"
+    assert entry["user_id"] == 42 and entry["query"] == "dune" and entry["results"] == 3
+
+def test_setup_logging_writes_json_lines_off_thread(tmp_path):
+    path = tmp_path / "bot.jsonl"
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    try:
+        metrics.setup_logging(str(path), "INFO", console=False)
+        event(logging.getLogger("bot"), "Handled message", intent="search", ms=12)
+        logging.getLogger("httpx").info("GET https://api.telegram.org/bot123:secret/getUpdates")
+        metrics.stop_logging()
+    finally:
+        metrics.stop_logging()
+        root.handlers, root.level = saved_handlers, saved_level
+
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [line["msg"] for line in lines] == ["Handled message"]
+    assert lines[0]["intent"] == "search" and lines[0]["logger"] == "bot"
+
+def test_forked_workers_log_to_their_own_files(tmp_path):
+    path = tmp_path / "bot.jsonl"
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    try:
+        metrics.setup_logging(str(path), "INFO", console=False)
+        log = logging.getLogger("bot")
+        event(log, "Before fork")
+        pid = os.fork()
+        if pid == 0:
+            try:
+                event(log, "From worker")
+                metrics.stop_logging()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        event(log, "From parent")
+        metrics.stop_logging()
+    finally:
+        metrics.stop_logging()
+        root.handlers, root.level = saved_handlers, saved_level
+
+    def messages(p):
+        return [json.loads(line)["msg"] for line in p.read_text(encoding="utf-8").splitlines()]
+    assert messages(path) == ["Before fork", "From parent"]
+    assert messages(tmp_path / f"bot.{pid}.jsonl") == ["From worker"]
+
+def test_metrics_endpoint_serves_registry():
+    metrics.counter("bookbot_test_total", "Test counter").inc(kind="endpoint")
+
+    async def go():
+        port = free_port()
+        runner = await metrics.start_metrics_server("127.0.0.1", port)
+        try:
+            async with aiohttp.ClientSession() as http:
+                async with http.get(f"http://127.0.0.1:{port}/metrics") as resp:
+                    return resp.status, resp.headers["Content-Type"], await resp.text()
+        finally:
+            await runner.cleanup()
+
+    status, content_type, body = asyncio.run(go())
+    assert status == 200
+    assert content_type.startswith("text/plain")
+    assert 'bookbot_test_total{kind="endpoint"} 1' in body
@@ -0,0 +1,115 @@
+# test_orders.py
+import asyncio
+import sqlite3
+
+import pytest
+
+from orders import MIGRATIONS, OrderRepository
+
+def test_concurrent_async_orders(tmp_path):
+    repo = OrderRepository(str(tmp_path / "orders.db"))
+
+    async def go():
+        return await asyncio.gather(*(
+            repo.create_order_async(str(i), "isbn", f"Book {i}", "addr") for i in range(50)
+        ))
+    ids = asyncio.run(go())
+    assert sorted(ids) == list(range(1, 51))
+    assert len(repo.get_orders()) == 50
+    repo.close()
+
+def test_failed_write_does_not_sink_batch(tmp_path):
+    repo = OrderRepository(str(tmp_path / "orders.db"))
+    bad = repo.submit("INSERT INTO missing_table VALUES (?)", (1,))
+    good = repo.submit("INSERT INTO orders (user_id) VALUES (?)", ("u",))
+    with pytest.raises(sqlite3.OperationalError):
+        bad.result()
+    assert good.result() == 1
+    repo.close()
+    with sqlite3.connect(str(tmp_path / "orders.db")) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+def test_migration_adds_created_at(tmp_path):
+    path = str(tmp_path / "old.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT, isbn TEXT, "
+                     "title TEXT, address TEXT, status TEXT DEFAULT 'Pending', tracking TEXT)")
+        conn.execute("INSERT INTO orders (user_id, title) VALUES ('1', 'Old')")
+    repo = OrderRepository(path)
+    [row] = repo.list_orders()
+    assert row["title"] == "Old" and row["created_at"]
+    repo.close()
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+
+def test_keyset_pages_filters_and_stats(tmp_path):
+    repo = OrderRepository(str(tmp_path / "orders.db"))
+    for i in range(25):
+        repo.submit("INSERT INTO orders (user_id, title, status, created_at) VALUES (?, ?, ?, ?)",
+                    (str(i), f"Book {i}", "Delivered" if i % 5 == 0 else "Pending",
+                     f"2025-11-{1 + i // 10:02d} 10:00:{i:02d}")).result()
+
+    seen, cursor = [], None
+    while True:
+        page = repo.list_orders(limit=10, before=cursor)
+        if not page:
+            break
+        seen += [r["id"] for r in page]
+        cursor = (page[-1]["created_at"], page[-1]["id"])
+    assert seen == list(range(25, 0, -1))
+
+    delivered = repo.list_orders(status=["Delivered"], since="2025-11-02", until="2025-11-03")
+    assert [r["title"] for r in delivered] == ["Book 15", "Book 10"]
+
+    assert repo.order_stats() == {"total": 25, "pending": 20, "delivered": 5,
+                                  "by_status": {"Delivered": 5, "Pending": 20}}
+    repo.update_order_status(2, "Delivered", "TRK-2")
+    assert repo.order_stats()["delivered"] == 6
+    assert repo.order_statuses() == ["Delivered", "Pending"]
+
+    plan = repo._query("EXPLAIN QUERY PLAN SELECT * FROM orders WHERE status IN ('Pending') "
+                       "ORDER BY created_at DESC, id DESC LIMIT 10")
+    assert "idx_orders_status_created" in " ".join(r["detail"] for r in plan)
+    repo.close()
+
+def test_rollups_follow_inserts_status_changes_and_backfill(tmp_path):
+    path = str(tmp_path / "orders.db")
+    with sqlite3.connect(path) as conn:
+        # A database from before the rollups, with orders already in it
+        conn.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT, isbn TEXT, "
+                     "title TEXT, address TEXT, status TEXT DEFAULT 'Pending', tracking TEXT, "
+                     "created_at TIMESTAMP)")
+        conn.executemany("INSERT INTO orders (user_id, title, status, created_at) VALUES (?, ?, ?, ?)",
+                         [("1", "Old", "Delivered", "2025-11-01 09:00:00"),
+                          ("2", "Older", "Pending", "2025-11-01 10:00:00")])
+        conn.execute("PRAGMA user_version = 1")
+    repo = OrderRepository(path)
+    for i in range(6):
+        repo.submit("INSERT INTO orders (user_id, title, created_at) VALUES (?, ?, ?)",
+                    (str(i), f"Book {i}", f"2025-11-0{2 + i % 2} 12:00:00")).result()
+    version = repo.changes_version()
+    repo.update_order_status(3, "Shipped")
+    repo.update_order_status(3, "Delivered", "TRK-3")
+    repo.update_order_status(4, "Pending", "TRK-4")   # tracking only; counts unchanged
+
+    def raw(where="1"):
+        rows = repo._query(f"SELECT status, COUNT(*) AS n FROM orders WHERE {where} GROUP BY status")
+        return {r["status"]: r["n"] for r in rows}
+
+    assert repo.order_stats()["by_status"] == raw() == {"Delivered": 2, "Pending": 6}
+    assert repo.order_stats("2025-11-02", "2025-11-03")["by_status"] == \
+        raw("created_at >= '2025-11-02' AND created_at < '2025-11-03'") == {"Delivered": 1, "Pending": 2}
+    # A range with a time part can't use the daily rollup
+    assert repo.order_stats("2025-11-01 09:30:00", "2025-11-02")["by_status"] == {"Pending": 1}
+    assert repo.order_statuses() == ["Delivered", "Pending"]
+    assert repo.daily_counts("2025-11-01", "2025-11-02") == [
+        {"day": "2025-11-01", "status": "Delivered", "n": 1},
+        {"day": "2025-11-01", "status": "Pending", "n": 1},
+    ]
+
+    changed = repo.changed_since(version)
+    assert [(r["id"], r["status"], r["tracking"]) for r in changed] == [(3, "Delivered", "TRK-3"),
+                                                                        (4, "Pending", "TRK-4")]
+    assert repo.changed_since(changed[-1]["seq"]) == []
+    assert repo.changes_version() == changed[-1]["seq"]
+    repo.close()
@@ -0,0 +1,91 @@
+# test_scheduler.py
+import asyncio
+import random
+
+import pytest
+
+from fixtures.fake_telegram import FakeUpdate
+from scheduler import Overloaded, Scheduler
+
+def test_per_user_order_fairness_and_concurrency():
+    async def go():
+        sched = Scheduler(max_concurrency=8, max_queue=100_000, max_per_user=10)
+        running, peak, active_users, log = 0, 0, set(), {}
+
+        async def work(user, n):
+            nonlocal running, peak
+            assert user not in active_users, "same user ran twice at once"
+            active_users.add(user)
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(random.uniform(0, 0.002))
+            log.setdefault(user, []).append(n)
+            running -= 1
+            active_users.discard(user)
+            return n
+
+        jobs = [sched.submit(u, lambda u=u, n=n: work(u, n)) for u in range(2000) for n in range(3)]
+        results = await asyncio.gather(*jobs)
+        await sched.stop()
+        return results, log, peak, sched.stats()
+
+    results, log, peak, stats = asyncio.run(go())
+    assert results == [n for _ in range(2000) for n in range(3)]
+    assert all(order == [0, 1, 2] for order in log.values())
+    assert peak == 8
+    assert stats["completed"] == 6000 and stats["queued"] == 0
+
+def test_round_robin_across_users():
+    async def go():
+        sched = Scheduler(max_concurrency=1, max_per_user=10)
+        order = []
+
+        async def work(tag):
+            order.append(tag)
+
+        # user "a" floods first; "b" and "c" still get served between a's turns
+        jobs = [sched.submit("a", lambda i=i: work(f"a{i}")) for i in range(3)]
+        jobs += [sched.submit("b", lambda: work("b0")), sched.submit("c", lambda: work("c0"))]
+        await asyncio.gather(*jobs)
+        await sched.stop()
+        return order
+    assert asyncio.run(go()) == ["a0", "b0", "c0", "a1", "a2"]
+
+def test_sheds_load_with_busy_reply():
+    async def go():
+        sched = Scheduler(max_concurrency=1, max_queue=2, max_per_user=5)
+        gate = asyncio.Event()
+
+        async def slow(update, context):
+            await gate.wait()
+
+        handler = sched.wrap(slow, busy_reply="busy")
+        updates = [FakeUpdate("hi", user_id=i) for i in range(4)]
+        first = asyncio.create_task(handler(updates[0], None))
+        await asyncio.sleep(0.01)   # let the single worker pick it up
+        rest = [asyncio.create_task(handler(u, None)) for u in updates[1:]]
+        await asyncio.sleep(0.01)
+        gate.set()
+        await asyncio.gather(first, *rest)
+        await sched.stop()
+        return updates, sched.stats()
+    updates, stats = asyncio.run(go())
+    # one running + two queued fit; the fourth is turned away immediately
+    assert [len(u.message.sent) for u in updates] == [0, 0, 0, 1]
+    assert updates[3].message.sent[0].edits == [("busy", None)]
+    assert stats["shed"] == 1 and stats["completed"] == 3
+
+def test_per_user_limit_raises_overloaded():
+    async def go():
+        sched = Scheduler(max_concurrency=1, max_queue=100, max_per_user=1)
+        gate = asyncio.Event()
+        running = asyncio.create_task(sched.submit("a", gate.wait))
+        await asyncio.sleep(0.01)
+        queued = asyncio.create_task(sched.submit("a", gate.wait))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            await sched.submit("a", gate.wait)
+        gate.set()
+        await asyncio.gather(running, queued)
+        await sched.stop()
+    asyncio.run(go())
@@ -0,0 +1,122 @@
+# test_scraper.py
+import asyncio
+import os
+
+from aiohttp import web
+
+import scraper
+from scraper import CatalogScraper, parse_page_count
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+def fixture_app(failures=None):
+    """Serve saved books.toscrape.com pages; `failures` maps path -> 503s to send first."""
+    failures = dict(failures or {})
+    hits = []
+
+    async def page(request):
+        path = request.path.lstrip("/")
+        hits.append(path)
+        if failures.get(path):
+            failures[path] -= 1
+            return web.Response(status=503)
+        file = os.path.join(FIXTURES, path)
+        if not os.path.isfile(file):
+            raise web.HTTPNotFound()
+        with open(file, "rb") as f:
+            return web.Response(body=f.read(), content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", page)
+    return app, hits
+
+async def serve(app):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+def run_scrape(failures=None, max_pages=None):
+    async def go():
+        app, hits = fixture_app(failures)
+        runner, base = await serve(app)
+        try:
+            async with CatalogScraper(base, backoff=0.01) as s:
+                return await s.scrape(max_pages), hits, base
+        finally:
+            await runner.cleanup()
+    return asyncio.run(go())
+
+def test_page_count_discovery():
+    with open(os.path.join(FIXTURES, "catalogue", "page-1.html"), encoding="utf-8") as f:
+        assert parse_page_count(f.read()) == 2
+    assert parse_page_count("<html></html>") == 1
+
+def test_scrape_all_pages_in_order():
+    books, hits, base = run_scrape()
+    assert len(books) == 8
+    assert books[0]["title"] == "A Light in the Attic"
+    assert books[0]["price"] == "£51.77"
+    assert books[0]["url"] == f"{base}/catalogue/a-light-in-the-attic_1000/index.html"
+    assert books[4]["title"].startswith("Sapiens")
+    assert sorted(hits) == ["catalogue/page-1.html", "catalogue/page-2.html"]
+
+def test_retry_on_server_error():
+    books, hits, _ = run_scrape(failures={"catalogue/page-2.html": 2})
+    assert len(books) == 8
+    assert hits.count("catalogue/page-2.html") == 3
+
+def test_gives_up_and_keeps_partial_results():
+    books, hits, _ = run_scrape(failures={"catalogue/page-2.html": scraper.MAX_RETRIES + 1})
+    assert len(books) == 4
+
+def test_max_pages_cap():
+    books, hits, _ = run_scrape(max_pages=1)
+    assert len(books) == 4
+    assert hits == ["catalogue/page-1.html"]
+
+def test_fetch_details_parses_product_pages():
+    async def go():
+        app, hits = fixture_app()
+        runner, base = await serve(app)
+        try:
+            async with CatalogScraper(base) as s:
+                urls = [f"{base}/catalogue/a-light-in-the-attic_1000/index.html",
+                        f"{base}/catalogue/missing_1/index.html"]
+                return await s.fetch_details(urls), urls
+        finally:
+            await runner.cleanup()
+    details, urls = asyncio.run(go())
+    assert list(details) == [urls[0]]
+    assert details[urls[0]]["isbn"] == "a897fe39b1053632"
+    assert details[urls[0]]["description"].startswith("It's hard to imagine")
+
+def test_enrichment_is_persisted(tmp_path, monkeypatch):
+    import books
+    from catalog_store import DetailStore
+
+    monkeypatch.setattr(books, "_detail_store", DetailStore(str(tmp_path / "details.db")))
+
+    async def go():
+        app, hits = fixture_app()
+        runner, base = await serve(app)
+        try:
+            def fresh():
+                return [{"title": "A Light in the Attic", "url": f"{base}/catalogue/a-light-in-the-attic_1000/index.html", "isbn": None},
+                        {"title": "Tipping the Velvet", "url": f"{base}/catalogue/tipping-the-velvet_999/index.html", "isbn": None}]
+            first = await books.enrich_books_async(fresh())
+            fetched = len(hits)
+            scraper = books._enrich_scraper
+            second = await books.enrich_books_async(fresh())
+            # The next search's fetches go over the same pooled session
+            assert books.get_enrich_scraper() is scraper and not scraper.closed
+            return first, second, fetched, len(hits)
+        finally:
+            await books.close_http_sessions()
+            await runner.cleanup()
+    first, second, fetched, total = asyncio.run(go())
+    assert fetched == 2 and total == 2
+    assert [b["isbn"] for b in first] == ["a897fe39b1053632", "90fa61229261140a"]
+    assert second == first
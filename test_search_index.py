@@ -0,0 +1,59 @@
+# test_search_index.py
+from search_index import CatalogIndex, repair_mojibake
+
+BOOKS = [
+    {"title": "A Light in the Attic", "authors": "Shel Silverstein", "isbn": "a897fe39b1053632"},
+    {"title": "Tipping the Velvet", "authors": "Sarah Waters", "isbn": "90fa61229261140a"},
+    {"title": "Sapiens: A Brief History of Humankind", "authors": "Yuval Noah Harari", "isbn": "4165285e1663650f"},
+    {"title": "The Requiem Red", "authors": "Unknown Author", "isbn": None},
+]
+
+def titles(results):
+    return [b["title"] for b in results]
+
+def test_token_and_phrase():
+    idx = CatalogIndex(BOOKS)
+    assert titles(idx.search("light attic")) == ["A Light in the Attic"]
+    assert titles(idx.search("Requiem Red", 1)) == ["The Requiem Red"]
+
+def test_prefix_author_and_isbn():
+    idx = CatalogIndex(BOOKS)
+    assert titles(idx.search("velv")) == ["Tipping the Velvet"]
+    assert titles(idx.search("harari")) == ["Sapiens: A Brief History of Humankind"]
+    assert titles(idx.search("90fa61229261140a")) == ["Tipping the Velvet"]
+
+def test_substring_fallback():
+    idx = CatalogIndex(BOOKS)
+    assert titles(idx.search("ttic")) == ["A Light in the Attic"]
+
+def test_all_tokens_required():
+    idx = CatalogIndex(BOOKS)
+    assert idx.search("Python Programming") == []
+    assert CatalogIndex([]).search("anything") == []
+
+def test_typos_and_word_order():
+    idx = CatalogIndex(BOOKS + [{"title": "Atomic Habits", "authors": "James Clear"},
+                                {"title": "The Habit of Excellence"}])
+    assert titles(idx.search("atomc habit")) == ["Atomic Habits"]
+    assert titles(idx.search("habits atomic")) == ["Atomic Habits"]
+    assert titles(idx.search("velvett tiping")) == ["Tipping the Velvet"]
+    assert titles(idx.search("harrari")) == ["Sapiens: A Brief History of Humankind"]
+    assert idx.search("zzyzx qwrty") == []
+
+def test_top_k_scores_rank_exact_above_fuzzy():
+    idx = CatalogIndex([{"title": "Red Rising"}, {"title": "Reed Rising"}, {"title": "Rising Tide"}])
+    results = idx.search_scored("reed rising", 3)
+    assert [b["title"] for b, _ in results][0] == "Reed Rising"
+    scores = [s for _, s in results]
+    assert scores == sorted(scores, reverse=True) and len(scores) == 1
+    fuzzy = idx.search_scored("reed risng", 3)
+    assert [b["title"] for b, _ in fuzzy][:2] == ["Reed Rising", "Red Rising"]
+    assert fuzzy[0][1] > fuzzy[1][1]
+
+def test_unicode_and_mojibake_normalisation():
+    idx = CatalogIndex([{"title": "Pokémon Adventures", "price": "Â£12.00"}, {"title": "CafÃ© Society"}])
+    assert titles(idx.search("pokemon")) == ["Pokémon Adventures"]
+    assert titles(idx.search("POKÉMON")) == ["Pokémon Adventures"]
+    assert titles(idx.search("café")) == ["CafÃ© Society"]
+    assert repair_mojibake("Â£51.77") == "£51.77"
+    assert repair_mojibake("£51.77") == "£51.77"
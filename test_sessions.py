@@ -0,0 +1,129 @@
+# test_sessions.py
+import asyncio
+
+from sessions import SessionStore
+
+def test_lru_cap(tmp_path):
+    store = SessionStore(str(tmp_path / "s.db"), max_sessions=2)
+    store.get(1)
+    store.get(2)
+    store.get(1)          # 1 becomes most recent
+    store.get(3)          # evicts 2
+    assert store.cached(2) is None
+    assert store.cached(1) is not None and len(store) == 2
+    assert store.stats()["evictions"] == 1
+
+def test_idle_sweep(tmp_path):
+    store = SessionStore(str(tmp_path / "s.db"), idle_ttl=10)
+    store.get(1).last_seen -= 20
+    store.get(2)
+    assert store.sweep() == 1
+    assert store.cached(1) is None and store.cached(2) is not None
+
+def test_write_behind_and_rehydration(tmp_path):
+    path = str(tmp_path / "s.db")
+    store = SessionStore(path, max_history=4)
+    store.reset(7, "Rahim")
+    session = store.get(7)
+    for i in range(3):
+        store.record_turn(session, f"q{i}", f"a{i}")
+    assert session.history == [("user", "q1"), ("assistant", "a1"), ("user", "q2"), ("assistant", "a2")]
+    assert store.stats()["pending_writes"] == 3
+    assert store.flush() == 3
+    store.close()
+
+    fresh = SessionStore(path, max_history=4)
+    session = asyncio.run(fresh.get_async(7))
+    assert session.messages() == [
+        {"role": "user", "content": "q1"}, {"role": "assistant", "content": "a1"},
+        {"role": "user", "content": "q2"}, {"role": "assistant", "content": "a2"},
+    ]
+    assert fresh.stats()["rehydrations"] == 1
+    assert fresh._conn.execute("SELECT display_name FROM users WHERE user_id = '7'").fetchone() == ("Rahim",)
+
+def test_shared_stores_see_each_others_turns(tmp_path):
+    path = str(tmp_path / "s.db")
+    a, b = SessionStore(path, shared=True), SessionStore(path, shared=True)
+
+    async def go():
+        session = await a.get_async(5)
+        session.last_books = [{"title": "Dune"}]
+        a.record_turn(session, "hi", "hello")
+        a.flush()
+        other = await b.get_async(5)
+        b.record_turn(other, "find dune", "Try *Dune*")
+        b.flush()
+        return await a.get_async(5)
+    session = asyncio.run(go())
+    assert session.history == [("user", "hi"), ("assistant", "hello"),
+                               ("user", "find dune"), ("assistant", "Try *Dune*")]
+    assert session.last_books == [{"title": "Dune"}]
+
+def test_shared_workers_share_last_search_results(tmp_path):
+    path = str(tmp_path / "s.db")
+    a, b = SessionStore(path, shared=True), SessionStore(path, shared=True)
+
+    async def go():
+        # "find dune" lands on worker A...
+        session = await a.get_async(5)
+        session.last_books = [{"title": "Dune", "isbn": "1"}]
+        a.record_turn(session, "find dune", "Try *Dune*")
+        a.flush()
+        # ..."order the first one" on worker B
+        return await b.get_async(5)
+    assert asyncio.run(go()).last_books == [{"title": "Dune", "isbn": "1"}]
+
+    a.reset(5)
+    a.flush()
+    assert asyncio.run(b.get_async(5)).last_books == []
+
+def test_shared_turns_wait_for_another_process(tmp_path):
+    import subprocess
+    import sys
+    import time
+
+    path = str(tmp_path / "s.db")
+    store = SessionStore(path, shared=True)
+    holder = subprocess.Popen([sys.executable, "-c", (
+        "import fcntl, os, sys, time\n"
+        f"fd = os.open({path + '.turns'!r}, os.O_RDWR | os.O_CREAT)\n"
+        "fcntl.lockf(fd, fcntl.LOCK_EX, 1, 5)\n"
+        "print('locked', flush=True)\n"
+        "time.sleep(0.5)\n")], stdout=subprocess.PIPE, text=True)
+    assert holder.stdout.readline().strip() == "locked"
+
+    async def timed(user_id):
+        start = time.perf_counter()
+        async with store.turn(user_id):
+            return time.perf_counter() - start
+
+    assert asyncio.run(timed(6)) < 0.2     # other users aren't held up
+    assert asyncio.run(timed(5)) >= 0.2    # user 5 waits for the other worker's turn
+    holder.wait()
+    store.close()
+
+def test_reset_survives_rehydration_and_other_workers(tmp_path):
+    path = str(tmp_path / "s.db")
+    a, b = SessionStore(path, shared=True), SessionStore(path, shared=True)
+
+    async def go():
+        session = await a.get_async(7)
+        session.last_books = [{"title": "Dune"}]
+        a.record_turn(session, "find dune", "Try *Dune*")
+        a.flush()
+        async with a.turn(7):   # what bot.start does in shared mode
+            a.reset(7)
+            a.flush()
+        other = await b.get_async(7)
+        assert (other.history, other.last_books) == ([], [])
+        b.record_turn(other, "hello again", "Hi!")
+        b.flush()
+        return await a.get_async(7)
+    assert asyncio.run(go()).history == [("user", "hello again"), ("assistant", "Hi!")]
+
+    # A single process that evicts and rehydrates the user honours the reset too
+    single = SessionStore(path)
+    single.reset(7)
+    single.record_turn(single.get(7), "after", "reset")
+    single.flush()
+    assert SessionStore(path).get(7).history == [("user", "after"), ("assistant", "reset")]
@@ -0,0 +1,81 @@
+# test_shipments.py
+import asyncio
+
+import courier
+from orders import OrderRepository
+from shipments import ShipmentQueue
+
+def make_orders(path, n):
+    repo = OrderRepository(path)
+    ids = [repo.create_order(str(i), "isbn", f"Book {i}", "addr") for i in range(n)]
+    repo.close()
+    return ids
+
+def test_batches_bookings_and_writes_tracking(tmp_path, monkeypatch):
+    path = str(tmp_path / "orders.db")
+    ids = make_orders(path, 3)
+    batches, notified = [], []
+
+    def fake_book(shipments):
+        batches.append([s["invoice"] for s in shipments])
+        return [{"tracking_code": f"TRK-{s['invoice']}", "status": "Booked"} for s in shipments]
+
+    async def notify(chat_id, order_id, tracking):
+        notified.append((chat_id, order_id, tracking))
+
+    monkeypatch.setattr(courier, "book_shipments", fake_book)
+
+    async def go():
+        queue = ShipmentQueue(path, workers=1, notify=notify, poll_interval=0.01)
+        for order_id in ids:
+            await queue.enqueue_async(order_id, chat_id=42, recipient_name="C")
+        await queue.start()
+        while await asyncio.to_thread(queue.depth):
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(go())
+    assert batches == [["1", "2", "3"]]
+    assert sorted(notified) == [(42, 1, "TRK-1"), (42, 2, "TRK-2"), (42, 3, "TRK-3")]
+    repo = OrderRepository(path)
+    assert [o["tracking"] for o in repo.list_orders()] == ["TRK-3", "TRK-2", "TRK-1"]
+    repo.close()
+    assert queue.job(1)["status"] == "done"
+
+def test_retries_then_gives_up(tmp_path, monkeypatch):
+    path = str(tmp_path / "orders.db")
+    [order_id] = make_orders(path, 1)
+    notified = []
+
+    def down(shipments):
+        raise ConnectionError("courier down")
+
+    async def notify(chat_id, order_id, tracking):
+        notified.append(tracking)
+
+    monkeypatch.setattr(courier, "book_shipments", down)
+
+    async def go():
+        queue = ShipmentQueue(path, max_attempts=3, backoff=0, notify=notify)
+        queue.enqueue(order_id)
+        for _ in range(3):
+            await queue.process(queue.claim(10))
+        return queue
+
+    queue = asyncio.run(go())
+    assert queue.job(order_id) == {"status": "failed", "attempts": 3, "tracking": None,
+                                   "last_error": "courier down"}
+    assert notified == [None]
+
+def test_jobs_survive_restart(tmp_path):
+    path = str(tmp_path / "orders.db")
+    [order_id] = make_orders(path, 1)
+    first = ShipmentQueue(path)
+    first.enqueue(order_id)
+    assert len(first.claim(10)) == 1       # claimed, then the process dies
+
+    second = ShipmentQueue(path)
+    assert second.claim(10) == []
+    assert second.recover() == 1
+    assert [j["order_id"] for j in second.claim(10)] == [order_id]
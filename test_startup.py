@@ -0,0 +1,25 @@
+# test_startup.py
+import subprocess
+import sys
+
+import books
+import bot
+from catalog_store import DetailStore
+
+def test_importing_bot_leaves_scraping_and_webhook_modules_unloaded():
+    code = ("import sys, bot; "
+            "print(sorted(m for m in ('books', 'requests', 'bs4', 'webhook', 'aiohttp.web') if m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
+
+def test_warmup_builds_the_catalog_index_off_the_main_thread(monkeypatch, tmp_path):
+    books.BookCache(str(tmp_path / "cache.json")).save([{"title": "Dune", "price": "£9.99", "isbn": "1"}])
+    monkeypatch.setattr(books, "CACHE_FILE", str(tmp_path / "cache.json"))
+    monkeypatch.setattr(books, "CATALOG_BACKEND", "json")
+    monkeypatch.setattr(books, "_index", None)
+    monkeypatch.setattr(books, "_index_timestamp", None)
+    monkeypatch.setattr(books, "_detail_store", DetailStore(str(tmp_path / "details.db")))
+
+    bot.start_warmup().join(timeout=10)
+    assert books._index is not None and len(books._index) == 1
+    assert [b["title"] for b in books.catalog_search("dune")] == ["Dune"]
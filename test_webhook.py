@@ -0,0 +1,51 @@
+# test_webhook.py
+import asyncio
+import socket
+
+import aiohttp
+from telegram.ext import Application, MessageHandler, filters
+
+from fixtures.fake_bot_api import FakeBotAPI, text_update
+from webhook import SECRET_HEADER, serve
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def test_webhook_validates_secret_and_dispatches():
+    api = FakeBotAPI()
+    application = Application.builder().token("123:test").request(api).build()
+
+    async def echo(update, context):
+        await update.message.reply_text(update.message.text.upper())
+
+    application.add_handler(MessageHandler(filters.TEXT, echo))
+
+    async def go():
+        port, stop = free_port(), asyncio.Event()
+        server = asyncio.create_task(serve(application, "s3cret", "127.0.0.1", port, "/hook", stop=stop))
+        url = f"http://127.0.0.1:{port}/hook"
+        async with aiohttp.ClientSession() as http:
+            for _ in range(50):
+                try:
+                    async with http.get(f"http://127.0.0.1:{port}/healthz"):
+                        break
+                except aiohttp.ClientConnectionError:
+                    await asyncio.sleep(0.05)
+            statuses = []
+            for headers, body in [
+                ({}, text_update(1, 9, "nope")),
+                ({SECRET_HEADER: "wrong"}, text_update(2, 9, "nope")),
+                ({SECRET_HEADER: "s3cret"}, {"not": "an update"}),
+                ({SECRET_HEADER: "s3cret"}, text_update(3, 9, "hello")),
+            ]:
+                async with http.post(url, json=body, headers=headers) as resp:
+                    statuses.append(resp.status)
+        stop.set()
+        await server
+        return statuses
+    statuses = asyncio.run(go())
+    assert statuses == [403, 403, 400, 200]
+    assert api.sent == [(9, "HELLO")]
+    assert api.calls["setWebhook"] == 0
@@ -1,11 +1,22 @@
 # utils.py
+import asyncio
 import aiohttp
+import json
 import logging
-from typing import List, Dict
+import os
+import random
+import time
+from typing import AsyncIterator, List, Dict, Optional
 
-logging.basicConfig(level=logging.INFO)
+from cache import ResponseCache
+from context import PROMPT_BUDGET, fit, message_tokens, prompt_tokens
+from metrics import counter, histogram
 logger = logging.getLogger(__name__)
 
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_KEY = os.getenv("OPENROUTER_API_KEY", "")
+MODEL = os.getenv("BOOKBOT_MODEL", "anthropic/claude-sonnet-4.5")
+
 
 # SALESPERSON PROMPT — Friendly, Persuasive, Step-by-Step
 SYSTEM_PROMPT = """
@@ -27,35 +38,298 @@ Rules:
 - Use *bold* for book titles and prices.
 """
 
-# === ASYNC LLM CALL (FREE & WORKING) ===
-async def call_llm(messages: List[Dict], temperature=0.3, max_tokens=200) -> str:
+# The system prompt is the same on every request, so it is built (and
+# counted) once and always goes first: a byte-identical prefix is what
+# provider-side prompt caching keys on. BOOKBOT_PROMPT_CACHE=1 also marks
+# it with an explicit cache breakpoint for providers that need one.
+PROMPT_CACHE = os.getenv("BOOKBOT_PROMPT_CACHE", "0") == "1"
+SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": [{"type": "text", "text": SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}]
+    if PROMPT_CACHE else SYSTEM_PROMPT,
+}
+SYSTEM_TOKENS = message_tokens(SYSTEM_MESSAGE)
+
+# Calls that never reach the customer get their own plain system prompt
+# (not the sales voice) and run on the client's background slots, so they
+# never hold up a live reply.
+SUMMARY_PROMPT = (
+    "You keep notes on a bookstore chat for the assistant's own memory. "
+    "Write plain, neutral notes: no greetings, no selling, no Markdown."
+)
+BACKGROUND_ROUTES = {"summary": {"role": "system", "content": SUMMARY_PROMPT}}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+STREAM_CUT = " …\n\n(Connection lost, reply cut short. Try again.)"
+
+def fit_prompt(messages: List[Dict], system: Dict = SYSTEM_MESSAGE) -> List[Dict]:
+    """Trim messages so they and the system prompt fit in PROMPT_BUDGET tokens."""
+    return fit(messages, PROMPT_BUDGET - message_tokens(system))
+
+def request_tokens(messages: List[Dict], system: Dict = SYSTEM_MESSAGE) -> int:
+    """Estimated prompt tokens of a request for these (already fitted) messages."""
+    return message_tokens(system) + prompt_tokens(messages)
+
+def build_payload(messages: List[Dict], temperature: float, max_tokens: int, model: str = MODEL,
+                  system: Dict = SYSTEM_MESSAGE) -> dict:
     if not messages:
         messages = [{"role": "user", "content": "Hi"}]
-
-    payload = {
-        "model": "anthropic/claude-sonnet-4.5",
-        "messages": [{"role": "system", "content": SYSTEM_PROMPT}] + messages[-7:],
+    return {
+        "model": model,
+        "messages": [system] + fit_prompt(messages, system),
         "temperature": temperature,
         "max_tokens": max_tokens
     }
 
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                json=payload,
-                headers={"Authorization": f"Bearer {OPENROUTER_KEY}"},
-                timeout=15
-            ) as resp:
-                text = await resp.text()
-                if resp.status == 401:
-                    return "Invalid API key. Get a new one from openrouter.ai/keys"
-                if resp.status != 200:
-                    return f"AI error {resp.status}. Try again."
-                data = await resp.json()
-                content = data["choices"][0]["message"]["content"].strip()
-                return content if content else "AI returned nothing."
-    except Exception as e:
-        logger.error(f"LLM Error: {e}")
+# === LONG-LIVED LLM CLIENT ===
+class LLMClient:
+    """
+    One pooled aiohttp session to the chat completions endpoint, reused
+    across calls (keep-alive, no per-message TCP/TLS handshake).
+    Concurrency is capped by a semaphore; background calls (summaries)
+    have a separate, smaller one so they never take a live reply's slot.
+    429/5xx and network errors are retried with full-jitter exponential
+    backoff, honouring Retry-After.
+    """
 
+    def __init__(self, url: str = OPENROUTER_URL, api_key: str = None, model: str = MODEL,
+                 max_concurrency: int = 8, pool_size: int = 16, timeout: float = 15,
+                 connect_timeout: float = 5, retries: int = 2, backoff: float = 0.5,
+                 stream_idle_timeout: float = 15, background_concurrency: int = 2):
+        self.url = url
+        self.api_key = OPENROUTER_KEY if api_key is None else api_key
+        self.model = model
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        # A streamed reply may run as long as it likes, as long as chunks keep coming
+        self.stream_timeout = aiohttp.ClientTimeout(total=None, connect=connect_timeout,
+                                                    sock_read=stream_idle_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self._limit = asyncio.Semaphore(max_concurrency)
+        self._background_limit = asyncio.Semaphore(background_concurrency)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers={"Authorization": f"Bearer {self.api_key}"}
+            )
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _retry_delay(self, attempt: int, retry_after: Optional[str]) -> float:
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+    async def complete(self, messages: List[Dict], temperature=0.3, max_tokens=200,
+                       system: Dict = SYSTEM_MESSAGE, background: bool = False) -> str:
+        await self.start()
+        payload = build_payload(messages, temperature, max_tokens, self.model, system)
+        async with (self._background_limit if background else self._limit):
+            for attempt in range(self.retries + 1):
+                retry_after = None
+                try:
+                    async with self._session.post(self.url, json=payload) as resp:
+                        if resp.status == 401:
+                            return "Invalid API key. Get a new one from openrouter.ai/keys"
+                        if resp.status == 200:
+                            data = await resp.json(content_type=None)
+                            content = data["choices"][0]["message"]["content"].strip()
+                            return content if content else "AI returned nothing."
+                        if resp.status not in RETRY_STATUSES:
+                            return f"AI error {resp.status}. Try again."
+                        retry_after = resp.headers.get("Retry-After")
+                        reason = f"HTTP {resp.status}"
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    reason = str(e) or type(e).__name__
+                except Exception as e:
+                    logger.error(f"LLM Error: {e}")
+                    return "AI down. Try again."
+                if attempt < self.retries:
+                    delay = self._retry_delay(attempt, retry_after)
+                    logger.warning(f"LLM call failed ({reason}), retry {attempt + 1} in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+        logger.error(f"LLM Error: {reason}")
         return "AI down. Try again."
+
+    async def stream(self, messages: List[Dict], temperature=0.3, max_tokens=200) -> AsyncIterator[str]:
+        """
+        Yield content deltas from a streamed (server-sent events) completion.
+        Retries happen only before the first chunk; errors are yielded as
+        the same short messages complete() returns. A stream that breaks
+        after text has gone out ends with STREAM_CUT instead of starting over.
+        """
+        await self.start()
+        payload = build_payload(messages, temperature, max_tokens, self.model)
+        payload["stream"] = True
+        sent = False
+        async with self._limit:
+            for attempt in range(self.retries + 1):
+                retry_after = None
+                try:
+                    async with self._session.post(self.url, json=payload, timeout=self.stream_timeout) as resp:
+                        if resp.status == 401:
+                            yield "Invalid API key. Get a new one from openrouter.ai/keys"
+                            return
+                        if resp.status == 200:
+                            async for delta in _iter_sse_deltas(resp.content):
+                                sent = True
+                                yield delta
+                            return
+                        if resp.status not in RETRY_STATUSES:
+                            yield f"AI error {resp.status}. Try again."
+                            return
+                        retry_after = resp.headers.get("Retry-After")
+                        reason = f"HTTP {resp.status}"
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    reason = str(e) or type(e).__name__
+                    if sent:
+                        # The user already sees part of the reply; a retry would repeat it
+                        logger.error(f"LLM stream broke mid-reply: {reason}")
+                        yield STREAM_CUT
+                        return
+                if attempt < self.retries:
+                    delay = self._retry_delay(attempt, retry_after)
+                    logger.warning(f"LLM stream failed ({reason}), retry {attempt + 1} in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+        logger.error(f"LLM Error: {reason}")
+        yield "AI down. Try again."
+
+async def _iter_sse_deltas(content: aiohttp.StreamReader) -> AsyncIterator[str]:
+    async for raw in content:
+        line = raw.strip()
+        # Blank lines separate events; ':' lines are keep-alive comments
+        if not line.startswith(b"data:"):
+            continue
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            return
+        try:
+            chunk = json.loads(data)
+        except ValueError:
+            logger.warning(f"Skipping malformed SSE line: {data[:80]!r}")
+            continue
+        choices = chunk.get("choices") or [{}]
+        delta = (choices[0].get("delta") or {}).get("content")
+        if delta:
+            yield delta
+
+_client: Optional[LLMClient] = None
+
+def get_llm_client() -> LLMClient:
+    global _client
+    if _client is None:
+        _client = LLMClient(
+            max_concurrency=int(os.getenv("BOOKBOT_LLM_CONCURRENCY", "8")),
+            background_concurrency=int(os.getenv("BOOKBOT_LLM_BACKGROUND_CONCURRENCY", "2")),
+            timeout=float(os.getenv("BOOKBOT_LLM_TIMEOUT", "15")),
+            stream_idle_timeout=float(os.getenv("BOOKBOT_LLM_STREAM_IDLE", "15")),
+        )
+    return _client
+
+# Application lifecycle hooks: Application.builder().post_init(...).post_shutdown(...)
+async def start_llm_client(app=None):
+    await get_llm_client().start()
+
+async def stop_llm_client(app=None):
+    await get_llm_client().close()
+
+# === RESPONSE CACHE ===
+# Routes opt in by name. Each caches on the last N messages only, so the
+# same question after different small talk still hits.
+CACHE_ROUTES = {
+    "greeting": {"context": 1, "ttl": 24 * 3600},
+    "search_summary": {"context": 2, "ttl": 3600},
+}
+ENABLED_ROUTES = set(filter(None, os.getenv("BOOKBOT_LLM_CACHE_ROUTES", ",".join(CACHE_ROUTES)).split(",")))
+ERROR_PREFIXES = ("AI down", "AI error", "AI returned nothing", "Invalid API key")
+
+_response_cache: Optional[ResponseCache] = None
+
+def get_response_cache() -> ResponseCache:
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache(
+            maxsize=int(os.getenv("BOOKBOT_LLM_CACHE_SIZE", "512")),
+            db_path=os.getenv("BOOKBOT_LLM_CACHE_DB") or None,
+        )
+    return _response_cache
+
+def _normalize(content: str) -> str:
+    return " ".join(str(content).split()).casefold()
+
+def cache_key(route: str, messages: List[Dict], temperature, max_tokens) -> Optional[str]:
+    """Key for a cacheable call, or None if the route hasn't opted in."""
+    if route not in ENABLED_ROUTES or route not in CACHE_ROUTES:
+        return None
+    trailing = messages[-CACHE_ROUTES[route]["context"]:] if messages else []
+    return ResponseCache.make_key(
+        route, MODEL, SYSTEM_PROMPT, temperature, max_tokens,
+        [(m.get("role"), _normalize(m.get("content", ""))) for m in trailing],
+    )
+
+def is_error_reply(reply: str) -> bool:
+    """True for the canned messages LLMClient returns instead of raising."""
+    return reply.startswith(ERROR_PREFIXES)
+
+def _cacheable(reply: str) -> bool:
+    return bool(reply) and not is_error_reply(reply) and not reply.endswith(STREAM_CUT.strip())
+
+LLM_SECONDS = histogram("bookbot_llm_seconds", "Upstream LLM call time, by route and mode")
+LLM_CACHE = counter("bookbot_llm_cache_total", "Response cache lookups, by route and result")
+PROMPT_TOKENS = histogram("bookbot_prompt_tokens", "Estimated prompt tokens sent upstream, by route",
+                          buckets=(100, 250, 500, 750, 1000, 1500, 2000, 4000, 8000))
+
+def _lookup(key: Optional[str], route: Optional[str]) -> Optional[str]:
+    if not key:
+        return None
+    cached = get_response_cache().get(key)
+    LLM_CACHE.inc(route=route, result="miss" if cached is None else "hit")
+    return cached
+
+# === ASYNC LLM CALL (FREE & WORKING) ===
+async def call_llm(messages: List[Dict], temperature=0.3, max_tokens=200, route: str = None) -> str:
+    key = cache_key(route, messages, temperature, max_tokens)
+    cached = _lookup(key, route)
+    if cached is not None:
+        return cached
+    system = BACKGROUND_ROUTES.get(route, SYSTEM_MESSAGE)
+    messages = fit_prompt(messages, system)
+    PROMPT_TOKENS.observe(request_tokens(messages, system), route=route or "none")
+    started = time.perf_counter()
+    with LLM_SECONDS.time(route=route or "none", mode="complete"):
+        reply = await get_llm_client().complete(messages, temperature, max_tokens,
+                                                system=system, background=route in BACKGROUND_ROUTES)
+    if key and _cacheable(reply):
+        get_response_cache().put(key, reply, time.perf_counter() - started, CACHE_ROUTES[route]["ttl"])
+    return reply
+
+async def stream_llm(messages: List[Dict], temperature=0.3, max_tokens=200, route: str = None) -> AsyncIterator[str]:
+    """Stream a reply; a cached route answers in one chunk on a hit."""
+    key = cache_key(route, messages, temperature, max_tokens)
+    cached = _lookup(key, route)
+    if cached is not None:
+        yield cached
+        return
+    messages = fit_prompt(messages)
+    PROMPT_TOKENS.observe(request_tokens(messages), route=route or "none")
+    started = time.perf_counter()
+    parts = []
+    with LLM_SECONDS.time(route=route or "none", mode="stream"):
+        async for delta in get_llm_client().stream(messages, temperature, max_tokens):
+            parts.append(delta)
+            yield delta
+    reply = "".join(parts).strip()
+    if key and _cacheable(reply):
+        get_response_cache().put(key, reply, time.perf_counter() - started, CACHE_ROUTES[route]["ttl"])
@@ -0,0 +1,136 @@
+# webhook.py
+import asyncio
+import hmac
+import logging
+import multiprocessing
+import os
+import signal
+from typing import Callable, Optional
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+from metrics import metrics_handler
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+WEBHOOK_URL = os.getenv("BOOKBOT_WEBHOOK_URL", "")        # public URL Telegram posts to; empty = polling
+WEBHOOK_SECRET = os.getenv("BOOKBOT_WEBHOOK_SECRET", "")  # 1-256 chars of A-Z, a-z, 0-9, _ and -
+WEBHOOK_HOST = os.getenv("BOOKBOT_WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("BOOKBOT_WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("BOOKBOT_WEBHOOK_PATH", "/telegram")
+WORKERS = int(os.getenv("BOOKBOT_WORKERS", "1"))
+MAX_CONNECTIONS = 100   # parallel connections we let Telegram open (Bot API default is 40)
+MAX_BODY = 1 << 20
+
+# === HTTP ===
+def make_web_app(application: Application, secret: str, path: str = WEBHOOK_PATH) -> web.Application:
+    """
+    aiohttp app that checks Telegram's secret-token header, decodes the
+    update and puts it on the Application's update queue. It answers as
+    soon as the update is queued; handlers run afterwards, so a slow LLM
+    call never holds up Telegram's delivery.
+    """
+    if not secret:
+        raise ValueError("A webhook secret is required")
+    expected = secret.encode()
+
+    async def receive(request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, "").encode(), expected):
+            return web.Response(status=403)
+        try:
+            update = Update.de_json(await request.json(), application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Bad webhook payload: {e}")
+            return web.Response(status=400)
+        if update is None:
+            return web.Response(status=400)
+        await application.update_queue.put(update)
+        return web.Response()
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({"pid": os.getpid(), "pending": application.update_queue.qsize()})
+
+    web_app = web.Application(client_max_size=MAX_BODY)
+    web_app.router.add_post(path, receive)
+    web_app.router.add_get("/healthz", health)
+    # Per process: with several workers each scrape reaches whichever one accepts it
+    web_app.router.add_get("/metrics", metrics_handler)
+    return web_app
+
+# === SERVER ===
+async def serve(application: Application, secret: str = WEBHOOK_SECRET, host: str = WEBHOOK_HOST,
+                port: int = WEBHOOK_PORT, path: str = WEBHOOK_PATH, url: Optional[str] = None,
+                reuse_port: bool = False, stop: Optional[asyncio.Event] = None):
+    """
+    Run the Application behind the webhook server until `stop` is set.
+    Follows run_polling's lifecycle: initialize, post_init, start, and on
+    the way out stop, shutdown, post_shutdown. Pass `url` to register the
+    webhook with Telegram.
+    """
+    stop = stop or asyncio.Event()
+    application.bot_data["webhook"] = True
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+
+    runner = web.AppRunner(make_web_app(application, secret, path), access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port, reuse_port=reuse_port).start()
+        if url:
+            await application.bot.set_webhook(
+                url, secret_token=secret, max_connections=MAX_CONNECTIONS,
+                allowed_updates=Update.ALL_TYPES,
+            )
+            logger.info(f"Webhook registered at {url}")
+        logger.info(f"Worker {os.getpid()} listening on {host}:{port}{path}")
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+        await application.stop()   # drains updates already queued
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+def _run_worker(build: Callable[[], Application], index: int, secret: str, host: str,
+                port: int, path: str, url: Optional[str], reuse_port: bool):
+    async def main():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        application = build()
+        application.bot_data["worker"] = index
+        # Registering once is enough; every worker shares the port
+        await serve(application, secret, host, port, path, url if index == 0 else None, reuse_port, stop)
+    asyncio.run(main())
+
+def run(build: Callable[[], Application], workers: int = WORKERS, secret: str = WEBHOOK_SECRET,
+        host: str = WEBHOOK_HOST, port: int = WEBHOOK_PORT, path: str = WEBHOOK_PATH,
+        url: Optional[str] = WEBHOOK_URL):
+    """
+    Blocking entry point. With workers > 1, forks that many processes that
+    each build their own Application and bind the same port with
+    SO_REUSEPORT, so the kernel spreads Telegram's connections across them.
+    """
+    if workers <= 1:
+        _run_worker(build, 0, secret, host, port, path, url, False)
+        return
+    procs = [
+        multiprocessing.Process(target=_run_worker, args=(build, i, secret, host, port, path, url, True))
+        for i in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.join()